@@ -1 +1,2 @@
-from .gradio_ui import GradioUI
\ No newline at end of file
+from .gradio_ui import GradioUI
+from .batch_search import BatchSearch
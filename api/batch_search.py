@@ -0,0 +1,134 @@
+from external_database import QuestionCatalog
+from monitoring import metrics
+
+class BatchSearch:
+    """
+    Recherche sémantique sans interface, pour construire des séries de questions à partir d'une liste de thèmes.
+
+    Contrairement à des appels successifs à GradioUI.semantic_search, la base est chargée une seule fois,
+    les thèmes d'un lot sont encodés en un seul appel au modèle d'embeddings, la présélection des thèmes
+    partageant les mêmes filtres se fait en un seul passage sur l'index, et toutes les paires
+    (thème, question) du lot passent ensemble dans le reranker.
+    """
+
+    def __init__(
+        self,
+        db_manager,
+        reranker_model,
+        embedding_index=None,
+        retrieval_top_k=200,
+        top_k=20,
+        themes_per_batch=32,
+        priority=-1,
+        catalog=None,
+    ):
+        """
+        :param db_manager: DatabaseManager de la base de questions
+        :param reranker_model: RerankerModel chargé
+        :param embedding_index: EmbeddingIndex facultatif, présélection des questions avant le reranker
+        :param retrieval_top_k: Nombre de questions présélectionnées par thème
+        :param top_k: Nombre de questions renvoyées par thème (si la demande ne le précise pas)
+        :param themes_per_batch: Nombre de thèmes traités ensemble
+        :param priority: Priorité dans le micro-batching, en dessous des recherches de l'interface (0)
+        :param catalog: QuestionCatalog partagé (par exemple avec GradioUI), créé sur db_manager si None
+        """
+        self.db_manager = db_manager
+        self.reranker_model = reranker_model
+        self.embedding_index = embedding_index
+        self.retrieval_top_k = retrieval_top_k
+        self.top_k = top_k
+        self.themes_per_batch = themes_per_batch
+        self.priority = priority
+        self.catalog = catalog if catalog is not None else QuestionCatalog(db_manager)
+        self.candidates = {}
+
+    def load_questions(self):
+        """Complète le catalogue si la base a changé, les positions en cache sont alors recalculées"""
+        data_version = self.catalog.data_version
+        self.catalog.refresh()
+        if self.catalog.data_version != data_version:
+            self.candidates = {}
+        return self.catalog
+
+    @staticmethod
+    def normalize_request(request):
+        """Une demande est un thème seul ou un dictionnaire {"theme", "categories", "difficulties", "top_k", ...}"""
+        if isinstance(request, str):
+            request = {"theme": request}
+        request = dict(request)
+        for key in ["categories", "difficulties"]:
+            if isinstance(request.get(key), str):
+                request[key] = [request[key]]
+        return request
+
+    @staticmethod
+    def filters_key(request):
+        return tuple(sorted(request.get("categories") or [])), tuple(sorted(request.get("difficulties") or []))
+
+    def candidate_positions(self, filters_key):
+        """Positions des questions respectant les filtres, mises en cache par combinaison de filtres"""
+        if filters_key not in self.candidates:
+            categories, difficulties = filters_key
+            self.candidates[filters_key] = self.catalog.select(categories=categories, difficulties=difficulties)
+        return self.candidates[filters_key]
+
+    def retrieve(self, requests):
+        """Positions des questions à reranker pour chaque demande d'un lot"""
+        if self.embedding_index is None:
+            return [self.candidate_positions(self.filters_key(request)) for request in requests]
+
+        with metrics.timer("batch_search_retrieval"):
+            query_embeddings = self.embedding_index.embedding_model.compute_embeddings([request["theme"] for request in requests], self.priority)
+
+            # Un seul passage sur l'index par combinaison de filtres
+            groups = {}
+            for request_idx, request in enumerate(requests):
+                groups.setdefault(self.filters_key(request), []).append(request_idx)
+
+            retrieved = [None] * len(requests)
+            for filters_key, request_indices in groups.items():
+                candidate_ids = self.catalog.ids[self.candidate_positions(filters_key)]
+                for request_idx, (ids, _) in zip(request_indices, self.embedding_index.retrieve_many(query_embeddings[request_indices], self.retrieval_top_k, candidate_ids)):
+                    positions = self.catalog.positions(ids)
+                    retrieved[request_idx] = positions[positions >= 0]
+        return retrieved
+
+    def result(self, request, positions, scores):
+        """Demande complétée par ses meilleures questions, du meilleur score au moins bon"""
+        top_indices = self.reranker_model.top_indices(scores, request.get("top_k", self.top_k))
+        records = self.catalog.records(positions[top_indices])
+        return {
+            **request,
+            "questions": [{**record, "score": float(score)} for record, score in zip(records, scores[top_indices])],
+        }
+
+    def search(self, requests):
+        """
+        Meilleures questions de chaque demande (voir normalize_request), dans l'ordre des demandes.
+        Générateur : les résultats d'un lot sont disponibles dès qu'il est scoré.
+        """
+        self.load_questions()
+
+        batch = []
+        for request in requests:
+            batch.append(self.normalize_request(request))
+            if len(batch) == self.themes_per_batch:
+                yield from self.search_batch(batch)
+                batch = []
+        if batch:
+            yield from self.search_batch(batch)
+
+    def search_batch(self, requests):
+        metrics.increment("batch_search_themes", len(requests))
+        all_positions = self.retrieve(requests)
+
+        with metrics.timer("batch_search_rerank"):
+            all_scores = self.reranker_model.score_many(
+                [request["theme"] for request in requests],
+                [self.catalog.get_question_texts(positions) for positions in all_positions],
+                [self.catalog.ids[positions].tolist() for positions in all_positions],
+                self.priority,
+            )
+
+        for request, positions, scores in zip(requests, all_positions, all_scores):
+            yield self.result(request, positions, scores)
@@ -1,5 +1,11 @@
+from time import perf_counter
+
 import gradio as gr
-import pandas as pd
+import numpy as np
+from fastapi.responses import PlainTextResponse
+
+from external_database import QuestionCatalog
+from monitoring import metrics, profile_generator
 
 class GradioUI():
     def __init__(
@@ -8,64 +14,210 @@ class GradioUI():
         port,
         db_manager,
         reranker_model,
+        embedding_index=None,
+        retrieval_top_k=200,
+        results_top_k=100,
+        page_size=50,
+        semantic_search_concurrency=1,
+        profile_dir=None,
+        torch_profiler=False,
+        catalog=None,
+        query_pipeline=None,
     ):
         self.server_ip = server_ip
         self.port = port
         self.db_manager = db_manager
         self.reranker_model = reranker_model
+        self.embedding_index = embedding_index
+        self.retrieval_top_k = retrieval_top_k
+        self.results_top_k = results_top_k
+        self.page_size = page_size
+        # Nombre de recherches sémantiques traitées en parallèle (pool de workers du reranker)
+        self.semantic_search_concurrency = semantic_search_concurrency
+        # Profilage facultatif de chaque recherche sémantique (fichiers .prof, et .json avec torch_profiler)
+        self.profile_dir = profile_dir
+        self.torch_profiler = torch_profiler
+        # Message affiché tant que les modèles sont chargés en arrière-plan (voir set_models)
+        self.models_status = None
+        # Questions en colonnes en mémoire pour la recherche sémantique, complétées à chaque recherche si la base a changé
+        self.catalog = catalog if catalog is not None else QuestionCatalog(db_manager)
+        # Traitement du thème (normalisation, reformulations, calculs mis en cache), à défaut le reranker seul
+        self.query_pipeline = query_pipeline
+
+    def set_models(self, reranker_model, embedding_index=None, models_status=None, query_pipeline=None):
+        """Branche les modèles une fois chargés, l'interface peut être lancée avant"""
+        self.reranker_model = reranker_model
+        self.embedding_index = embedding_index
+        self.query_pipeline = query_pipeline
+        self.models_status = models_status
+
+    @property
+    def models_ready(self):
+        return self.reranker_model is not None and self.reranker_model.is_ready
+
+    def models_status_update(self):
+        """Bandeau d'état des modèles, rafraîchi par un minuteur jusqu'à ce qu'ils soient prêts"""
+        if self.models_ready:
+            return gr.update(value=self.models_status or "", visible=bool(self.models_status)), gr.Timer(active=False)
+        return gr.update(value=self.models_status or "⏳ Chargement des modèles en cours...", visible=True), gr.Timer(active=True)
 
     @property
     def all_categories(self):
         return self.db_manager.get_all_categories()
     
-    def search_questions(self, search_term):
-        """Fonction appelée par Gradio pour afficher le tableau filtré"""
-        return gr.update(value=self.db_manager.load_questions_as_dataframe(search_term))
+    def browse_questions(self, search_term, categories, difficulties, sources, sort_by, descending, page, page_size):
+        """
+        Fonction appelée par Gradio pour afficher une page du tableau filtré :
+        seules page_size lignes sont lues dans la base et envoyées au navigateur.
+        """
+        page_size = int(page_size)
+        page = max(1, int(page or 1))
+        filters = (search_term, categories, difficulties, sources)
+
+        page_df, total = self.db_manager.load_questions_page(page, page_size, sort_by, descending, *filters)
+        num_pages = max(1, -(-total // page_size))
+        if page > num_pages:
+            page = num_pages
+            page_df, total = self.db_manager.load_questions_page(page, page_size, sort_by, descending, *filters)
+
+        return gr.update(value=page_df), page, f"Page {page} / {num_pages} — {total} questions"
+
+    def first_page(self, *browse_inputs):
+        """Un changement de filtre, de tri ou de taille de page ramène à la première page"""
+        return self.browse_questions(*browse_inputs[:-2], 1, browse_inputs[-1])
+
+    def previous_page(self, *browse_inputs):
+        return self.browse_questions(*browse_inputs[:-2], int(browse_inputs[-2] or 1) - 1, browse_inputs[-1])
+
+    def next_page(self, *browse_inputs):
+        return self.browse_questions(*browse_inputs[:-2], int(browse_inputs[-2] or 1) + 1, browse_inputs[-1])
     
     def semantic_search(self, theme, selected_category):
-        """Recherche sémantique avec scoring"""
-        all_questions_df = self.db_manager.load_questions_as_dataframe()
+        """
+        Recherche sémantique avec scoring, en flux : le tableau du top-K est renvoyé après chaque lot
+        scoré par le reranker. Le bouton "Arrêter" annule les lots restants.
+        """
+        if not self.models_ready:
+            yield gr.update(), "⏳ Les modèles sont en cours de chargement, réessayez dans quelques instants."
+            return
+
+        if self.profile_dir is None:
+            yield from self.run_semantic_search(theme, selected_category)
+        else:
+            yield from profile_generator(self.run_semantic_search(theme, selected_category), self.profile_dir, "semantic_search", self.torch_profiler)
+
+    def run_semantic_search(self, theme, selected_category):
+        """Étapes de la recherche sémantique, chacune chronométrée dans monitoring.metrics"""
+        search_start = perf_counter()
+        metrics.increment("searches")
+
+        with metrics.timer("search_load_questions"):
+            self.catalog.refresh()
+
+        # Filtrer par catégorie si sélectionnée : positions des questions dans le catalogue
+        with metrics.timer("search_filter"):
+            positions = self.catalog.select(categories=selected_category)
+
+        # Pré-sélection des questions les plus proches par embeddings avant le reranker
+        if self.embedding_index is not None:
+            with metrics.timer("search_retrieval"):
+                if self.query_pipeline is not None:
+                    retrieved_ids, _ = self.query_pipeline.retrieve(theme, self.retrieval_top_k, self.catalog.ids[positions])
+                else:
+                    retrieved_ids, _ = self.embedding_index.retrieve(theme, self.retrieval_top_k, self.catalog.ids[positions])
+                positions = self.catalog.positions(retrieved_ids)
+                positions = positions[positions >= 0]
 
-        # Filtrer par catégorie si sélectionnée
-        if selected_category:
-            all_questions_df = all_questions_df[all_questions_df["category"].isin(selected_category)]
+        question_texts = self.catalog.get_question_texts(positions)
+        question_ids = self.catalog.ids[positions].tolist()
 
-        question_texts = all_questions_df["question"].tolist()
+        scores = np.full(len(question_texts), np.nan, dtype=np.float32)
+        scored = 0
+        if not question_texts:
+            yield gr.update(value=self.results_dataframe(positions, scores)), "Aucune question à scorer."
 
-        reranked_questions, scores = self.reranker_model.rerank_questions(theme, question_texts)
-        reranked_questions_dict = [{"question": question, "score": round(score, 3)} for question, score in zip (reranked_questions, scores)]
-        reranked_df = pd.DataFrame(reranked_questions_dict)
+        # Temps passé dans le reranker, hors envoi des résultats intermédiaires au navigateur
+        rerank_time = 0.0
+        batch_start = perf_counter()
+        # Le pipeline fusionne les scores des reformulations du thème, même interface que le reranker
+        scorer = self.query_pipeline if self.query_pipeline is not None else self.reranker_model
+        for indices, batch_scores in scorer.iter_scores(theme, question_texts, question_ids):
+            rerank_time += perf_counter() - batch_start
+            scores[indices] = batch_scores
+            scored += len(indices)
+            status = f"⏳ {scored} / {len(question_texts)} questions scorées" if scored < len(question_texts) else f"✅ {scored} questions scorées"
 
-        merged_df = pd.merge(reranked_df, all_questions_df, on="question", how="left")
-        columns = ["score", "question", "correct_answer", "incorrect_answers", "category", "difficulty", "source"]
-        merged_df = merged_df.sort_values(by="score", ascending=False)
+            with metrics.timer("search_merge"):
+                results_df = self.results_dataframe(positions, scores)
+            yield gr.update(value=results_df), status
+            batch_start = perf_counter()
 
-        # Convertir les scores en chaînes de caractères avec trois décimales pour Gradio
-        merged_df['score'] = merged_df['score'].apply(lambda x: f"{x:.3f}")
+        metrics.observe("search_rerank", rerank_time)
+        metrics.observe("search_total", perf_counter() - search_start)
 
-        return gr.update(value=merged_df[columns])
+    def results_dataframe(self, positions, scores):
+        """
+        Tableau des results_top_k meilleures questions parmi celles déjà scorées (score NaN : pas encore scorée),
+        positions : positions dans le catalogue des questions scorées
+        """
+        scored_indices = np.flatnonzero(~np.isnan(scores))
+        top_indices = scored_indices[self.reranker_model.top_indices(scores[scored_indices], self.results_top_k)]
+
+        # Seules les lignes affichées sont décodées depuis le catalogue
+        results_df = self.catalog.dataframe(positions[top_indices]).drop(columns="id")
+        results_df.insert(0, "score", [f"{score:.3f}" for score in scores[top_indices]])
+        return results_df
     
+    def statistics(self):
+        """Métriques de monitoring.metrics et empreinte mémoire du catalogue de questions"""
+        return {
+            **metrics.snapshot(),
+            "catalog": {"questions": len(self.catalog), "memory_bytes": self.catalog.memory_usage()},
+        }
+
+    def reset_metrics(self):
+        """Remet à zéro les compteurs et chronomètres, par exemple avant une mesure"""
+        metrics.reset()
+        return self.statistics()
+
     def launch_ui(self):
         with gr.Blocks() as demo:
             with gr.Tab("Toutes les questions"):
                 gr.Markdown("### 📚 Base de questions de culture générale")
                 with gr.Row():
                     search_box = gr.Textbox(label="Entrez un thème")
-                
+                    browse_categories = gr.Dropdown(label="Catégorie", choices=self.all_categories, multiselect=True)
+                    browse_difficulties = gr.Dropdown(label="Difficulté", choices=self.db_manager.get_distinct_values("difficulty"), multiselect=True)
+                    browse_sources = gr.Dropdown(label="Source", choices=self.db_manager.get_distinct_values("source"), multiselect=True)
+                with gr.Row():
+                    sort_dropdown = gr.Dropdown(
+                        label="Trier par",
+                        choices=[("Ajout", "id"), ("Question", "question"), ("Catégorie", "category"), ("Difficulté", "difficulty"), ("Source", "source")],
+                        value="id",
+                    )
+                    descending_checkbox = gr.Checkbox(label="Ordre décroissant", value=False)
+                    page_size_dropdown = gr.Dropdown(label="Questions par page", choices=[20, 50, 100, 200], value=self.page_size)
+
                 with gr.Row():
                     data_output = gr.Dataframe(
                         headers=["Question", "Bonne réponse", "Mauvaises réponses", "Catégorie", "Difficulté", "Source"],
-                        value=self.db_manager.load_questions_as_dataframe(),
                         interactive=False,
                         row_count=5,
                         datatype=["str"] * 6,
                         column_widths=["41%", "20%", "15%", "10%", "7%", "7%"],
-                        show_search="search",
                         wrap=True,
                     )
 
+                with gr.Row():
+                    previous_button = gr.Button("◀", scale=0)
+                    page_number = gr.Number(label="Page", value=1, precision=0, minimum=1, scale=0)
+                    next_button = gr.Button("▶", scale=0)
+                    page_status = gr.Markdown()
+
             with gr.Tab("Recherche sémantique"):
                 gr.Markdown("### 📚 Par recherche sémantique")
+                models_status = gr.Markdown()
+                models_status_timer = gr.Timer(1)
                 with gr.Row():
                     semantic_search_box = gr.Textbox(label="Entrez un thème")
                     category_dropdown = gr.Dropdown(
@@ -75,6 +227,8 @@ class GradioUI():
                     )
                 with gr.Row():
                     search_button = gr.Button("🔍 Rechercher", scale=0)
+                    stop_button = gr.Button("⏹ Arrêter", scale=0)
+                    search_status = gr.Markdown()
 
                 with gr.Row():
                     data_output_semantic_search = gr.Dataframe(
@@ -87,20 +241,47 @@ class GradioUI():
                         show_search="search",
                     )
 
-            search_box.change(
-                self.search_questions,
-                inputs=search_box,
-                outputs=data_output
-            )
+            # Pagination côté serveur : chaque interaction ne transfère qu'une page
+            browse_inputs = [search_box, browse_categories, browse_difficulties, browse_sources, sort_dropdown, descending_checkbox, page_number, page_size_dropdown]
+            browse_outputs = [data_output, page_number, page_status]
+
+            for component in [search_box, browse_categories, browse_difficulties, browse_sources, sort_dropdown, descending_checkbox, page_size_dropdown]:
+                component.change(self.first_page, inputs=browse_inputs, outputs=browse_outputs)
+            previous_button.click(self.previous_page, inputs=browse_inputs, outputs=browse_outputs)
+            next_button.click(self.next_page, inputs=browse_inputs, outputs=browse_outputs)
+            page_number.submit(self.browse_questions, inputs=browse_inputs, outputs=browse_outputs)
+            demo.load(self.first_page, inputs=browse_inputs, outputs=browse_outputs)
+
+            with gr.Tab("Statistiques"):
+                gr.Markdown("### 📈 Temps par étape, débits, taux de cache et mémoire du catalogue (métriques aussi exposés au format Prometheus sur /metrics)")
+                with gr.Row():
+                    refresh_button = gr.Button("🔄 Rafraîchir", scale=0)
+                    reset_button = gr.Button("🗑 Réinitialiser", scale=0)
+                stats_output = gr.JSON()
+
+            refresh_button.click(self.statistics, outputs=stats_output)
+            reset_button.click(self.reset_metrics, outputs=stats_output)
+            demo.load(self.statistics, outputs=stats_output)
 
-            search_button.click(
+            demo.load(self.models_status_update, outputs=[models_status, models_status_timer])
+            models_status_timer.tick(self.models_status_update, outputs=[models_status, models_status_timer])
+
+            semantic_search_event = search_button.click(
                 fn=self.semantic_search,
                 inputs=[semantic_search_box, category_dropdown],
-                outputs=data_output_semantic_search
+                outputs=[data_output_semantic_search, search_status],
+                concurrency_limit=self.semantic_search_concurrency,
             )
 
+            # Annule la recherche en cours : Gradio abandonne le générateur, les lots restants ne sont pas calculés
+            stop_button.click(fn=None, cancels=[semantic_search_event])
+
         demo.launch(
             share=False,
             server_name=self.server_ip,
-            server_port=self.port
-        )
\ No newline at end of file
+            server_port=self.port,
+            prevent_thread_lock=True,
+        )
+        # Point d'accès pour un collecteur Prometheus
+        demo.app.add_api_route("/metrics", lambda: PlainTextResponse(metrics.to_prometheus()), methods=["GET"])
+        demo.block_thread()
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Throughput in themes per minute of BatchSearch against one GradioUI.semantic_search call per theme,
+on a synthetic corpus with the tiny local models (no score cache, so that every pair is scored).
+
+Usage: python -m benchmarks.benchmark_batch_search --num-questions 10000 --num-themes 64
+"""
+import argparse
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from api import BatchSearch, GradioUI
+from external_database import TriviaSQLiteManager
+from huggingface_interface import EmbeddingModel, RerankerModel
+from search_index import EmbeddingIndex
+from .synthetic_corpus import CATEGORIES, TOPICAL_WORDS, generate_questions
+from .tiny_models import create_tiny_models
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-questions", type=int, default=10000)
+    parser.add_argument("--num-themes", type=int, default=64)
+    parser.add_argument("--retrieval-top-k", type=int, default=200)
+    parser.add_argument("--themes-per-batch", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    requests = [
+        {"theme": " ".join(rng.sample(TOPICAL_WORDS, 2)), "categories": [rng.choice(CATEGORIES)[0]] if rng.random() < 0.5 else None}
+        for _ in range(args.num_themes)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        models_path = os.path.join(tmp_dir, "models")
+        reranker_name, embedder_name = create_tiny_models(models_path, seed=args.seed)
+
+        db_manager = TriviaSQLiteManager(db_path=os.path.join(tmp_dir, "questions.db"))
+        db_manager.connect()
+        db_manager.create_questions_table()
+        db_manager.insert_questions(generate_questions(args.num_questions, args.seed))
+        db_manager.close()
+
+        embedding_model = EmbeddingModel(embedder_name, local_path=models_path, device="cpu")
+        embedding_model.load_model_and_tokenizer(warmup=True)
+        embedding_index = EmbeddingIndex(embedding_model, index_path=os.path.join(tmp_dir, "index"), batch_size=256)
+        embedding_index.build(db_manager)
+        reranker_model = RerankerModel(reranker_name, local_path=models_path, device="cpu")
+        reranker_model.load_model_and_tokenizer(warmup=True)
+        db_manager = TriviaSQLiteManager(db_path=db_manager.db_path, read_only=True)
+
+        ui = GradioUI(None, None, db_manager, reranker_model, embedding_index, args.retrieval_top_k)
+        start_time = perf_counter()
+        for request in requests:
+            list(ui.semantic_search(request["theme"], request["categories"]))
+        sequential = perf_counter() - start_time
+        print(f"sequential UI calls     | {args.num_themes / sequential * 60:8.0f} themes/minute")
+
+        for themes_per_batch in args.themes_per_batch:
+            batch_search = BatchSearch(db_manager, reranker_model, embedding_index, args.retrieval_top_k, themes_per_batch=themes_per_batch)
+            start_time = perf_counter()
+            results = list(batch_search.search(requests))
+            elapsed = perf_counter() - start_time
+            print(f"batch of {themes_per_batch:>3} themes     | {len(results) / elapsed * 60:8.0f} themes/minute ({sequential / elapsed:.1f}x)")
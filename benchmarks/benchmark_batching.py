@@ -0,0 +1,49 @@
+"""
+Throughput of the reranker with fixed-size batches in database order
+against length-bucketed batches bounded by a token budget.
+
+Usage: python -m benchmarks.benchmark_batching --num-questions 2000 --max-tokens 8192
+"""
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from huggingface_interface import RerankerModel
+from external_database import TriviaSQLiteManager
+
+def padded_tokens(lengths, batches):
+    return sum(len(batch) * lengths[batch].max() for batch in batches)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--theme", default="Harry Potter")
+    parser.add_argument("--num-questions", type=int, default=2000, help="0 for the whole table")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-tokens", type=int, default=8192)
+    args = parser.parse_args()
+
+    reranker_model = RerankerModel(batch_size=args.batch_size, max_tokens_per_batch=args.max_tokens)
+    reranker_model.load_model_and_tokenizer()
+
+    db_manager = TriviaSQLiteManager()
+    _, question_texts = db_manager.load_question_texts()
+    if args.num_questions:
+        question_texts = question_texts[:args.num_questions]
+
+    _, lengths = reranker_model.tokenize_pairs(args.theme, question_texts)
+    real_tokens = int(lengths.sum())
+    fixed_batches = [np.arange(start_idx, min(start_idx + args.batch_size, len(lengths))) for start_idx in range(0, len(lengths), args.batch_size)]
+    print(f"{len(question_texts)} pairs, {real_tokens} tokens (mean {lengths.mean():.1f}, max {lengths.max()})")
+
+    results = {}
+    for batching, batches in [("fixed", fixed_batches), ("length", reranker_model.length_batches(lengths))]:
+        reranker_model.batching = batching
+        start_time = perf_counter()
+        results[batching] = reranker_model.compute_logits(args.theme, question_texts)
+        elapsed = perf_counter() - start_time
+
+        padding_ratio = 1 - real_tokens / padded_tokens(lengths, batches)
+        print(f"{batching:<6} | {len(batches):>5} batches | padding {padding_ratio:6.1%} | {elapsed:7.2f} s | {real_tokens / elapsed:8.0f} tokens/s | {len(question_texts) / elapsed:6.0f} pairs/s")
+
+    print(f"max |logit difference| = {np.abs(results['fixed'] - results['length']).max():.2e}")
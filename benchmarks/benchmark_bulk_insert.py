@@ -0,0 +1,71 @@
+"""
+Insert throughput of synthetic standardized questions: one question_exists SELECT
+and one INSERT per row with a single commit at the end (previous fetch loop)
+against DatabaseManager.insert_questions (in-memory dedup, executemany, commit every N rows).
+
+Usage: python -m benchmarks.benchmark_bulk_insert --num-questions 100000 --duplicate-rate 0.3
+"""
+import argparse
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from external_database.database_manager import DatabaseManager
+
+def synthetic_payload(num_questions, duplicate_rate, seed=0):
+    rng = random.Random(seed)
+    num_unique = int(num_questions * (1 - duplicate_rate))
+    questions = [{
+        "question": f"Synthetic question {idx} &quot;{rng.random():.6f}&quot; ?",
+        "correct_answer": "A",
+        "incorrect_answers": ["B", "C", "D"],
+        "category": rng.choice(["Science", "History", "Music", "Sport", "Geography"]),
+        "difficulty": rng.choice(["easy", "medium", "hard"]),
+        "type": "multiple",
+        "source": "Synthetic",
+    } for idx in range(num_unique)]
+    questions += rng.choices(questions, k=num_questions - num_unique)
+    rng.shuffle(questions)
+    return questions
+
+def per_row(db_manager, questions, _):
+    inserted = 0
+    for question in questions:
+        if db_manager.question_exists(question["question"]):
+            continue
+        if db_manager.insert_question(question):
+            inserted += 1
+    db_manager.commit()
+    return inserted
+
+def bulk(db_manager, questions, batch_size):
+    inserted = 0
+    # Same payload cut as the API pages the fetchers receive
+    for start_idx in range(0, len(questions), batch_size):
+        batch_inserted, _ = db_manager.insert_questions(questions[start_idx:start_idx + batch_size], batch_size)
+        inserted += batch_inserted
+    return inserted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-questions", type=int, default=100000)
+    parser.add_argument("--duplicate-rate", type=float, default=0.3)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[50, 500, 5000])
+    args = parser.parse_args()
+
+    questions = synthetic_payload(args.num_questions, args.duplicate_rate)
+    runs = [("per-row", per_row, None)] + [(f"bulk, batch {batch_size}", bulk, batch_size) for batch_size in args.batch_sizes]
+
+    for label, insert, batch_size in runs:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_manager = DatabaseManager(db_path=os.path.join(tmp_dir, "questions.db"))
+            db_manager.connect()
+            db_manager.create_questions_table()
+
+            start_time = perf_counter()
+            inserted = insert(db_manager, questions, batch_size)
+            elapsed = perf_counter() - start_time
+            db_manager.close()
+
+        print(f"{label:<18} | {inserted} inserted | {elapsed:6.2f} s | {len(questions) / elapsed:9.0f} rows/s")
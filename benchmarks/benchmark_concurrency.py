@@ -0,0 +1,62 @@
+"""
+Latency of N simultaneous UI searches sharing one DatabaseManager.
+
+By default only the database part of a search is measured (question table
+and category list); --semantic runs the whole GradioUI.semantic_search.
+
+Usage: python -m benchmarks.benchmark_concurrency --users 1 4 8 16 --searches 5
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from api import GradioUI
+from external_database import TriviaSQLiteManager
+
+def database_search(db_manager):
+    db_manager.get_all_categories()
+    db_manager.load_questions_as_dataframe(include_id=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--searches", type=int, default=5, help="Searches per simulated user")
+    parser.add_argument("--semantic", action="store_true")
+    parser.add_argument("--theme", default="Harry Potter")
+    args = parser.parse_args()
+
+    db_manager = TriviaSQLiteManager(read_only=True)
+
+    if args.semantic:
+        from huggingface_interface import EmbeddingModel, RerankerModel
+        from search_index import EmbeddingIndex
+
+        reranker_model = RerankerModel()
+        reranker_model.load_model_and_tokenizer()
+        # Same retrieval stage as main.py when an index has been built with reindex.py
+        embedding_index = EmbeddingIndex(EmbeddingModel())
+        if embedding_index.load():
+            embedding_index.embedding_model.load_model_and_tokenizer()
+        else:
+            embedding_index = None
+            print("No embedding index found, every question will go through the reranker")
+        ui = GradioUI(None, None, db_manager, reranker_model, embedding_index)
+        # semantic_search is a generator: the search only runs when it is consumed
+        search = lambda: list(ui.semantic_search(args.theme, None))
+    else:
+        search = lambda: database_search(db_manager)
+
+    def timed_search():
+        start_time = perf_counter()
+        search()
+        return perf_counter() - start_time
+
+    for users in args.users:
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            start_time = perf_counter()
+            latencies = np.array(list(executor.map(lambda _: timed_search(), range(users * args.searches))))
+            elapsed = perf_counter() - start_time
+
+        print(f"{users:>3} users | p50 {np.percentile(latencies, 50) * 1000:8.1f} ms | p99 {np.percentile(latencies, 99) * 1000:8.1f} ms | {len(latencies) / elapsed:7.1f} searches/s")
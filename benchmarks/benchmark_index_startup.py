@@ -0,0 +1,80 @@
+"""
+Startup time and memory of the memory-mapped embedding index.
+
+Writes a random index of N normalized vectors, then loads it in fresh processes
+and measures the time to open it and to run a first search.
+
+Usage: python -m benchmarks.benchmark_index_startup --num-questions 1000000 --dim 1024
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from search_index.npy_file import AppendableNpyFile
+
+LOAD_SCRIPT = """
+import json, resource, sys
+from time import perf_counter
+start_time = perf_counter()
+import numpy as np
+from search_index import EmbeddingIndex
+import_time = perf_counter() - start_time
+
+start_time = perf_counter()
+index = EmbeddingIndex(None, index_path=sys.argv[1])
+index.load()
+load_time = perf_counter() - start_time
+
+query = np.random.default_rng(0).standard_normal(index.embeddings.shape[1]).astype(np.float32)
+start_time = perf_counter()
+index.retrieve_by_embedding(query / np.linalg.norm(query), 200)
+search_time = perf_counter() - start_time
+
+max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"import": import_time, "load": load_time, "first_search": search_time, "max_rss_mb": max_rss_mb}))
+"""
+
+def write_random_index(index_path, num_questions, dim, dtype, chunk_size=100000):
+    rng = np.random.default_rng(0)
+    embeddings_file = AppendableNpyFile(os.path.join(index_path, "embeddings.npy"))
+    stamps_file = AppendableNpyFile(os.path.join(index_path, "stamps.npy"))
+    ids_file = AppendableNpyFile(os.path.join(index_path, "ids.npy"))
+    embeddings_file.create(dtype, (dim,))
+    stamps_file.create(np.int16)
+    ids_file.create(np.int64)
+
+    for start_idx in range(0, num_questions, chunk_size):
+        size = min(chunk_size, num_questions - start_idx)
+        embeddings = rng.standard_normal((size, dim), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings_file.append(embeddings, start_idx)
+        stamps_file.append(np.zeros(size, dtype=np.int16), start_idx)
+        ids_file.append(np.arange(start_idx + 1, start_idx + size + 1), start_idx)
+
+    with open(os.path.join(index_path, "meta.json"), "w") as f:
+        json.dump({"model_stamps": ["random:1"]}, f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-questions", type=int, default=1000000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as index_path:
+        start_time = perf_counter()
+        write_random_index(index_path, args.num_questions, args.dim, args.dtype)
+        size_mb = os.path.getsize(os.path.join(index_path, "embeddings.npy")) / 2**20
+        print(f"Index written: {args.num_questions} x {args.dim} {args.dtype}, {size_mb:.0f} MB in {perf_counter() - start_time:.1f} s")
+
+        for run in range(args.runs):
+            output = subprocess.run([sys.executable, "-c", LOAD_SCRIPT, index_path], capture_output=True, text=True, check=True).stdout
+            timings = json.loads(output)
+            print(f"run {run}: import {timings['import']:.3f} s | load {timings['load']:.3f} s | first search {timings['first_search']:.3f} s | max RSS {timings['max_rss_mb']:.0f} MB")
@@ -0,0 +1,65 @@
+"""
+Full crawl of both sources against the local stub server (benchmarks/stub_trivia_server.py),
+with the concurrent ingestion engine and optionally with the sequential fetchers.
+
+The sequential fetchers sleep 5 s on each rate-limited response, so --sequential is slow.
+
+Usage: python -m benchmarks.benchmark_ingestion --workers 1 4 8
+"""
+import argparse
+import os
+import tempfile
+from time import perf_counter
+
+from external_database import TriviaSQLiteManager, TheTriviaAPISQLiteManager
+from .stub_trivia_server import StubTriviaServer
+
+def crawl(manager_class, db_path, base_url, concurrent, **kwargs):
+    db = manager_class(db_path=db_path)
+    db.base_url = base_url
+    db.connect()
+    db.create_questions_table()
+    if manager_class is TriviaSQLiteManager:
+        db.get_session_token()
+
+    start_time = perf_counter()
+    if concurrent:
+        db.fetch_all_questions_concurrently(**kwargs)
+    else:
+        db.fetch_all_questions()
+    elapsed = perf_counter() - start_time
+
+    db.execute("SELECT COUNT(*) FROM questions")
+    rows = db.cursor.fetchone()[0]
+    db.close()
+    return elapsed, rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--questions-per-category", type=int, default=120)
+    parser.add_argument("--opentdb-min-interval", type=float, default=0.05)
+    parser.add_argument("--trivia-api-max-rps", type=int, default=20)
+    parser.add_argument("--sequential", action="store_true")
+    args = parser.parse_args()
+
+    runs = [(f"concurrent, {workers} workers", True, workers) for workers in args.workers]
+    if args.sequential:
+        runs.insert(0, ("sequential", False, None))
+
+    for label, concurrent, workers in runs:
+        server = StubTriviaServer(questions_per_category=args.questions_per_category, opentdb_min_interval=args.opentdb_min_interval, trivia_api_max_rps=args.trivia_api_max_rps)
+        server.start()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "questions.db")
+            opentdb_kwargs = {"max_workers": workers, "requests_per_second": 0.9 / args.opentdb_min_interval, "backoff_base": args.opentdb_min_interval} if concurrent else {}
+            trivia_api_kwargs = {"max_workers": workers, "requests_per_second": 0.9 * args.trivia_api_max_rps, "backoff_base": 0.1} if concurrent else {}
+            opentdb_time, opentdb_rows = crawl(TriviaSQLiteManager, db_path, server.url, concurrent, **opentdb_kwargs)
+            trivia_api_time, rows = crawl(TheTriviaAPISQLiteManager, db_path, server.url, concurrent, **trivia_api_kwargs)
+        server.stop()
+
+        # The last page of each OpenTDB category (fewer than 50 questions left) is fetched with smaller amounts
+        expected_rows = server.num_categories * args.questions_per_category
+        if opentdb_rows != expected_rows:
+            print(f"{label}: {opentdb_rows} OpenTDB questions ingested out of {expected_rows}")
+        print(f"{label:<24} | OpenTDB {opentdb_time:6.2f} s | TheTriviaAPI {trivia_api_time:6.2f} s | {rows} rows | stub responses {server.response_counts}")
@@ -0,0 +1,62 @@
+"""
+Latency of the "Toutes les questions" keyword search: pandas str.contains over
+the whole table against the FTS5 index, on a synthetic database.
+
+Usage: python -m benchmarks.benchmark_keyword_search --num-questions 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from external_database import TriviaSQLiteManager
+
+WORDS = ["capitale", "France", "roi", "guerre", "planète", "chanteur", "film", "roman", "écrivain", "football", "océan", "montagne", "élément", "chimique", "peintre", "opéra", "empire", "révolution", "Harry", "Potter", "galaxie", "président", "fleuve", "île", "désert"]
+SEARCH_TERMS = ["h", "ha", "harr", "harry pot", "revolution", "ecrivain francais", "zzz"]
+
+def populate(db_manager, num_questions, seed=0):
+    rng = random.Random(seed)
+    db_manager.connect()
+    db_manager.create_questions_table()
+    rows = [(
+        " ".join(rng.choices(WORDS, k=rng.randint(5, 25))) + f" ({idx}) ?",
+        rng.choice(WORDS),
+        '["a", "b", "c"]',
+        rng.choice(["Science", "History", "Music", "Sport", "Geography"]),
+        rng.choice(["easy", "medium", "hard"]),
+        "multiple",
+        "Synthetic",
+    ) for idx in range(num_questions)]
+    db_manager.cursor.executemany("""
+    INSERT INTO questions (question, correct_answer, incorrect_answers, category, difficulty, type, source)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    db_manager.close()
+
+def timed(function, repeat):
+    start_time = perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (perf_counter() - start_time) / repeat * 1000, len(result)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-questions", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager = TriviaSQLiteManager(db_path=os.path.join(tmp_dir, "questions.db"))
+        start_time = perf_counter()
+        populate(db_manager, args.num_questions)
+        print(f"{args.num_questions} questions inserted and indexed in {perf_counter() - start_time:.1f} s")
+
+        for search_term in SEARCH_TERMS:
+            pandas_ms, pandas_rows = timed(lambda: db_manager.load_questions_as_dataframe(search_term), args.repeat)
+            fts_ms, fts_rows = timed(lambda: db_manager.search_questions(search_term, limit=args.limit), args.repeat)
+            rank_ms, _ = timed(lambda: db_manager.search_questions(search_term, limit=args.limit, order_by="rank"), args.repeat)
+            print(f"{search_term!r:<22} | str.contains {pandas_ms:7.1f} ms ({pandas_rows:>6} rows) | FTS5 by id {fts_ms:6.1f} ms | FTS5 by rank {rank_ms:6.1f} ms ({fts_rows} rows)")
+
+        db_manager.pool.close_all()
@@ -0,0 +1,74 @@
+"""
+Latency of concurrent reranking requests computed one by one against requests merged
+into shared batches by the micro-batching scheduler, for several max-wait windows.
+Also checks that a cancelled request stops consuming model time.
+
+Usage: python -m benchmarks.benchmark_micro_batching --users 1 4 16 --num-questions 20 --max-waits 0.005 0.02
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+import numpy as np
+
+from huggingface_interface import RerankerModel
+from external_database import TriviaSQLiteManager
+
+def run(reranker_model, question_texts, users, searches):
+    def timed_search(search_idx):
+        start_time = perf_counter()
+        reranker_model.compute_logits(f"Thème {search_idx}", question_texts)
+        return perf_counter() - start_time
+
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        start_time = perf_counter()
+        latencies = np.array(list(executor.map(timed_search, range(users * searches))))
+        elapsed = perf_counter() - start_time
+    return latencies, len(latencies) / elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-name", default="BAAI/bge-reranker-v2-m3")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--searches", type=int, default=5, help="Searches per simulated user")
+    parser.add_argument("--num-questions", type=int, default=20, help="Pairs per search (e.g. the cache misses of a search)")
+    parser.add_argument("--max-waits", type=float, nargs="+", default=[0.005, 0.02])
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    db_manager = TriviaSQLiteManager()
+    _, question_texts = db_manager.load_question_texts()
+    question_texts = question_texts[:args.num_questions]
+
+    reranker_model = RerankerModel(args.model_name)
+    reranker_model.load_model_and_tokenizer()
+    configurations = [("no scheduler", reranker_model)]
+    for max_wait in args.max_waits:
+        scheduled_model = RerankerModel(args.model_name, scheduler_max_wait=max_wait, scheduler_max_batch_size=args.max_batch_size)
+        scheduled_model.model, scheduled_model.tokenizer = reranker_model.model, reranker_model.tokenizer
+        configurations.append((f"wait {max_wait * 1000:.0f} ms", scheduled_model))
+
+    for users in args.users:
+        for label, model in configurations:
+            before = model.scheduler.stats() if model.scheduler is not None else None
+            latencies, throughput = run(model, question_texts, users, args.searches)
+            batches = ""
+            if model.scheduler is not None:
+                after = model.scheduler.stats()
+                batches = f" | mean batch {(after['items'] - before['items']) / (after['batches'] - before['batches']):6.1f} pairs"
+            print(
+                f"{users:>3} users | {label:<12} | p50 {np.percentile(latencies, 50) * 1000:8.1f} ms "
+                f"| p99 {np.percentile(latencies, 99) * 1000:8.1f} ms | {throughput:6.1f} searches/s{batches}"
+            )
+
+    # Cancellation: an abandoned search leaves the queue after the batch in progress
+    scheduled_model = configurations[-1][1]
+    long_request = question_texts * 200
+    before = scheduled_model.scheduler.stats()["batches"]
+    future = scheduled_model.submit_logits("Thème abandonné", long_request)
+    sleep(0.05)
+    future.cancel()
+    sleep(0.5)
+    computed = scheduled_model.scheduler.stats()["batches"] - before
+    total = -(-len(long_request) // args.max_batch_size)
+    print(f"cancelled request: {computed} of {total} batches computed")
@@ -0,0 +1,69 @@
+"""
+Scaling of the near-duplicate detection on a synthetic corpus with injected paraphrases
+(reworded, reordered or re-punctuated copies of other questions, each with an embedding close
+to the original). Reports the MinHash/LSH time, the number of candidate pairs against the
+number of pairs a brute-force comparison would check, and the recall of the injected duplicates.
+
+Usage: python -m benchmarks.benchmark_near_duplicates --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+from time import perf_counter
+
+import numpy as np
+
+from search_index.near_duplicates import NearDuplicateDetector
+
+def synthetic_corpus(num_questions, duplicate_rate, vocabulary_size=20000, dim=64, seed=0):
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    vocabulary = [f"w{idx}" for idx in range(vocabulary_size)]
+    num_unique = int(num_questions * (1 - duplicate_rate))
+
+    texts = [" ".join(rng.choices(vocabulary, k=rng.randint(6, 16))) + " ?" for _ in range(num_unique)]
+    embeddings = np_rng.standard_normal((num_questions, dim)).astype(np.float32)
+    duplicate_pairs = []
+    for idx in range(num_unique, num_questions):
+        original = rng.randrange(num_unique)
+        words = texts[original].split()[:-1]
+        # One word replaced and two swapped, different punctuation and case
+        words[rng.randrange(len(words))] = rng.choice(vocabulary)
+        first, second = rng.randrange(len(words)), rng.randrange(len(words))
+        words[first], words[second] = words[second], words[first]
+        texts.append(" ".join(words).upper() + "?")
+        embeddings[idx] = embeddings[original] + 0.1 * np_rng.standard_normal(dim)
+        duplicate_pairs.append((original, idx))
+
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return texts, embeddings, np.array(duplicate_pairs, dtype=np.int64).reshape(-1, 2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--bands", type=int, default=32)
+    parser.add_argument("--num-perm", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'questions':>10} {'minhash (s)':>12} {'lsh (s)':>9} {'confirm (s)':>12} {'candidates':>11} {'brute force':>14} {'recall':>7}")
+    for num_questions in args.sizes:
+        texts, embeddings, duplicate_pairs = synthetic_corpus(num_questions, args.duplicate_rate)
+        detector = NearDuplicateDetector(None, num_perm=args.num_perm, bands=args.bands)
+        question_ids = np.arange(num_questions, dtype=np.int64)
+
+        start = perf_counter()
+        keys = detector.band_keys(detector.signatures(texts))
+        minhash_time = perf_counter() - start
+
+        start = perf_counter()
+        pairs = detector.candidate_pairs(question_ids, keys)
+        lsh_time = perf_counter() - start
+
+        start = perf_counter()
+        confirmed, _ = detector.confirm(pairs, lambda ids: (embeddings[ids], np.ones(len(ids), dtype=bool)))
+        confirm_time = perf_counter() - start
+
+        found = set(map(tuple, confirmed.tolist()))
+        recall = np.mean([tuple(pair) in found for pair in duplicate_pairs.tolist()]) if len(duplicate_pairs) else 1.0
+        brute_force = num_questions * (num_questions - 1) // 2
+        print(f"{num_questions:>10} {minhash_time:>12.2f} {lsh_time:>9.2f} {confirm_time:>12.2f} {len(pairs):>11} {brute_force:>14} {recall:>7.1%}")
@@ -0,0 +1,74 @@
+"""
+Accuracy against speed of the quantized inference backends: every backend reranks the same
+questions for a fixed set of themes, and its top-20 is compared with the float32 PyTorch top-20
+(overlap of the two sets and Spearman correlation of the scores).
+
+Usage: python -m benchmarks.benchmark_quantization --num-questions 1000 --backends torch torch-int8 onnx-int8
+"""
+import argparse
+from time import perf_counter
+
+import numpy as np
+import torch
+
+from huggingface_interface import RerankerModel
+from external_database import TriviaSQLiteManager
+
+THEMES = [
+    "Harry Potter",
+    "Seconde Guerre mondiale",
+    "Football",
+    "Astronomie",
+    "Musique classique",
+    "Cuisine française",
+    "Mythologie grecque",
+    "Jeux vidéo",
+    "Géographie de l'Afrique",
+    "Chimie",
+]
+
+def spearman(first, second):
+    first_ranks = np.argsort(np.argsort(first))
+    second_ranks = np.argsort(np.argsort(second))
+    return np.corrcoef(first_ranks, second_ranks)[0, 1]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-name", default="BAAI/bge-reranker-v2-m3")
+    parser.add_argument("--num-questions", type=int, default=1000, help="0 for the whole table")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx-int8"])
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    db_manager = TriviaSQLiteManager()
+    _, question_texts = db_manager.load_question_texts()
+    if args.num_questions:
+        question_texts = question_texts[:args.num_questions]
+    print(f"{len(THEMES)} themes x {len(question_texts)} questions")
+
+    reference = None
+    for backend in args.backends:
+        reranker_model = RerankerModel(args.model_name, device="cpu", backend=backend)
+        reranker_model.load_model_and_tokenizer()
+
+        # Warm-up (first-call allocations, ONNX Runtime graph initialization)
+        reranker_model.compute_logits(THEMES[0], question_texts[:32])
+
+        start_time = perf_counter()
+        logits = [reranker_model.compute_logits(theme, question_texts) for theme in THEMES]
+        elapsed = perf_counter() - start_time
+        tops = [set(np.argsort(-theme_logits, kind="stable")[:args.top_k].tolist()) for theme_logits in logits]
+
+        if reference is None:
+            reference = (logits, tops, elapsed)
+        overlap = np.mean([len(top & reference_top) / args.top_k for top, reference_top in zip(tops, reference[1])])
+        correlation = np.mean([spearman(theme_logits, reference_logits) for theme_logits, reference_logits in zip(logits, reference[0])])
+
+        print(
+            f"{backend:<10} | {elapsed:7.2f} s | {len(THEMES) * len(question_texts) / elapsed:6.0f} pairs/s | "
+            f"speed-up x{reference[2] / elapsed:4.2f} | top-{args.top_k} overlap {overlap:6.1%} | spearman {correlation:.3f}"
+        )
@@ -0,0 +1,84 @@
+"""
+Cost of reranking the retrieval top-K of a theme with several phrasings: one rerank per phrasing
+against the QueryPipeline (single tokenization of the questions, all phrasings or only the closest
+one per question), relative to a single-phrasing rerank. Synthetic corpus, tiny local models
+(--hidden-size / --num-layers make the forward pass heavier relative to tokenization).
+
+Usage: python -m benchmarks.benchmark_query_pipeline --num-phrasings 3 --hidden-size 256 --num-layers 4
+"""
+import argparse
+import os
+import random
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from external_database import TriviaSQLiteManager, QuestionCatalog
+from huggingface_interface import EmbeddingModel, RerankerModel, QueryPipeline
+from search_index import EmbeddingIndex
+from .synthetic_corpus import TOPICAL_WORDS, generate_questions
+from .tiny_models import create_tiny_models
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-questions", type=int, default=10000)
+    parser.add_argument("--num-themes", type=int, default=8)
+    parser.add_argument("--num-phrasings", type=int, default=3)
+    parser.add_argument("--retrieval-top-k", type=int, default=200)
+    parser.add_argument("--hidden-size", type=int, default=64)
+    parser.add_argument("--num-layers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    phrasings = {f"theme {idx}": [" ".join(rng.sample(TOPICAL_WORDS, 2)) for _ in range(args.num_phrasings - 1)] for idx in range(args.num_themes)}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        models_path = os.path.join(tmp_dir, "models")
+        reranker_name, embedder_name = create_tiny_models(models_path, args.hidden_size, args.num_layers, args.seed)
+
+        db_manager = TriviaSQLiteManager(db_path=os.path.join(tmp_dir, "questions.db"))
+        db_manager.connect()
+        db_manager.create_questions_table()
+        db_manager.insert_questions(generate_questions(args.num_questions, args.seed))
+        db_manager.close()
+        db_manager = TriviaSQLiteManager(db_path=db_manager.db_path, read_only=True)
+        catalog = QuestionCatalog(db_manager)
+        catalog.refresh()
+
+        embedding_model = EmbeddingModel(embedder_name, local_path=models_path, device="cpu")
+        embedding_model.load_model_and_tokenizer(warmup=True)
+        embedding_index = EmbeddingIndex(embedding_model, index_path=os.path.join(tmp_dir, "index"), batch_size=256)
+        embedding_index.build(db_manager)
+        reranker_model = RerankerModel(reranker_name, local_path=models_path, device="cpu")
+        reranker_model.load_model_and_tokenizer(warmup=True)
+
+        pipelines = {
+            "pipeline, all phrasings": QueryPipeline(reranker_model, embedding_index, phrasings),
+            "pipeline, 1 per question": QueryPipeline(reranker_model, embedding_index, phrasings, phrasings_per_question=1),
+        }
+        # Same candidates for every method: the fused retrieval of the phrasings
+        candidates = {}
+        for theme in phrasings:
+            ids, _ = pipelines["pipeline, all phrasings"].retrieve(theme, args.retrieval_top_k)
+            positions = catalog.positions(ids)
+            candidates[theme] = (catalog.get_question_texts(positions), catalog.ids[positions].tolist())
+
+        def time_per_theme(function):
+            start_time = perf_counter()
+            for theme, (questions, question_ids) in candidates.items():
+                function(theme, questions, question_ids)
+            return (perf_counter() - start_time) / len(candidates) * 1000
+
+        def rerank_each_phrasing(theme, questions, question_ids):
+            scores = [reranker_model.rerank_questions(phrasing, questions)[1] for phrasing in pipelines["pipeline, all phrasings"].query(theme).phrasings]
+            return np.max(scores, axis=0)
+
+        single = time_per_theme(lambda theme, questions, question_ids: reranker_model.rerank_questions(theme, questions))
+        print(f"{'single phrasing':<28} | {single:8.1f} ms/theme | x1.00")
+        timings = {f"{args.num_phrasings} reranks": time_per_theme(rerank_each_phrasing)}
+        for name, query_pipeline in pipelines.items():
+            timings[name] = time_per_theme(query_pipeline.rerank_questions)
+        for name, timing in timings.items():
+            print(f"{name:<28} | {timing:8.1f} ms/theme | x{timing / single:.2f}")
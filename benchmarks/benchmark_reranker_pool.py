@@ -0,0 +1,71 @@
+"""
+Reranker throughput of a RerankerPool with 1, 2, 4 and 8 worker processes against the
+in-process model: latency of a single search, then throughput and latency of concurrent searches.
+
+Usage: python -m benchmarks.benchmark_reranker_pool --workers 1 2 4 8 --num-questions 200 --users 4
+"""
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from huggingface_interface import RerankerModel, RerankerPool
+from external_database import TriviaSQLiteManager
+
+def run(reranker_model, question_texts, users, searches, theme):
+    start_time = perf_counter()
+    reranker_model.compute_logits(theme, question_texts)
+    single = perf_counter() - start_time
+
+    def timed_search(search_idx):
+        start_time = perf_counter()
+        # Distinct themes: no search is answered by another one
+        reranker_model.compute_logits(f"{theme} {search_idx}", question_texts)
+        return perf_counter() - start_time
+
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        start_time = perf_counter()
+        latencies = np.array(list(executor.map(timed_search, range(users * searches))))
+        elapsed = perf_counter() - start_time
+
+    return single, latencies, len(latencies) * len(question_texts) / elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-name", default="BAAI/bge-reranker-v2-m3")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=128)
+    parser.add_argument("--num-questions", type=int, default=200, help="Questions reranked per search (the retrieval top-K)")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--searches", type=int, default=3, help="Searches per simulated user")
+    parser.add_argument("--theme", default="Harry Potter")
+    args = parser.parse_args()
+
+    db_manager = TriviaSQLiteManager()
+    _, question_texts = db_manager.load_question_texts()
+    question_texts = question_texts[:args.num_questions]
+    print(f"{os.cpu_count()} CPUs, {len(question_texts)} questions per search, {args.users} concurrent users")
+
+    reranker_model = RerankerModel(args.model_name, device="cpu", backend=args.backend)
+    reranker_model.load_model_and_tokenizer()
+    runs = [("in-process", reranker_model, None)]
+    for num_workers in args.workers:
+        pool = RerankerPool(num_workers, args.threads_per_worker, args.shard_size, model_name=args.model_name, device="cpu", backend=args.backend)
+        runs.append((f"{num_workers} workers", RerankerModel(args.model_name, device="cpu", backend=args.backend, pool=pool), pool))
+
+    for label, model, pool in runs:
+        if pool is not None:
+            pool.start()
+        try:
+            single, latencies, throughput = run(model, question_texts, args.users, args.searches, args.theme)
+        finally:
+            if pool is not None:
+                pool.close()
+        print(
+            f"{label:<11} | single search {single * 1000:8.1f} ms | concurrent p50 {np.percentile(latencies, 50) * 1000:8.1f} ms "
+            f"| p99 {np.percentile(latencies, 99) * 1000:8.1f} ms | {throughput:7.0f} pairs/s"
+        )
@@ -0,0 +1,58 @@
+"""
+Recall vs latency of the two-stage search (embedding index + reranker)
+against the full rerank of every question.
+
+Usage: python -m benchmarks.benchmark_retrieval --top-k 50 100 200 500
+"""
+import argparse
+from time import perf_counter
+
+from huggingface_interface import EmbeddingModel, RerankerModel
+from external_database import TriviaSQLiteManager
+from search_index import EmbeddingIndex
+
+DEFAULT_THEMES = ["Harry Potter", "Football", "Révolution française", "Astronomie", "Cuisine italienne", "Jeux vidéo", "Géographie de l'Afrique", "Musique classique"]
+
+def top_questions(reranker_model, theme, question_texts, n):
+    top_indices, _ = reranker_model.rerank_questions(theme, question_texts, top_k=n)
+    return [question_texts[idx] for idx in top_indices]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top-k", type=int, nargs="+", default=[50, 100, 200, 500])
+    parser.add_argument("--recall-at", type=int, default=20)
+    parser.add_argument("--themes", nargs="+", default=DEFAULT_THEMES)
+    args = parser.parse_args()
+
+    reranker_model = RerankerModel()
+    reranker_model.load_model_and_tokenizer()
+    embedding_model = EmbeddingModel()
+    embedding_model.load_model_and_tokenizer()
+
+    embedding_index = EmbeddingIndex(embedding_model)
+    if not embedding_index.load():
+        raise SystemExit("No embedding index found, run reindex.py first")
+
+    db_manager = TriviaSQLiteManager()
+    questions_df = db_manager.load_questions_as_dataframe(include_id=True)
+    question_texts = questions_df["question"].tolist()
+    print(f"{len(question_texts)} questions, {len(embedding_index)} indexed")
+
+    # Reference: full rerank
+    reference = {}
+    start_time = perf_counter()
+    for theme in args.themes:
+        reference[theme] = set(top_questions(reranker_model, theme, question_texts, args.recall_at))
+    full_latency = (perf_counter() - start_time) / len(args.themes)
+    print(f"full rerank        | recall@{args.recall_at} = 1.000 | {full_latency:.3f} s/theme")
+
+    for top_k in args.top_k:
+        recalls = []
+        start_time = perf_counter()
+        for theme in args.themes:
+            retrieved_ids, _ = embedding_index.retrieve(theme, top_k)
+            retrieved_texts = questions_df[questions_df["id"].isin(retrieved_ids)]["question"].tolist()
+            found = set(top_questions(reranker_model, theme, retrieved_texts, args.recall_at))
+            recalls.append(len(found & reference[theme]) / max(len(reference[theme]), 1))
+        latency = (perf_counter() - start_time) / len(args.themes)
+        print(f"two-stage K={top_k:<6} | recall@{args.recall_at} = {sum(recalls) / len(recalls):.3f} | {latency:.3f} s/theme | x{full_latency / latency:.1f}")
@@ -0,0 +1,58 @@
+"""
+Cold start of the reranker in fresh processes: import, load and warmup times, then the
+latency of the first and second searches, with and without warmup.
+
+Usage: python -m benchmarks.benchmark_startup --model-name BAAI/bge-reranker-v2-m3 --num-questions 200
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+LOAD_SCRIPT = """
+import json, sys
+from time import perf_counter
+start_time = perf_counter()
+from huggingface_interface import RerankerModel
+from external_database import TriviaSQLiteManager
+import_time = perf_counter() - start_time
+
+_, question_texts = TriviaSQLiteManager().load_question_texts()
+question_texts = question_texts[:int(sys.argv[2])]
+
+reranker_model = RerankerModel(sys.argv[1], device="cpu", backend=sys.argv[3])
+reranker_model.load_model_and_tokenizer(warmup=sys.argv[4] == "1")
+
+search_times = []
+for theme in ["Harry Potter", "Géographie"]:
+    start_time = perf_counter()
+    reranker_model.rerank_questions(theme, question_texts)
+    search_times.append(perf_counter() - start_time)
+
+print(json.dumps({"import": import_time, **reranker_model.timings, "first_search": search_times[0], "second_search": search_times[1]}))
+"""
+
+def run(model_name, num_questions, backend, warmup):
+    output = subprocess.run(
+        [sys.executable, "-c", LOAD_SCRIPT, model_name, str(num_questions), backend, "1" if warmup else "0"],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-name", default="BAAI/bge-reranker-v2-m3")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--num-questions", type=int, default=200)
+    args = parser.parse_args()
+
+    # A first run downloads or converts the model if needed
+    run(args.model_name, args.num_questions, args.backend, False)
+
+    for warmup in [False, True]:
+        timings = run(args.model_name, args.num_questions, args.backend, warmup)
+        print(
+            f"warmup {'on ' if warmup else 'off'} | import {timings['import']:6.2f} s | load {timings['load']:6.2f} s "
+            f"| warmup {timings.get('warmup', 0):6.2f} s | first search {timings['first_search'] * 1000:8.1f} ms "
+            f"| second search {timings['second_search'] * 1000:8.1f} ms"
+        )
@@ -0,0 +1,182 @@
+"""
+Reproducible end-to-end benchmark on deterministic synthetic corpora of several sizes, offline,
+with tiny local stand-in models: ingestion (bulk and insert_question), keyword search, page browsing,
+category loading, question catalog load, embedding index build, rerank_questions and the full semantic_search of the UI.
+
+Results are written as JSON; --compare flags the metrics that regressed against a previous run.
+
+Usage: python -m benchmarks.benchmark_suite --sizes 1000 10000 100000 --output results.json
+       python -m benchmarks.benchmark_suite --sizes 1000 10000 --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+import torch
+import transformers
+
+from api import GradioUI
+from external_database import QuestionCatalog, TriviaSQLiteManager
+from huggingface_interface import EmbeddingModel, RerankerModel
+from monitoring import metrics
+from search_index import EmbeddingIndex
+from .synthetic_corpus import generate_questions
+from .tiny_models import create_tiny_models
+
+SEARCH_TERMS = ["harry potter", "capital", "revolution", "ka", "zorborshi"]
+THEMES = ["Harry Potter", "Géographie de la France", "Football", "Jeux vidéo", "Révolution française"]
+
+def median_ms(function, repeat):
+    """
+    :return: Median duration of function() in milliseconds over repeat calls.
+    """
+    durations = []
+    for _ in range(repeat):
+        start_time = perf_counter()
+        function()
+        durations.append(perf_counter() - start_time)
+    return float(np.median(durations) * 1000)
+
+def run_size(num_questions, tmp_dir, models, args):
+    """
+    Benchmark every stage on a fresh synthetic database of num_questions questions.
+
+    :return: Dictionary metric name -> value (suffix _ms / _s / _mib: lower is better, _per_s: higher is better).
+    """
+    results = {}
+    db_path = os.path.join(tmp_dir, f"questions_{num_questions}.db")
+    corpus = generate_questions(num_questions + args.ingestion_sample, args.seed)
+
+    # Ingestion: bulk insert of the corpus, then one by one as the crawlers of a single question do
+    db_manager = TriviaSQLiteManager(db_path=db_path)
+    db_manager.connect()
+    db_manager.create_questions_table()
+    start_time = perf_counter()
+    db_manager.insert_questions(corpus[:num_questions])
+    results["bulk_insert_rows_per_s"] = num_questions / (perf_counter() - start_time)
+
+    start_time = perf_counter()
+    for question in corpus[num_questions:]:
+        db_manager.insert_question(question)
+    db_manager.commit()
+    results["insert_question_rows_per_s"] = args.ingestion_sample / (perf_counter() - start_time)
+    db_manager.close()
+
+    # Read path, as opened by the UI
+    db_manager = TriviaSQLiteManager(db_path=db_path, read_only=True)
+    results["keyword_search_ms"] = float(np.median([median_ms(lambda: db_manager.search_questions(term), args.repeat) for term in SEARCH_TERMS]))
+    results["browse_page_ms"] = median_ms(lambda: db_manager.load_questions_page(10, 50, "category", categories=["History", "history"]), args.repeat)
+    # A new manager per call: the first load after a start or a database change is not cached
+    results["categories_cold_ms"] = median_ms(lambda: TriviaSQLiteManager(db_path=db_path, read_only=True).get_all_categories(), args.repeat)
+    results["categories_cached_ms"] = median_ms(db_manager.get_all_categories, args.repeat)
+    results["load_questions_ms"] = median_ms(lambda: db_manager.load_questions_as_dataframe(include_id=True, skip_duplicates=True), args.repeat)
+    results["catalog_load_ms"] = median_ms(lambda: QuestionCatalog(db_manager).refresh(), args.repeat)
+    catalog = QuestionCatalog(db_manager)
+    catalog.refresh()
+    results["catalog_memory_mib"] = catalog.memory_usage()["total"] / 2**20
+    results["catalog_select_ms"] = median_ms(lambda: catalog.select(categories=["History", "history"]), args.repeat)
+
+    # Embedding index of the whole corpus
+    reranker_name, embedder_name = models
+    embedding_model = EmbeddingModel(embedder_name, local_path=args.models_path, device="cpu")
+    embedding_model.load_model_and_tokenizer(warmup=True)
+    embedding_index = EmbeddingIndex(embedding_model, index_path=os.path.join(tmp_dir, f"index_{num_questions}"), batch_size=args.batch_size)
+    start_time = perf_counter()
+    embedding_index.build(db_manager)
+    results["index_build_rows_per_s"] = len(embedding_index) / (perf_counter() - start_time)
+
+    # Reranking of a retrieval top-K
+    reranker_model = RerankerModel(reranker_name, local_path=args.models_path, device="cpu")
+    reranker_model.load_model_and_tokenizer(warmup=True)
+    _, question_texts = db_manager.load_question_texts()
+    rerank_texts = question_texts[:args.retrieval_top_k]
+    metrics.reset()
+    rerank_ms = float(np.median([median_ms(lambda: reranker_model.rerank_questions(theme, rerank_texts), 1) for theme in THEMES]))
+    results["rerank_ms"] = rerank_ms
+    results["rerank_pairs_per_s"] = len(rerank_texts) / rerank_ms * 1000
+    results["reranker_padding_ratio"] = metrics.snapshot()["rates"].get("reranker_padding_ratio", 0.0)
+
+    # Full semantic search of the UI, without score cache
+    ui = GradioUI(None, None, db_manager, reranker_model, embedding_index, retrieval_top_k=args.retrieval_top_k, catalog=catalog)
+    results["semantic_search_ms"] = float(np.median([median_ms(lambda: list(ui.semantic_search(theme, None)), 1) for theme in THEMES]))
+    results["semantic_search_category_ms"] = float(np.median([median_ms(lambda: list(ui.semantic_search(theme, ["History", "history"])), 1) for theme in THEMES]))
+
+    db_manager.pool.close_all()
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "transformers": transformers.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+    }
+
+def compare(results, baseline, tolerance):
+    """
+    Print the relative change of each metric against a previous run.
+
+    :return: List of (size, metric, change) of the metrics worse than the baseline by more than tolerance.
+    """
+    regressions = []
+    for size, size_results in results["sizes"].items():
+        for name, value in size_results.items():
+            previous = baseline.get("sizes", {}).get(size, {}).get(name)
+            if not previous or name.endswith("_ratio"):
+                continue
+            change = value / previous - 1
+            # Durations and memory should go down, throughputs up
+            worse = change > tolerance if name.endswith(("_ms", "_s", "_mib")) and not name.endswith("_per_s") else change < -tolerance
+            print(f"{size:>7} | {name:<30} | {previous:12.2f} -> {value:12.2f} | {change:+7.1%}{'  REGRESSION' if worse else ''}")
+            if worse:
+                regressions.append((size, name, change))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ingestion-sample", type=int, default=1000, help="Questions inserted one by one with insert_question")
+    parser.add_argument("--retrieval-top-k", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=256, help="Batch size of the embedding index build")
+    parser.add_argument("--models-path", default=None, help="Where the tiny models are written (temporary directory if None)")
+    parser.add_argument("--output", default=None, help="JSON file receiving the results")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    results = {"environment": environment(), "parameters": vars(args), "sizes": {}}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        args.models_path = args.models_path or os.path.join(tmp_dir, "models")
+        models = create_tiny_models(args.models_path, seed=args.seed)
+
+        for num_questions in args.sizes:
+            start_time = perf_counter()
+            size_results = run_size(num_questions, tmp_dir, models, args)
+            results["sizes"][str(num_questions)] = size_results
+            print(f"{num_questions} questions ({perf_counter() - start_time:.0f} s): " + ", ".join(f"{name} {value:.4g}" for name, value in size_results.items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
@@ -0,0 +1,149 @@
+"""
+Local HTTP server emulating OpenTDB and TheTriviaAPI, to run the ingestion
+offline: OpenTDB response codes 0 (success), 1 (more questions asked than the category has),
+4 (more questions asked than the token has left, e.g. the last page of a category) and 5 (rate limited, HTTP 429), and TheTriviaAPI HTTP 429.
+
+Usage:
+    server = StubTriviaServer(questions_per_category=120)
+    server.start()
+    db = TriviaSQLiteManager(db_path=...)
+    db.base_url = server.url
+    ...
+    server.stop()
+"""
+import json
+import random
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic
+from urllib.parse import parse_qs, urlparse
+
+TRIVIA_API_CATEGORIES = ["music", "sport_and_leisure", "film_and_tv", "arts_and_literature", "history", "society_and_culture", "science", "geography", "food_and_drink", "general_knowledge"]
+
+class StubTriviaServer:
+    def __init__(
+        self,
+        num_categories=8,
+        questions_per_category=120,
+        opentdb_min_interval=0.05,
+        trivia_api_max_rps=20,
+        seed=0,
+    ):
+        """
+        :param num_categories: Number of OpenTDB categories.
+        :param questions_per_category: Number of distinct questions per category (both APIs).
+        :param opentdb_min_interval: Minimum delay between two OpenTDB questions requests, faster requests get code 5.
+        :param trivia_api_max_rps: Maximum TheTriviaAPI requests per second, more requests get HTTP 429.
+        """
+        self.num_categories = num_categories
+        self.questions_per_category = questions_per_category
+        self.opentdb_min_interval = opentdb_min_interval
+        self.trivia_api_max_rps = trivia_api_max_rps
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.served = {}
+        self.last_opentdb_request = 0.0
+        self.trivia_api_requests = deque()
+        self.response_counts = {}
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                status, body = stub.handle(parsed.path, {key: values[0] for key, values in parse_qs(parsed.query).items()})
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, key):
+        self.response_counts[key] = self.response_counts.get(key, 0) + 1
+
+    def question(self, source, category, idx):
+        return f"{source} question {idx} about {category}?"
+
+    def handle(self, path, params):
+        with self.lock:
+            if path == "/api_category.php":
+                return 200, {"trivia_categories": [{"id": 9 + idx, "name": f"Category {idx}"} for idx in range(self.num_categories)]}
+
+            if path == "/api_token.php":
+                return 200, {"response_code": 0, "token": "stub-token"}
+
+            if path == "/api.php":
+                return self.handle_opentdb(int(params["amount"]), params["category"], params.get("token", ""))
+
+            if path == "/api/questions":
+                return self.handle_trivia_api(int(params["limit"]), params["categories"])
+
+            return 404, {}
+
+    def handle_opentdb(self, amount, category, token):
+        now = monotonic()
+        if now - self.last_opentdb_request < self.opentdb_min_interval:
+            self.count("opentdb_5")
+            return 429, {"response_code": 5, "results": []}
+        self.last_opentdb_request = now
+
+        served = self.served.get((token, category), 0)
+        remaining = self.questions_per_category - served
+        if amount > self.questions_per_category:
+            self.count("opentdb_1")
+            return 200, {"response_code": 1, "results": []}
+        if amount > remaining:
+            self.count("opentdb_4")
+            return 200, {"response_code": 4, "results": []}
+
+        self.served[(token, category)] = served + amount
+        self.count("opentdb_0")
+        return 200, {"response_code": 0, "results": [{
+            "type": "multiple",
+            "difficulty": self.random.choice(["easy", "medium", "hard"]),
+            "category": f"Category {int(category) - 9}",
+            "question": self.question("OpenTDB", category, idx),
+            "correct_answer": "A",
+            "incorrect_answers": ["B", "C", "D"],
+        } for idx in range(served, served + amount)]}
+
+    def handle_trivia_api(self, limit, category):
+        now = monotonic()
+        while self.trivia_api_requests and now - self.trivia_api_requests[0] > 1:
+            self.trivia_api_requests.popleft()
+        if len(self.trivia_api_requests) >= self.trivia_api_max_rps:
+            self.count("trivia_api_429")
+            return 429, {"error": "Too many requests"}
+        self.trivia_api_requests.append(now)
+
+        # Random draw: the same question can be served several times, like the real API
+        self.count("trivia_api_200")
+        return 200, [{
+            "category": category,
+            "question": self.question("TheTriviaAPI", category, idx),
+            "correctAnswer": "A",
+            "incorrectAnswers": ["B", "C", "D"],
+            "difficulty": self.random.choice(["easy", "medium", "hard"]),
+            "type": "Multiple Choice",
+        } for idx in self.random.sample(range(self.questions_per_category), min(limit, self.questions_per_category))]
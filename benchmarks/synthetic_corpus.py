@@ -0,0 +1,122 @@
+"""
+Deterministic synthetic trivia corpus in the standard question format of DatabaseManager.insert_question.
+
+Question lengths follow a log-normal distribution close to the OpenTDB / The Trivia API questions
+(median around 13 words), words are drawn from a Zipf-distributed vocabulary mixing real topical words
+and generated ones, and categories, difficulties and sources follow the skewed distributions of the
+real APIs (many "Entertainment: Video Games" questions, few "Mythology" ones...).
+
+Usage: python -m benchmarks.synthetic_corpus --num-questions 10000 --db-path /tmp/synthetic.db
+"""
+import argparse
+import math
+import random
+from itertools import accumulate
+
+# (category, source, relative weight), roughly the sizes of the real categories
+CATEGORIES = [
+    ("Entertainment: Video Games", "OpenTDB", 10.0),
+    ("Entertainment: Music", "OpenTDB", 4.0),
+    ("General Knowledge", "OpenTDB", 3.0),
+    ("History", "OpenTDB", 3.2),
+    ("Science & Nature", "OpenTDB", 2.5),
+    ("Geography", "OpenTDB", 2.7),
+    ("Entertainment: Film", "OpenTDB", 2.5),
+    ("Sports", "OpenTDB", 1.8),
+    ("Entertainment: Books", "OpenTDB", 1.0),
+    ("Entertainment: Japanese Anime & Manga", "OpenTDB", 1.8),
+    ("Science: Computers", "OpenTDB", 1.6),
+    ("Mythology", "OpenTDB", 0.6),
+    ("Art", "OpenTDB", 0.4),
+    ("Celebrities", "OpenTDB", 0.5),
+    ("Animals", "OpenTDB", 0.5),
+    ("music", "TheTriviaAPI", 2.0),
+    ("sport_and_leisure", "TheTriviaAPI", 2.0),
+    ("film_and_tv", "TheTriviaAPI", 2.0),
+    ("arts_and_literature", "TheTriviaAPI", 2.0),
+    ("history", "TheTriviaAPI", 2.0),
+    ("society_and_culture", "TheTriviaAPI", 2.0),
+    ("science", "TheTriviaAPI", 2.0),
+    ("geography", "TheTriviaAPI", 2.0),
+    ("food_and_drink", "TheTriviaAPI", 2.0),
+    ("general_knowledge", "TheTriviaAPI", 2.0),
+]
+DIFFICULTIES = [("easy", 0.35), ("medium", 0.45), ("hard", 0.20)]
+
+OPENINGS = ["What is", "Which", "Who", "In which year", "What was", "Which of these", "How many", "Where is", "Who wrote", "What does", "Quel est", "Qui a"]
+TOPICAL_WORDS = [
+    "the", "of", "in", "a", "and", "first", "name", "game", "series", "song", "album", "band", "film", "movie", "character",
+    "country", "capital", "city", "river", "mountain", "ocean", "island", "king", "queen", "war", "empire", "revolution",
+    "president", "world", "cup", "team", "player", "football", "olympic", "planet", "element", "chemical", "symbol", "animal",
+    "species", "novel", "author", "painter", "painting", "composer", "opera", "language", "currency", "flag", "largest",
+    "smallest", "famous", "released", "founded", "invented", "discovered", "called", "known", "original", "director", "actor",
+    "Harry", "Potter", "Mario", "Zelda", "Pokemon", "Beatles", "Shakespeare", "Napoleon", "Rome", "Paris", "France", "Japan",
+    "Egypt", "Greek", "god", "computer", "programming", "anime", "manga", "food", "dish", "wine", "cheese", "capitale",
+    "roi", "guerre", "chanteur", "roman", "écrivain", "océan", "peintre", "révolution", "fleuve", "île",
+]
+SYLLABLES = ["ka", "to", "ri", "men", "sa", "lo", "vin", "dra", "el", "qua", "ne", "bor", "ti", "gan", "us", "mi", "zor", "pe", "la", "shi"]
+
+def vocabulary(size=5000, seed=0):
+    """
+    :return: List of words sorted by decreasing frequency: the topical words first, then generated words.
+    """
+    rng = random.Random(seed)
+    words = list(TOPICAL_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+        if rng.random() < 0.3:
+            word = word.capitalize()
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+def generate_questions(num_questions, seed=0, vocabulary_size=5000):
+    """
+    Generate num_questions distinct questions in the standard format, always the same for a given seed.
+    """
+    rng = random.Random(seed)
+    words = vocabulary(vocabulary_size, seed)
+    word_cum_weights = list(accumulate(1 / (rank + 1) ** 1.1 for rank in range(len(words))))
+    category_cum_weights = list(accumulate(weight for _, _, weight in CATEGORIES))
+    difficulty_cum_weights = list(accumulate(weight for _, weight in DIFFICULTIES))
+
+    questions = []
+    seen = set()
+    while len(questions) < num_questions:
+        # Log-normal number of words after the opening, median ~10
+        num_words = min(45, max(3, round(math.exp(rng.gauss(2.3, 0.45)))))
+        text = f"{rng.choice(OPENINGS)} {' '.join(rng.choices(words, cum_weights=word_cum_weights, k=num_words))} ?"
+        if text in seen:
+            continue
+        seen.add(text)
+
+        category, source, _ = rng.choices(CATEGORIES, cum_weights=category_cum_weights)[0]
+        answers = [" ".join(rng.choices(words, cum_weights=word_cum_weights, k=rng.randint(1, 3))) for _ in range(4)]
+        questions.append({
+            "question": text,
+            "correct_answer": answers[0],
+            "incorrect_answers": answers[1:],
+            "category": category,
+            "difficulty": rng.choices(DIFFICULTIES, cum_weights=difficulty_cum_weights)[0][0],
+            "type": "multiple",
+            "source": source,
+        })
+    return questions
+
+if __name__ == "__main__":
+    from external_database import TriviaSQLiteManager
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-questions", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db-path", required=True)
+    args = parser.parse_args()
+
+    db_manager = TriviaSQLiteManager(db_path=args.db_path)
+    db_manager.connect()
+    db_manager.create_questions_table()
+    inserted, duplicates = db_manager.insert_questions(generate_questions(args.num_questions, args.seed))
+    db_manager.close()
+    print(f"{inserted} synthetic questions written to {args.db_path} ({duplicates} already present)")
@@ -0,0 +1,55 @@
+"""
+Tiny local stand-ins for the reranker and the embedding model (2-layer BERT, random weights) with a
+word-piece vocabulary built from the synthetic corpus, saved where ModelLoader looks for downloaded models:
+benchmarks run offline in seconds while exercising the real tokenization, batching and scoring code.
+The scores are meaningless, only the timings are.
+"""
+import os
+import string
+import tempfile
+
+import torch
+from transformers import BertConfig, BertModel, BertForSequenceClassification, BertTokenizerFast
+
+from .synthetic_corpus import vocabulary
+
+TINY_RERANKER = "synthetic/tiny-reranker"
+TINY_EMBEDDER = "synthetic/tiny-embedder"
+
+def create_tiny_models(local_path, hidden_size=64, num_layers=2, seed=0):
+    """
+    Write the tiny reranker and embedding model under local_path (skipped if they already exist).
+
+    :return: The tuple (reranker model name, embedding model name) to pass to RerankerModel / EmbeddingModel.
+    """
+    if all(os.path.exists(os.path.join(local_path, name)) for name in [TINY_RERANKER, TINY_EMBEDDER]):
+        return TINY_RERANKER, TINY_EMBEDDER
+
+    # Corpus words are single tokens, other words (themes...) are split into characters like rare word pieces
+    special_tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    characters = list(string.ascii_lowercase + string.digits + string.punctuation)
+    words = {word.lower() for word in vocabulary(seed=seed)}
+    tokens = special_tokens + characters + [f"##{character}" for character in characters] + sorted(words - set(characters))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vocab_file = os.path.join(tmp_dir, "vocab.txt")
+        with open(vocab_file, "w") as f:
+            f.write("\n".join(tokens))
+        tokenizer = BertTokenizerFast(vocab_file, model_max_length=512)
+
+    torch.manual_seed(seed)
+    config = BertConfig(
+        vocab_size=len(tokens),
+        hidden_size=hidden_size,
+        num_hidden_layers=num_layers,
+        num_attention_heads=2,
+        intermediate_size=hidden_size * 4,
+        max_position_embeddings=512,
+        num_labels=1,
+    )
+    for name, model_class in [(TINY_RERANKER, BertForSequenceClassification), (TINY_EMBEDDER, BertModel)]:
+        model_path = os.path.join(local_path, name)
+        model_class(config).save_pretrained(model_path)
+        tokenizer.save_pretrained(model_path)
+
+    return TINY_RERANKER, TINY_EMBEDDER
@@ -0,0 +1,81 @@
+import argparse
+import json
+import sys
+from time import perf_counter
+
+from env import RETRIEVAL_TOP_K, MODEL_BACKEND
+
+from api import BatchSearch
+from huggingface_interface import EmbeddingModel, RerankerModel
+from external_database import TriviaSQLiteManager
+from search_index import EmbeddingIndex
+
+def read_requests(path, categories=None, difficulties=None):
+    """
+    One request per line: a JSON object {"theme": ..., "categories": [...], "difficulties": [...], "top_k": ...},
+    a JSON string or a plain theme. The command line filters apply to the requests that do not set their own.
+    Any other JSON value (number, list, null...) or an object without a theme raises a ValueError.
+    """
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                request = line
+            if isinstance(request, str):
+                request = {"theme": request}
+            elif not isinstance(request, dict):
+                raise ValueError(f"Line {line_number}: expected a theme or a JSON object, got a JSON {type(request).__name__}: {line}")
+            if "theme" not in request:
+                raise ValueError(f"Line {line_number}: the request has no \"theme\": {line}")
+            if categories:
+                request.setdefault("categories", categories)
+            if difficulties:
+                request.setdefault("difficulties", difficulties)
+            yield request
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the question set of each theme of a file, written as JSON lines")
+    parser.add_argument("themes", help="Themes file (one theme or JSON request per line), - for stdin")
+    parser.add_argument("--output", required=True, help="JSON lines output file")
+    parser.add_argument("--top-k", type=int, default=20, help="Questions per theme (unless set by the request)")
+    parser.add_argument("--categories", nargs="+", default=None)
+    parser.add_argument("--difficulties", nargs="+", default=None)
+    parser.add_argument("--retrieval-top-k", type=int, default=RETRIEVAL_TOP_K)
+    parser.add_argument("--themes-per-batch", type=int, default=32)
+    parser.add_argument("--backend", default=MODEL_BACKEND, help="Inference backend of the models (torch, torch-int8, onnx-int8)")
+    args = parser.parse_args()
+
+    reranker_model = RerankerModel(backend=args.backend)
+    reranker_model.load_model_and_tokenizer(warmup=True)
+
+    embedding_model = EmbeddingModel(backend=args.backend)
+    embedding_index = EmbeddingIndex(embedding_model)
+    if embedding_index.load():
+        embedding_model.load_model_and_tokenizer()
+    else:
+        embedding_index = None
+        print("No embedding index found, every question will go through the reranker", file=sys.stderr)
+
+    batch_search = BatchSearch(
+        TriviaSQLiteManager(read_only=True),
+        reranker_model,
+        embedding_index,
+        retrieval_top_k=args.retrieval_top_k,
+        top_k=args.top_k,
+        themes_per_batch=args.themes_per_batch,
+    )
+
+    start_time = perf_counter()
+    num_themes = 0
+    with open(args.output, "w", encoding="utf-8") as f:
+        for result in batch_search.search(read_requests(args.themes, args.categories, args.difficulties)):
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            num_themes += 1
+
+    elapsed = perf_counter() - start_time
+    print(f"{num_themes} themes in {elapsed:.1f} s ({num_themes / elapsed * 60:.0f} themes/minute)", file=sys.stderr)
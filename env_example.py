@@ -2,4 +2,16 @@ SERVER_IP = "0.0.0.0" # "0.0.0.0" to listen to all network interfaces
 PORT = 0 # Example: 8050
 
 PRETRAINED_HUGGINGFACE_MODELS_PATH = "path/to/huggingface_models"
-DATABASE_PATH = "path/to/database"
\ No newline at end of file
+DATABASE_PATH = "path/to/database"
+EMBEDDING_INDEX_PATH = "path/to/embedding_index"
+RETRIEVAL_TOP_K = 200 # Number of questions kept by the embedding index before reranking
+MODEL_BACKEND = "torch" # "torch", or on CPU "torch-int8" / "onnx-int8" (int8 quantized, requires onnx and onnxruntime)
+RERANKER_WORKERS = 0 # Number of reranker worker processes, 0 to rerank in the UI process
+RERANKER_THREADS_PER_WORKER = None # torch threads of each worker, None to share the cores between the workers
+MICRO_BATCHING_MAX_WAIT = None # Window (s) merging the model batches of concurrent searches, e.g. 0.01, None to disable
+SEMANTIC_SEARCH_CONCURRENCY = 16 # Semantic searches Gradio runs at once with micro-batching (only simultaneous searches share batches), otherwise max(1, RERANKER_WORKERS)
+BACKGROUND_MODEL_LOADING = True # Start the UI right away and load / warm up the models in a background thread
+PROFILE_DIR = None # Directory receiving a cProfile dump (.prof) of every semantic search, None to disable
+PROFILE_TORCH = False # With PROFILE_DIR, also write a torch profiler trace (.json) of every semantic search
+THEME_PHRASINGS_PATH = None # JSON file {theme: [phrasing, ...]} of extra phrasings (e.g. English translations), see theme_phrasings_example.json
+PHRASINGS_PER_QUESTION = 1 # Phrasings (closest by embeddings) each question is reranked against, None for all of them
@@ -1,2 +1,3 @@
 from .open_trivia_db import TriviaSQLiteManager
-from .the_trivia_api import TheTriviaAPISQLiteManager
\ No newline at end of file
+from .the_trivia_api import TheTriviaAPISQLiteManager
+from .question_catalog import QuestionCatalog
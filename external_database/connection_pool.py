@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from monitoring import metrics
+
+# Pool de connexions SQLite : une connexion persistante par thread
+class ConnectionPool:
+    def __init__(
+        self,
+        db_path,
+        read_only=False,
+        timeout=30,
+        cached_statements=256,
+    ):
+        """
+        :param db_path: Chemin de la base SQLite
+        :param read_only: Ouvre les connexions en lecture seule (URI mode=ro), pour l'interface
+        :param timeout: Attente maximale (en secondes) quand la base est verrouillée par un écrivain
+        :param cached_statements: Nombre de requêtes préparées conservées par connexion
+        """
+        self.db_path = db_path
+        self.read_only = read_only
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+        if read_only:
+            enable_wal(db_path)
+
+    def _open(self):
+        if self.read_only:
+            uri = Path(self.db_path).absolute().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=self.timeout, cached_statements=self.cached_statements, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, cached_statements=self.cached_statements, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def connection(self):
+        """Retourne la connexion du thread courant (ouverte au premier appel)"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def query(self, query, params=()):
+        """Exécute une requête préparée et retourne toutes les lignes"""
+        with metrics.timer("sqlite_query"):
+            return self.connection().execute(query, params).fetchall()
+
+    def query_dataframe(self, query, params=()):
+        """Exécute une requête préparée et retourne le résultat sous forme de DataFrame"""
+        with metrics.timer("sqlite_query_dataframe"):
+            return pd.read_sql_query(query, self.connection(), params=params)
+
+    def data_version(self):
+        """
+        Jeton qui change dès qu'une transaction est validée dans la base (par n'importe quel processus),
+        utilisé pour invalider les résultats mis en cache
+        """
+        version = []
+        for path in [self.db_path, self.db_path + "-wal"]:
+            try:
+                stat = os.stat(path)
+                version.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    def close_all(self):
+        """Ferme toutes les connexions du pool"""
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        self.local = threading.local()
+
+def enable_wal(db_path):
+    """Active le mode WAL (persistant dans le fichier) pour que les lectures ne bloquent pas les écritures"""
+    if not os.path.exists(db_path):
+        return
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError:
+        pass
+    finally:
+        conn.close()
@@ -1,23 +1,53 @@
 import sqlite3
-import pandas as pd
+import threading
+import hashlib
 import html
 import json
+import re
+from collections import OrderedDict
+
+from .connection_pool import ConnectionPool
+from monitoring import metrics
 
 from env import DATABASE_PATH
 
+# Colonnes proposées au tri et aux filtres du navigateur de questions (toutes indexées)
+SORTABLE_COLUMNS = ["id", "question", "category", "difficulty", "source"]
+FILTER_COLUMNS = ["category", "difficulty", "source"]
+
 # Classe générique de gestion de base de données
 class DatabaseManager:
     def __init__(
         self, 
         db_path=DATABASE_PATH,
+        read_only=False,
+        cache_size=256,
     ):
+        """
+        :param db_path: Chemin de la base SQLite
+        :param read_only: Lectures en lecture seule (interface), les écritures passent par connect()
+        :param cache_size: Nombre de résultats gardés par cached_query, les moins récemment utilisés sont oubliés
+        """
         self.db_path = db_path
         self.conn = None
         self.cursor = None
+        # Empreintes des questions déjà en base, chargées au premier insert_questions
+        self.question_hashes = None
+        # Détection facultative des quasi-doublons à l'insertion (search_index.NearDuplicateDetector)
+        self.duplicate_detector = None
+        # Lectures concurrentes (interface Gradio) : une connexion persistante par thread
+        self.pool = ConnectionPool(db_path, read_only=read_only)
+        # Un résultat par combinaison de filtres du navigateur (une par frappe) : taille bornée, LRU
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_lock = threading.Lock()
 
     def connect(self):
-        """Connexion à la base de données"""
+        """Connexion à la base de données (écriture)"""
         self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # En WAL, NORMAL reste cohérent après un crash et évite un fsync à chaque validation
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         self.cursor = self.conn.cursor()
 
     def close(self):
@@ -50,30 +80,255 @@ class DatabaseManager:
             source TEXT
         )
         """)
+        self.create_embedding_queue_table()
+        self.create_fts_index()
+        self.create_browse_indexes()
         self.commit()
 
-    def load_questions_as_dataframe(self, search_term=""):
-        """Charge les questions depuis la base sous forme de DataFrame, avec filtre facultatif"""
-        self.connect()
-        query = """
-            SELECT question, correct_answer, incorrect_answers, category, difficulty, source
+    def create_browse_indexes(self):
+        """Index des colonnes filtrées et triées par la pagination (question est déjà indexée par UNIQUE)"""
+        for column in FILTER_COLUMNS:
+            self.execute(f"CREATE INDEX IF NOT EXISTS questions_{column} ON questions ({column})")
+
+    def create_fts_index(self):
+        """
+        Création de l'index plein texte (FTS5) des questions, tenu à jour par des triggers.
+        La tokenisation ignore la casse et les accents.
+        """
+        self.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'questions_fts'")
+        already_exists = self.cursor.fetchone() is not None
+
+        self.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+            question, correct_answer, incorrect_answers, category,
+            content='questions', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """)
+        self.execute("""
+        CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions
+        BEGIN
+            INSERT INTO questions_fts (rowid, question, correct_answer, incorrect_answers, category)
+            VALUES (new.id, new.question, new.correct_answer, new.incorrect_answers, new.category);
+        END
+        """)
+        self.execute("""
+        CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions
+        BEGIN
+            INSERT INTO questions_fts (questions_fts, rowid, question, correct_answer, incorrect_answers, category)
+            VALUES ('delete', old.id, old.question, old.correct_answer, old.incorrect_answers, old.category);
+        END
+        """)
+        self.execute("""
+        CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE ON questions
+        BEGIN
+            INSERT INTO questions_fts (questions_fts, rowid, question, correct_answer, incorrect_answers, category)
+            VALUES ('delete', old.id, old.question, old.correct_answer, old.incorrect_answers, old.category);
+            INSERT INTO questions_fts (rowid, question, correct_answer, incorrect_answers, category)
+            VALUES (new.id, new.question, new.correct_answer, new.incorrect_answers, new.category);
+        END
+        """)
+
+        # Indexation des questions présentes avant la création de l'index
+        if not already_exists:
+            self.execute("INSERT INTO questions_fts (questions_fts) VALUES ('rebuild')")
+
+    def create_embedding_queue_table(self):
+        """
+        Création de la file des questions à (ré)indexer par l'index d'embeddings.
+        Chaque (re)mise en file reçoit un nouveau numéro seq croissant : une indexation ne retire
+        que les entrées qu'elle a vues, pas celles ajoutées ou modifiées pendant son calcul.
+        """
+        self.execute("SELECT name FROM pragma_table_info('embedding_queue')")
+        columns = [row[0] for row in self.cursor.fetchall()]
+        queued_ids = []
+        if columns and "seq" not in columns:
+            # Ancienne file sans numéro d'ordre : reprise des entrées, trigger recréé avec INSERT OR REPLACE
+            self.execute("SELECT question_id FROM embedding_queue")
+            queued_ids = [row[0] for row in self.cursor.fetchall()]
+            self.execute("DROP TRIGGER IF EXISTS questions_embedding_update")
+            self.execute("DROP TABLE embedding_queue")
+        self.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_queue (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            question_id INTEGER UNIQUE
+        )
+        """)
+        self.mark_questions_dirty(queued_ids)
+        # Une question dont le texte change doit être ré-embeddée
+        self.execute("""
+        CREATE TRIGGER IF NOT EXISTS questions_embedding_update AFTER UPDATE OF question ON questions
+        BEGIN
+            INSERT OR REPLACE INTO embedding_queue (question_id) VALUES (new.id);
+        END
+        """)
+
+    def cached_query(self, key, load):
+        """Retourne le résultat de load() mis en cache tant que la base n'a pas été modifiée"""
+        version = self.pool.data_version()
+        with self.cache_lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] == version:
+                self.cache.move_to_end(key)
+                metrics.increment("db_cache_hits")
+                return cached[1]
+
+        metrics.increment("db_cache_misses")
+        result = load()
+        with self.cache_lock:
+            self.cache[key] = (version, result)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    def load_questions_as_dataframe(self, search_term="", include_id=False, skip_duplicates=False):
+        """
+        Charge les questions depuis la base sous forme de DataFrame, avec filtre facultatif.
+        skip_duplicates ne garde que la question canonique de chaque groupe de quasi-doublons.
+        """
+        query = f"""
+            SELECT {"id, " if include_id else ""}question, correct_answer, incorrect_answers, category, difficulty, source
             FROM questions
         """
-        df = pd.read_sql_query(query, self.conn)
-        self.close()
+        if skip_duplicates and self.has_table("question_duplicates"):
+            query += " WHERE id NOT IN (SELECT question_id FROM question_duplicates)"
+
+        with metrics.timer("db_load_questions"):
+            df = self.pool.query_dataframe(query)
 
-        if search_term:
-            df = df[df["question"].str.contains(search_term, case=False, na=False)]
+            if search_term:
+                df = df[df["question"].str.contains(search_term, case=False, na=False)]
 
         return df
+
+    @staticmethod
+    def fts_query(search_term):
+        """Convertit la saisie de l'utilisateur en requête FTS5 : chaque mot est cherché comme préfixe"""
+        words = re.findall(r"\w+", search_term)
+        return " AND ".join(f'"{word}"*' for word in words)
+
+    def has_table(self, table_name):
+        """Vérifie qu'une table existe dans la base"""
+        return self.cached_query(
+            ("has_table", table_name),
+            lambda: bool(self.pool.query("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)))
+        )
+
+    def has_fts_index(self):
+        """Vérifie que l'index plein texte a été créé (par create_questions_table)"""
+        return self.has_table("questions_fts")
+
+    def search_questions(self, search_term="", limit=100, offset=0, order_by="id"):
+        """
+        Recherche par mots-clés dans les questions, réponses et catégories.
+        Retourne une page de résultats (LIMIT/OFFSET) sous forme de DataFrame, dans l'ordre de la table
+        (order_by="id", le plus rapide) ou par pertinence bm25 (order_by="rank", trie toutes les correspondances).
+        """
+        columns = "q.question, q.correct_answer, q.incorrect_answers, q.category, q.difficulty, q.source"
+        fts_query = self.fts_query(search_term)
+
+        if not fts_query or not self.has_fts_index():
+            # Sans mot-clé, ou base créée avant l'index plein texte et ouverte en lecture seule (filtre LIKE) :
+            # même requête paginée sur la table que load_questions_page, seules les lignes de la page sont lues
+            where, params = self.questions_filter(search_term)
+            query = f"SELECT {columns} FROM questions q {where} ORDER BY q.id LIMIT ? OFFSET ?"
+            return self.pool.query_dataframe(query, (*params, limit, offset))
+
+        query = f"""
+            SELECT {columns}
+            FROM questions_fts f JOIN questions q ON q.id = f.rowid
+            WHERE questions_fts MATCH ?
+            ORDER BY {"f.rank" if order_by == "rank" else "f.rowid"}
+            LIMIT ? OFFSET ?
+        """
+        return self.pool.query_dataframe(query, (fts_query, limit, offset))
+
+    def questions_filter(self, search_term="", categories=None, difficulties=None, sources=None):
+        """
+        Construit la clause WHERE commune au comptage et à la lecture d'une page :
+        recherche par mots-clés (FTS5) et filtres facultatifs sur la catégorie, la difficulté et la source.
+        Retourne le tuple (clause, paramètres).
+        """
+        conditions = []
+        params = []
+
+        fts_query = self.fts_query(search_term)
+        if fts_query:
+            if self.has_fts_index():
+                conditions.append("q.id IN (SELECT rowid FROM questions_fts WHERE questions_fts MATCH ?)")
+                params.append(fts_query)
+            else:
+                # Base créée avant l'index plein texte et ouverte en lecture seule
+                conditions.append("q.question LIKE ?")
+                params.append(f"%{search_term.strip()}%")
+
+        for column, values in zip(FILTER_COLUMNS, [categories, difficulties, sources]):
+            if values:
+                conditions.append(f"q.{column} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+
+        return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+    def count_questions(self, search_term="", categories=None, difficulties=None, sources=None):
+        """Nombre de questions correspondant aux filtres (mis en cache jusqu'à la prochaine modification de la base)"""
+        where, params = self.questions_filter(search_term, categories, difficulties, sources)
+        return self.cached_query(
+            ("count", where, tuple(params)),
+            lambda: self.pool.query(f"SELECT COUNT(*) FROM questions q {where}", params)[0][0]
+        )
+
+    def load_questions_page(
+        self,
+        page=1,
+        page_size=50,
+        sort_by="id",
+        descending=False,
+        search_term="",
+        categories=None,
+        difficulties=None,
+        sources=None,
+    ):
+        """
+        Charge une page de questions (numérotée à partir de 1) triée par une colonne indexée, avec filtres facultatifs.
+        Seules page_size lignes sont lues et renvoyées.
+        Retourne le tuple (DataFrame de la page, nombre total de questions correspondant aux filtres).
+        """
+        if sort_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"Tri impossible sur la colonne '{sort_by}', colonnes possibles : {SORTABLE_COLUMNS}")
+
+        with metrics.timer("db_load_questions_page"):
+            where, params = self.questions_filter(search_term, categories, difficulties, sources)
+            total = self.count_questions(search_term, categories, difficulties, sources)
+
+            # L'identifiant départage les égalités pour que les pages restent stables
+            query = f"""
+                SELECT q.question, q.correct_answer, q.incorrect_answers, q.category, q.difficulty, q.source
+                FROM questions q
+                {where}
+                ORDER BY q.{sort_by} {"DESC" if descending else "ASC"}, q.id
+                LIMIT ? OFFSET ?
+            """
+            df = self.pool.query_dataframe(query, (*params, page_size, (max(1, page) - 1) * page_size))
+        return df, total
+
+    def load_question_texts(self):
+        """Retourne les identifiants et les textes de toutes les questions, triés par identifiant"""
+        rows = self.pool.query("SELECT id, question FROM questions ORDER BY id")
+        return [row[0] for row in rows], [row[1] for row in rows]
     
+    def get_distinct_values(self, column) -> list:
+        """Retourne les valeurs distinctes d'une colonne filtrable (mises en cache jusqu'à la prochaine modification de la base)"""
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Colonne '{column}' non filtrable, colonnes possibles : {FILTER_COLUMNS}")
+        return self.cached_query(
+            ("distinct", column),
+            lambda: [row[0] for row in self.pool.query(f"SELECT DISTINCT {column} FROM questions ORDER BY {column}")]
+        )
+
     def get_all_categories(self) -> list:
-        """Retourne la liste des catégories distinctes"""
-        self.connect()
-        query = "SELECT DISTINCT category FROM questions ORDER BY category"
-        categories = [row[0] for row in self.cursor.execute(query).fetchall()]
-        self.close()
-        return categories
+        """Retourne la liste des catégories distinctes (mise en cache jusqu'à la prochaine modification de la base)"""
+        return self.get_distinct_values("category")
     
     def insert_question(self, standardized_question):
         """
@@ -94,20 +349,132 @@ class DatabaseManager:
                 question, correct_answer, incorrect_answers,
                 category, difficulty, type, source
             ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                html.unescape(standardized_question["question"]),
-                html.unescape(standardized_question["correct_answer"]),
-                json.dumps(standardized_question["incorrect_answers"]),
-                standardized_question.get("category", ""),
-                standardized_question.get("difficulty", ""),
-                standardized_question.get("type", ""),
-                standardized_question.get("source", "unknown")
-            ))
+            """, self.question_row(standardized_question))
+            question_id = self.cursor.lastrowid
+            # Nouvelle question à embedder au prochain reindex.py --incremental
+            self.mark_questions_dirty([question_id])
+            if self.duplicate_detector is not None:
+                # Paires candidates enregistrées dans la même transaction, confirmées une fois la question embeddée
+                self.duplicate_detector.add([question_id], [html.unescape(standardized_question["question"])])
+            if self.question_hashes is not None:
+                self.question_hashes.add(self.question_hash(html.unescape(standardized_question["question"])))
             return True
         except sqlite3.IntegrityError:
             return False
-        
+
+    @staticmethod
+    def question_row(standardized_question):
+        """Convertit une question au format standard en ligne de la table questions"""
+        return (
+            html.unescape(standardized_question["question"]),
+            html.unescape(standardized_question["correct_answer"]),
+            json.dumps(standardized_question["incorrect_answers"]),
+            standardized_question.get("category", ""),
+            standardized_question.get("difficulty", ""),
+            standardized_question.get("type", ""),
+            standardized_question.get("source", "unknown")
+        )
+
+    @staticmethod
+    def question_hash(question_text):
+        return hashlib.blake2b(question_text.encode(), digest_size=8).digest()
+
+    def load_question_hashes(self):
+        """Charge les empreintes de toutes les questions de la base (dédoublonnage en mémoire)"""
+        self.execute("SELECT question FROM questions")
+        self.question_hashes = {self.question_hash(row[0]) for row in self.cursor.fetchall()}
+
+    def insert_questions(self, standardized_questions, batch_size=500):
+        """
+        Insère un lot de questions au format standard (voir insert_question), dédoublonnées en mémoire
+        puis écrites par INSERT OR IGNORE groupés, avec une transaction validée toutes les batch_size lignes.
+        Retourne le tuple (nombre de questions insérées, nombre de doublons).
+        """
+        if self.question_hashes is None:
+            self.load_question_hashes()
+
+        rows = []
+        for standardized_question in standardized_questions:
+            question_hash = self.question_hash(html.unescape(standardized_question["question"]))
+            if question_hash not in self.question_hashes:
+                self.question_hashes.add(question_hash)
+                rows.append(self.question_row(standardized_question))
+        duplicates = len(standardized_questions) - len(rows)
+
+        inserted = 0
+        for start_idx in range(0, len(rows), batch_size):
+            # Transaction explicite : un lot est écrit entièrement ou pas du tout
+            self.commit()
+            self.execute("BEGIN")
+            try:
+                self.execute("SELECT COALESCE(MAX(id), 0) FROM questions")
+                max_id = self.cursor.fetchone()[0]
+                self.cursor.executemany("""
+                INSERT OR IGNORE INTO questions (
+                    question, correct_answer, incorrect_answers,
+                    category, difficulty, type, source
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, rows[start_idx:start_idx + batch_size])
+                batch_inserted = self.cursor.rowcount
+                self.execute("INSERT OR REPLACE INTO embedding_queue (question_id) SELECT id FROM questions WHERE id > ?", (max_id,))
+                if self.duplicate_detector is not None:
+                    self.execute("SELECT id, question FROM questions WHERE id > ? ORDER BY id", (max_id,))
+                    new_rows = self.cursor.fetchall()
+                    self.duplicate_detector.add([row[0] for row in new_rows], [row[1] for row in new_rows])
+                self.commit()
+            except Exception:
+                self.conn.rollback()
+                self.question_hashes.difference_update(self.question_hash(row[0]) for row in rows[start_idx:])
+                raise
+            inserted += batch_inserted
+
+        # Lignes ignorées par la contrainte UNIQUE (hors empreintes) : doublons aussi
+        return inserted, duplicates + len(rows) - inserted
+
     def question_exists(self, question_text):
         """Vérifie si une question existe déjà dans la base de données"""
         self.execute("SELECT 1 FROM questions WHERE question = ?", (question_text,))
-        return self.cursor.fetchone() is not None
\ No newline at end of file
+        return self.cursor.fetchone() is not None
+
+    def mark_questions_dirty(self, question_ids):
+        """Ajoute des questions à la file d'indexation des embeddings (avec un nouveau seq si elles y sont déjà)"""
+        self.cursor.executemany(
+            "INSERT OR REPLACE INTO embedding_queue (question_id) VALUES (?)",
+            [(int(question_id),) for question_id in question_ids]
+        )
+
+    def count_dirty_questions(self):
+        """Retourne le nombre de questions en attente d'indexation"""
+        self.execute("SELECT COUNT(*) FROM embedding_queue")
+        return self.cursor.fetchone()[0]
+
+    def last_dirty_seq(self):
+        """Retourne le numéro de la dernière entrée de la file d'indexation (0 si elle est vide)"""
+        self.execute("SELECT COALESCE(MAX(seq), 0) FROM embedding_queue")
+        return self.cursor.fetchone()[0]
+
+    def load_dirty_questions(self, limit):
+        """Retourne les identifiants et textes d'un lot de questions en attente d'indexation"""
+        # Les questions supprimées entre-temps n'ont plus rien à indexer
+        self.execute("DELETE FROM embedding_queue WHERE question_id NOT IN (SELECT id FROM questions)")
+        self.execute("""
+            SELECT q.id, q.question
+            FROM embedding_queue e JOIN questions q ON q.id = e.question_id
+            ORDER BY q.id
+            LIMIT ?
+        """, (limit,))
+        rows = self.cursor.fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def clear_dirty_questions(self, question_ids=None, up_to_seq=None):
+        """
+        Retire des questions de la file d'indexation (toutes si aucun identifiant n'est donné).
+        Avec up_to_seq (voir last_dirty_seq), les entrées remises en file depuis ce numéro sont conservées.
+        """
+        if question_ids is None:
+            self.execute("DELETE FROM embedding_queue WHERE seq <= COALESCE(?, seq)", (up_to_seq,))
+        else:
+            self.cursor.executemany(
+                "DELETE FROM embedding_queue WHERE question_id = ? AND seq <= COALESCE(?, seq)",
+                [(int(question_id), up_to_seq) for question_id in question_ids]
+            )
\ No newline at end of file
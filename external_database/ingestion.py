@@ -0,0 +1,176 @@
+import queue
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Limitation de débit partagée par tous les threads d'une même source
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        """
+        :param rate: Nombre de requêtes autorisées par seconde
+        :param capacity: Nombre de requêtes pouvant partir d'un coup après une période d'inactivité
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Attend qu'un jeton soit disponible puis le consomme"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+    def penalize(self, delay):
+        """Suspend toutes les requêtes de la source pendant delay secondes (réponse 'trop de requêtes')"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, -delay * self.rate)
+
+def backoff_delay(attempt, base=1.0, maximum=60.0):
+    """Délai exponentiel avec gigue complète (full jitter) avant la tentative attempt + 1"""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+# Moteur d'ingestion concurrente : les requêtes HTTP partent de plusieurs threads,
+# les insertions SQLite restent sur le thread appelant (propriétaire de la connexion)
+class IngestionEngine:
+    def __init__(
+        self,
+        db_manager,
+        requests_per_second=1.0,
+        burst=1,
+        max_workers=4,
+        insert_batch_size=500,
+        max_retries=6,
+        backoff_base=1.0,
+        backoff_max=60.0,
+        timeout=30,
+    ):
+        """
+        :param db_manager: DatabaseManager connecté dans lequel les questions sont insérées
+        :param requests_per_second: Débit maximal vers l'API
+        :param burst: Nombre de requêtes pouvant partir d'un coup
+        :param max_workers: Nombre de catégories récupérées en parallèle
+        :param insert_batch_size: Nombre de questions insérées (et validées) par transaction
+        :param max_retries: Nombre de nouvelles tentatives d'une requête limitée ou en erreur
+        :param backoff_base: Délai de base (s) du backoff exponentiel
+        :param backoff_max: Délai maximal (s) du backoff exponentiel
+        :param timeout: Timeout (s) d'une requête HTTP
+        """
+        self.db_manager = db_manager
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_workers = max_workers
+        self.insert_batch_size = insert_batch_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        # Session HTTP partagée : connexions keep-alive réutilisées par tous les threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.results = queue.Queue()
+        self.stats_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+
+    def request_json(self, url, is_rate_limited):
+        """
+        Requête GET limitée en débit, avec backoff exponentiel sur les limitations et les erreurs réseau.
+
+        :param url: URL à récupérer
+        :param is_rate_limited: Fonction (status_code, data) -> bool qui reconnaît une réponse 'trop de requêtes'
+        :return: Tuple (status_code, data JSON)
+        """
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            with self.stats_lock:
+                self.requests += 1
+
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                data = response.json()
+            except (requests.RequestException, ValueError) as error:
+                last_error = error
+            else:
+                if not is_rate_limited(response.status_code, data):
+                    return response.status_code, data
+                last_error = f"HTTP {response.status_code}"
+
+            if attempt == self.max_retries:
+                break
+
+            delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+            # Toute la source ralentit, pas seulement le thread qui a reçu la limitation
+            self.bucket.penalize(delay)
+            with self.stats_lock:
+                self.retries += 1
+
+        raise RuntimeError(f"{url} : abandon après {self.max_retries + 1} tentatives ({last_error})")
+
+    def emit(self, questions):
+        """Transmet un lot de questions standardisées au thread d'insertion"""
+        self.results.put(questions)
+
+    def insert(self, questions):
+        """Insère un lot de questions en une transaction, retourne le nombre de nouvelles questions"""
+        inserted, duplicates = self.db_manager.insert_questions(questions, self.insert_batch_size)
+        print(f"➕ {inserted} questions ajoutées, {duplicates} doublons.")
+        return inserted
+
+    def run(self, tasks):
+        """
+        Exécute les tâches (une par catégorie) en parallèle et insère les questions au fil de l'eau,
+        par lots de insert_batch_size questions.
+
+        :param tasks: Liste de (nom, fonction sans argument) ; chaque fonction appelle request_json et emit
+        :return: Nombre total de nouvelles questions
+        """
+        total = 0
+        buffer = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(task): name for name, task in tasks}
+            pending = set(futures)
+
+            while pending or not self.results.empty():
+                try:
+                    buffer.extend(self.results.get(timeout=0.1))
+                except queue.Empty:
+                    # Les API répondent lentement : on valide ce qui a déjà été reçu
+                    if buffer:
+                        total += self.insert(buffer)
+                        buffer = []
+                    pending = {future for future in pending if not future.done()}
+                    continue
+
+                if len(buffer) >= self.insert_batch_size:
+                    total += self.insert(buffer)
+                    buffer = []
+
+            if buffer:
+                total += self.insert(buffer)
+
+            for future, name in futures.items():
+                if future.exception() is not None:
+                    print(f"⚠️ Catégorie {name} interrompue : {future.exception()}")
+
+        print(f"✅ {total} questions ajoutées ({self.requests} requêtes, {self.retries} nouvelles tentatives).")
+        return total
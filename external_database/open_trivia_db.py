@@ -5,10 +5,13 @@ import requests
 from time import sleep
 
 from .database_manager import DatabaseManager
+from .ingestion import IngestionEngine
+
+class TriviaSQLiteManager(DatabaseManager):
+    base_url = "https://opentdb.com"
 
-class TriviaSQLiteManager(DatabaseManager):        
     def get_categories(self):
-        res = requests.get("https://opentdb.com/api_category.php")
+        res = requests.get(f"{self.base_url}/api_category.php")
         return res.json()['trivia_categories'] if res.status_code == 200 else []
     
     def fetch_all_questions(self):
@@ -19,7 +22,7 @@ class TriviaSQLiteManager(DatabaseManager):
             amout_idx = 0
 
             while True:
-                url = f"https://opentdb.com/api.php?amount={amounts[amout_idx]}&category={cat['id']}&type=multiple&token={self.token}"
+                url = f"{self.base_url}/api.php?amount={amounts[amout_idx]}&category={cat['id']}&type=multiple&token={self.token}"
                 res = requests.get(url)
                 data = res.json()
 
@@ -29,17 +32,8 @@ class TriviaSQLiteManager(DatabaseManager):
                     if not questions:
                         break
 
-                    new = 0
-                    for q in questions:
-                        standardize_question = self.standardize_opentdb_question(q)
-
-                        if self.question_exists(standardize_question["question"]):
-                            continue
-
-                        if self.insert_question(standardize_question):
-                            new += 1
-
-                    print(f"➕ {new} questions ajoutées.")
+                    new, duplicates = self.insert_questions([self.standardize_opentdb_question(q) for q in questions])
+                    print(f"➕ {new} questions ajoutées, {duplicates} doublons.")
 
                 elif response_code in [1, 4]:
                     amout_idx += 1
@@ -54,6 +48,50 @@ class TriviaSQLiteManager(DatabaseManager):
                 elif response_code in [2, 3]:
                     break
 
+        print(f"🧮 {self.count_dirty_questions()} questions en attente d'indexation (reindex.py --incremental).")
+
+    def fetch_all_questions_concurrently(self, max_workers=4, requests_per_second=0.2, **engine_kwargs):
+        """
+        Comme fetch_all_questions, avec plusieurs catégories récupérées en parallèle.
+        Le débit global reste limité (OpenTDB : une requête toutes les 5 secondes par IP).
+        """
+        engine = IngestionEngine(self, requests_per_second=requests_per_second, max_workers=max_workers, **engine_kwargs)
+        categories = self.get_categories()
+        engine.run([(cat["name"], lambda cat=cat: self.fetch_category(engine, cat)) for cat in categories])
+
+        print(f"🧮 {self.count_dirty_questions()} questions en attente d'indexation (reindex.py --incremental).")
+
+    @staticmethod
+    def is_rate_limited(status_code, data):
+        return status_code == 429 or data.get("response_code") == 5
+
+    def fetch_category(self, engine, cat):
+        """Récupère toutes les questions d'une catégorie (exécuté dans un thread du moteur d'ingestion)"""
+        amounts = [50, 20, 10, 5, 1]
+        amout_idx = 0
+
+        while True:
+            url = f"{self.base_url}/api.php?amount={amounts[amout_idx]}&category={cat['id']}&type=multiple&token={self.token}"
+            _, data = engine.request_json(url, self.is_rate_limited)
+
+            response_code = data.get("response_code", 2)
+            if response_code == 0:
+                questions = data.get("results", [])
+                if not questions:
+                    break
+
+                engine.emit([self.standardize_opentdb_question(q) for q in questions])
+
+            elif response_code in [1, 4]:
+                # Moins de questions restantes que demandé : le reste est récupéré par pages plus petites
+                amout_idx += 1
+                if amout_idx >= len(amounts):
+                    break
+
+            else:
+                # 2/3 : requête ou token invalide
+                break
+
     def standardize_opentdb_question(self, q):
         return {
             "question": q["question"],
@@ -66,6 +104,6 @@ class TriviaSQLiteManager(DatabaseManager):
         }
     
     def get_session_token(self):
-        res = requests.get("https://opentdb.com/api_token.php?command=request")
+        res = requests.get(f"{self.base_url}/api_token.php?command=request")
         self.token = res.json()['token'] if res.status_code == 200 else ""
         return self.token
\ No newline at end of file
@@ -0,0 +1,261 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from monitoring import metrics
+
+# Colonnes encodées par dictionnaire, avec l'index inversé valeur -> positions
+DICTIONARY_COLUMNS = ["category", "difficulty", "source"]
+
+class StringColumn:
+    """Colonne de textes stockée en un seul tampon UTF-8 et un tableau de décalages"""
+
+    def __init__(self):
+        self.buffer = np.empty(0, dtype=np.uint8)
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def extend(self, texts):
+        encoded = [text.encode("utf-8") for text in texts]
+        lengths = np.fromiter((len(text) for text in encoded), dtype=np.int64, count=len(encoded))
+        self.buffer = np.concatenate([self.buffer, np.frombuffer(b"".join(encoded), dtype=np.uint8)])
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)])
+
+    def get(self, positions):
+        """Textes des positions demandées, décodés à la volée"""
+        buffer = self.buffer
+        offsets = self.offsets
+        return [buffer[offsets[position]:offsets[position + 1]].tobytes().decode("utf-8") for position in positions]
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.offsets.nbytes
+
+class ListColumn:
+    """Colonne de listes de textes (mauvaises réponses) : textes aplatis et décalages par ligne"""
+
+    def __init__(self):
+        self.values = StringColumn()
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def extend(self, lists):
+        self.values.extend(value for values in lists for value in values)
+        lengths = np.fromiter((len(values) for values in lists), dtype=np.int64, count=len(lists))
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)])
+
+    def get(self, positions):
+        offsets = self.offsets
+        return [self.values.get(range(offsets[position], offsets[position + 1])) for position in positions]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.offsets.nbytes
+
+class DictionaryColumn:
+    """Colonne à faible cardinalité : codes entiers, dictionnaire des valeurs et positions de chaque valeur"""
+
+    def __init__(self):
+        self.values = []
+        self.codes_by_value = {}
+        self.codes = np.empty(0, dtype=np.int16)
+        self.postings = []
+
+    def __len__(self):
+        return len(self.codes)
+
+    def extend(self, values):
+        start = len(self.codes)
+        new_codes = np.empty(len(values), dtype=np.int16)
+        for row, value in enumerate(values):
+            code = self.codes_by_value.get(value)
+            if code is None:
+                code = self.codes_by_value[value] = len(self.values)
+                self.values.append(value)
+            new_codes[row] = code
+        self.codes = np.concatenate([self.codes, new_codes])
+
+        # Index inversé complété par un tri des seules nouvelles lignes : leurs positions suivent
+        # toutes les anciennes, chaque liste reste donc triée après ajout en fin
+        order = np.argsort(new_codes, kind="stable")
+        bounds = np.searchsorted(new_codes[order], np.arange(len(self.values) + 1))
+        postings = self.postings + [np.empty(0, dtype=np.int64)] * (len(self.values) - len(self.postings))
+        self.postings = [
+            np.concatenate([postings[code], start + order[bounds[code]:bounds[code + 1]]]) if bounds[code] < bounds[code + 1] else postings[code]
+            for code in range(len(self.values))
+        ]
+
+    def positions(self, values):
+        """Positions (triées) des lignes ayant l'une des valeurs, en O(lignes sélectionnées)"""
+        all_postings = self.postings
+        codes = [self.codes_by_value.get(value) for value in values]
+        # Une valeur ajoutée par une mise à jour en cours n'a pas encore de positions publiées
+        postings = [all_postings[code] for code in codes if code is not None and code < len(all_postings)]
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        if len(postings) == 1:
+            return postings[0]
+        return np.sort(np.concatenate(postings))
+
+    def get(self, positions):
+        return [self.values[code] for code in self.codes[positions]]
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + sum(postings.nbytes for postings in self.postings)
+
+class QuestionCatalog:
+    """
+    Catalogue des questions en mémoire, en colonnes compactes, chargé une fois puis complété
+    par les nouvelles lignes (id > max(id)) quand la base change.
+
+    Les recherches n'exécutent plus de requête SQL ni de copie de DataFrame : le filtre par catégorie
+    est une union de listes de positions précalculées, et seules les lignes sélectionnées sont décodées.
+    Les questions ne sont jamais modifiées ni supprimées par l'application, seulement ajoutées.
+    """
+
+    def __init__(self, db_manager, chunk_size=50000):
+        """
+        :param db_manager: DatabaseManager de la base de questions
+        :param chunk_size: Nombre de lignes lues par requête au chargement
+        """
+        self.db_manager = db_manager
+        self.chunk_size = chunk_size
+        self.ids = np.empty(0, dtype=np.int64)
+        self.questions = StringColumn()
+        self.correct_answers = StringColumn()
+        self.incorrect_answers = ListColumn()
+        self.columns = {column: DictionaryColumn() for column in DICTIONARY_COLUMNS}
+        self.is_duplicate = np.zeros(0, dtype=bool)
+        self.data_version = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def refresh(self):
+        """
+        Ajoute les questions insérées depuis le dernier appel et recharge les quasi-doublons,
+        uniquement si la base a changé. Retourne le nombre de nouvelles questions.
+        """
+        pool = self.db_manager.pool
+        if pool.data_version() == self.data_version:
+            return 0
+
+        with self.lock, metrics.timer("catalog_refresh"):
+            data_version = pool.data_version()
+            if data_version == self.data_version:
+                return 0
+
+            added = 0
+            while True:
+                last_id = int(self.ids[-1]) if len(self.ids) else 0
+                rows = pool.query(
+                    "SELECT id, question, correct_answer, incorrect_answers, category, difficulty, source FROM questions WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, self.chunk_size),
+                )
+                if not rows:
+                    break
+                self.append(rows)
+                added += len(rows)
+
+            # Publié en dernier : sa longueur est le nombre de lignes visibles par les recherches
+            is_duplicate = np.zeros(len(self.ids), dtype=bool)
+            if self.db_manager.has_table("question_duplicates"):
+                duplicate_ids = np.array([row[0] for row in pool.query("SELECT question_id FROM question_duplicates")], dtype=np.int64)
+                duplicate_positions = self.positions(duplicate_ids)
+                is_duplicate[duplicate_positions[duplicate_positions >= 0]] = True
+            self.is_duplicate = is_duplicate
+
+            self.data_version = data_version
+            metrics.increment("catalog_rows_added", added)
+            return added
+
+    def append(self, rows):
+        # Colonnes en ajout seul : les lignes déjà publiées restent lisibles pendant la mise à jour
+        self.questions.extend([row[1] for row in rows])
+        self.correct_answers.extend([row[2] for row in rows])
+        self.incorrect_answers.extend([json.loads(row[3]) if row[3] else [] for row in rows])
+        for column_idx, column in enumerate(DICTIONARY_COLUMNS):
+            self.columns[column].extend([row[4 + column_idx] or "" for row in rows])
+        self.ids = np.concatenate([self.ids, np.array([row[0] for row in rows], dtype=np.int64)])
+
+    def positions(self, question_ids):
+        """Positions des identifiants dans le catalogue (-1 si absents), par recherche dichotomique (ids triés)"""
+        question_ids = np.asarray(question_ids, dtype=np.int64)
+        ids = self.ids
+        if len(ids) == 0:
+            return np.full(len(question_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(ids, question_ids), len(ids) - 1)
+        return np.where(ids[positions] == question_ids, positions, -1)
+
+    def select(self, categories=None, difficulties=None, sources=None, skip_duplicates=True):
+        """
+        Positions des questions respectant les filtres facultatifs (listes de valeurs acceptées),
+        sans les quasi-doublons si skip_duplicates.
+        """
+        is_duplicate = self.is_duplicate
+        num_rows = len(is_duplicate)
+        positions = None
+        for column, values in zip(DICTIONARY_COLUMNS, [categories, difficulties, sources]):
+            if values:
+                column_positions = self.columns[column].positions(values)
+                positions = column_positions if positions is None else np.intersect1d(positions, column_positions, assume_unique=True)
+        if positions is None:
+            positions = np.arange(num_rows)
+
+        positions = positions[positions < num_rows]
+        if skip_duplicates:
+            positions = positions[~is_duplicate[positions]]
+        return positions
+
+    def get_question_texts(self, positions):
+        return self.questions.get(positions)
+
+    def get_values(self, column):
+        """Valeurs distinctes d'une colonne encodée (catégories...), triées"""
+        return sorted(self.columns[column].values)
+
+    def records(self, positions):
+        """Questions des positions demandées au format standard (mauvaises réponses en liste)"""
+        columns = {column: self.columns[column].get(positions) for column in DICTIONARY_COLUMNS}
+        return [
+            {
+                "id": int(question_id),
+                "question": question,
+                "correct_answer": correct_answer,
+                "incorrect_answers": incorrect_answers,
+                **{column: columns[column][row] for column in DICTIONARY_COLUMNS},
+            }
+            for row, (question_id, question, correct_answer, incorrect_answers) in enumerate(zip(
+                self.ids[positions],
+                self.questions.get(positions),
+                self.correct_answers.get(positions),
+                self.incorrect_answers.get(positions),
+            ))
+        ]
+
+    def dataframe(self, positions):
+        """Tableau affiché par l'interface, construit pour les seules positions demandées"""
+        df = pd.DataFrame(self.records(positions), columns=["id", "question", "correct_answer", "incorrect_answers", *DICTIONARY_COLUMNS])
+        df["incorrect_answers"] = df["incorrect_answers"].map(", ".join)
+        return df
+
+    def memory_usage(self):
+        """Empreinte mémoire des colonnes, en octets"""
+        usage = {
+            "ids": self.ids.nbytes,
+            "questions": self.questions.nbytes,
+            "correct_answers": self.correct_answers.nbytes,
+            "incorrect_answers": self.incorrect_answers.nbytes,
+            "is_duplicate": self.is_duplicate.nbytes,
+            **{column: self.columns[column].nbytes for column in DICTIONARY_COLUMNS},
+        }
+        usage["total"] = sum(usage.values())
+        return usage
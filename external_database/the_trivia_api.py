@@ -2,8 +2,11 @@ import requests
 from time import sleep
 
 from .database_manager import DatabaseManager
+from .ingestion import IngestionEngine
 
 class TheTriviaAPISQLiteManager(DatabaseManager):
+    base_url = "https://the-trivia-api.com"
+
     def get_categories(self):
         return ["music", "sport_and_leisure", "film_and_tv", "arts_and_literature", "history", "society_and_culture", "science", "geography", "food_and_drink", "general_knowledge"]
     
@@ -15,7 +18,7 @@ class TheTriviaAPISQLiteManager(DatabaseManager):
             amout_idx = 0
 
             for _ in range(nbr_requests):
-                url = f"https://the-trivia-api.com/api/questions?limit={amounts[amout_idx]}&categories={cat}"
+                url = f"{self.base_url}/api/questions?limit={amounts[amout_idx]}&categories={cat}"
                 res = requests.get(url)
 
                 if res.status_code == 429: # rate limit
@@ -24,19 +27,35 @@ class TheTriviaAPISQLiteManager(DatabaseManager):
                 elif res.status_code == 200:
                     data = res.json()
 
-                    new = 0
-                    for question in data:
-                        standardize_question = self.standardize_opentdb_question(question)
+                    new, duplicates = self.insert_questions([self.standardize_opentdb_question(question) for question in data])
+                    print(f"➕ {new} questions ajoutées, {duplicates} doublons.")
+                else:
+                    print(res)
 
-                        if self.question_exists(standardize_question["question"]):
-                            continue
+        print(f"🧮 {self.count_dirty_questions()} questions en attente d'indexation (reindex.py --incremental).")
 
-                        if self.insert_question(standardize_question):
-                            new += 1
+    def fetch_all_questions_concurrently(self, nbr_requests=5, max_workers=4, requests_per_second=2.0, **engine_kwargs):
+        """Comme fetch_all_questions, avec plusieurs catégories récupérées en parallèle et un débit limité"""
+        engine = IngestionEngine(self, requests_per_second=requests_per_second, max_workers=max_workers, **engine_kwargs)
+        categories = self.get_categories()
+        engine.run([(cat, lambda cat=cat: self.fetch_category(engine, cat, nbr_requests)) for cat in categories])
 
-                    print(f"➕ {new} questions ajoutées.")
-                else:
-                    print(res)
+        print(f"🧮 {self.count_dirty_questions()} questions en attente d'indexation (reindex.py --incremental).")
+
+    @staticmethod
+    def is_rate_limited(status_code, data):
+        return status_code == 429
+
+    def fetch_category(self, engine, cat, nbr_requests=5):
+        """Récupère nbr_requests lots de questions d'une catégorie (exécuté dans un thread du moteur d'ingestion)"""
+        for _ in range(nbr_requests):
+            url = f"{self.base_url}/api/questions?limit=50&categories={cat}"
+            status_code, data = engine.request_json(url, self.is_rate_limited)
+
+            if status_code == 200:
+                engine.emit([self.standardize_opentdb_question(question) for question in data])
+            else:
+                print(f"⚠️ {cat} : HTTP {status_code}")
 
     def standardize_opentdb_question(self, q):
         return {
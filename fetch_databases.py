@@ -1,15 +1,21 @@
 from external_database import TriviaSQLiteManager, TheTriviaAPISQLiteManager
+from search_index import NearDuplicateDetector
 
 if __name__ == "__main__":
     # db = TriviaSQLiteManager()
     # db.connect()
     # db.create_questions_table()
+    # db.duplicate_detector = NearDuplicateDetector(db)
+    # db.duplicate_detector.create_tables()
     # db.get_session_token()
-    # db.fetch_all_questions()
+    # db.fetch_all_questions_concurrently()
     # db.close()
 
     db = TheTriviaAPISQLiteManager()
     db.connect()
     db.create_questions_table()
-    db.fetch_all_questions()
+    # Candidats quasi-doublons enregistrés à l'insertion, confirmés par reindex.py
+    db.duplicate_detector = NearDuplicateDetector(db)
+    db.duplicate_detector.create_tables()
+    db.fetch_all_questions_concurrently()
     db.close()
\ No newline at end of file
@@ -1,3 +1,6 @@
 from .model_loader import ModelLoader
 from .embedding_model import EmbeddingModel
-from .reranker_model import RerankerModel
\ No newline at end of file
+from .reranker_model import RerankerModel
+from .score_cache import ScoreCache
+from .reranker_pool import RerankerPool
+from .query_pipeline import QueryPipeline, load_phrasings
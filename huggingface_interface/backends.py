@@ -0,0 +1,100 @@
+import inspect
+import os
+
+import torch
+from transformers.modeling_outputs import ModelOutput
+
+# Inference backends of ModelLoader, the quantized ones run on CPU only
+BACKENDS = ["torch", "torch-int8", "onnx-int8"]
+
+def quantize_torch_int8(model):
+    """
+    Dynamic int8 quantization of the linear layers (weights stored in int8, activations quantized on the fly).
+
+    :param model: A float32 PyTorch model on CPU.
+    :return: The quantized model.
+    """
+    return torch.ao.quantization.quantize_dynamic(model.cpu().eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+def save_torch_model(model, path: str):
+    """
+    Save a whole PyTorch module (quantized modules cannot be rebuilt with from_pretrained).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.save(model, path)
+
+def load_torch_model(path: str):
+    """
+    Load a module saved by save_torch_model. The file is a pickle written by this project, not a downloaded artifact.
+    """
+    return torch.load(path, weights_only=False).eval()
+
+def export_onnx_int8(model, tokenizer, path: str, output_name: str):
+    """
+    Export a model to ONNX then quantize its weights to int8 with ONNX Runtime.
+
+    :param model: A float32 PyTorch model.
+    :param tokenizer: The tokenizer of the model, gives the input names and a sample input.
+    :param path: Path of the quantized .onnx file (the float32 export is written next to it).
+    :param output_name: Name given to the first output of the model ("logits", "last_hidden_state"...).
+    """
+    try:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+    except ImportError as error:
+        raise ImportError("The onnx-int8 backend requires the onnx and onnxruntime packages (pip install onnx onnxruntime)") from error
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    float_path = path.replace(".onnx", "-fp32.onnx")
+
+    model = model.cpu().eval()
+    sample = tokenizer(["sample text"], ["sample text"], return_tensors="pt")
+    # ONNX inputs are named positionally: they must follow the order of the forward arguments
+    input_names = [name for name in inspect.signature(model.forward).parameters if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes[output_name] = {0: "batch"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            float_path,
+            input_names=input_names,
+            output_names=[output_name],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+    quantize_dynamic(float_path, path, weight_type=QuantType.QInt8)
+    os.remove(float_path)
+
+class OnnxRuntimeModel:
+    """
+    ONNX Runtime session called like a Hugging Face model: model(**inputs) returns a ModelOutput
+    holding torch tensors, so that the EmbeddingModel and RerankerModel code stays unchanged.
+    """
+
+    def __init__(self, path: str, num_threads=None):
+        """
+        :param path: Path of the .onnx file.
+        :param num_threads: Number of intra-op threads (ONNX Runtime default if None).
+        """
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.output_names = [model_output.name for model_output in self.session.get_outputs()]
+
+    def __call__(self, return_dict=True, **inputs):
+        feed = {name: inputs[name].cpu().numpy() for name in self.input_names if name in inputs}
+        outputs = self.session.run(self.output_names, feed)
+        return ModelOutput({name: torch.from_numpy(output) for name, output in zip(self.output_names, outputs)})
+
+    def to(self, device):
+        if torch.device(device).type != "cpu":
+            raise ValueError("The onnx-int8 backend only runs on CPU")
+        return self
+
+    def eval(self):
+        return self
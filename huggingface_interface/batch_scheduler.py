@@ -0,0 +1,171 @@
+import heapq
+import threading
+from concurrent.futures import Future
+from itertools import count
+from time import monotonic
+
+class _Request:
+    def __init__(self, items, priority, future):
+        self.items = items
+        self.priority = priority
+        self.future = future
+        self.results = [None] * len(items)
+        self.next_item = 0
+        self.remaining = len(items)
+        self.arrival = monotonic()
+
+class BatchScheduler:
+    """
+    Micro-batching scheduler shared by concurrent callers of a model.
+
+    Items submitted by different requests are merged into shared batches: a batch is closed when
+    max_batch_size items are pending or when the oldest pending item has waited max_wait seconds.
+    Each submit returns a concurrent.futures.Future resolved with the results of its own items.
+    Requests with a higher priority are served first, and cancelling a future drops its items
+    that have not been computed yet.
+    """
+
+    def __init__(
+        self,
+        process_batch,
+        max_batch_size=256,
+        max_wait=0.01,
+        num_threads=1,
+    ):
+        """
+        Initialize the BatchScheduler and start its threads.
+
+        :param process_batch: Function list of items -> sequence of results aligned with the items.
+        :param max_batch_size: Maximum number of items per batch.
+        :param max_wait: Maximum time (in seconds) an item waits for other requests before its batch is closed.
+        :param num_threads: Number of batches processed at the same time (e.g. the workers of a RerankerPool).
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.heap = []
+        self.sequence = count()
+        self.pending_items = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.batches = 0
+        self.batched_items = 0
+
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(num_threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, items: list, priority=0):
+        """
+        Queue items for the next batches.
+
+        :param items: List of items accepted by process_batch.
+        :param priority: Requests with a higher priority are batched first (interactive searches before batch jobs).
+        :return: A Future resolved with the list of results aligned with items.
+        """
+        future = Future()
+        if not items:
+            future.set_result([])
+            return future
+
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("The scheduler is closed")
+            request = _Request(items, priority, future)
+            heapq.heappush(self.heap, (-priority, next(self.sequence), request))
+            self.pending_items += len(items)
+            self.condition.notify_all()
+        return future
+
+    def _drop_cancelled(self):
+        # Called with the condition held: cancelled (or failed) requests have nothing left to compute
+        while self.heap and self.heap[0][2].future.done():
+            _, _, request = heapq.heappop(self.heap)
+            self.pending_items -= len(request.items) - request.next_item
+
+    def _wait_for_batch(self):
+        """
+        Block until a batch is ready, then take its items from the queued requests.
+
+        :return: List of (request, item index) or None when the scheduler is closed.
+        """
+        with self.condition:
+            while True:
+                self._drop_cancelled()
+                if self.closed:
+                    return None
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+
+                oldest = min(request.arrival for _, _, request in self.heap)
+                wait = oldest + self.max_wait - monotonic()
+                if self.pending_items < self.max_batch_size and wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                break
+
+            batch = []
+            while self.heap and len(batch) < self.max_batch_size:
+                _, _, request = self.heap[0]
+                if request.future.done():
+                    self._drop_cancelled()
+                    continue
+
+                taken = min(len(request.items) - request.next_item, self.max_batch_size - len(batch))
+                batch.extend((request, item_idx) for item_idx in range(request.next_item, request.next_item + taken))
+                request.next_item += taken
+                self.pending_items -= taken
+                if request.next_item == len(request.items):
+                    heapq.heappop(self.heap)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._wait_for_batch()
+            if batch is None:
+                return
+
+            try:
+                results = self.process_batch([request.items[item_idx] for request, item_idx in batch])
+            except Exception as error:
+                with self.condition:
+                    for request in {id(request): request for request, _ in batch}.values():
+                        if not request.future.done() and request.future.set_running_or_notify_cancel():
+                            request.future.set_exception(error)
+                continue
+
+            with self.condition:
+                self.batches += 1
+                self.batched_items += len(batch)
+                for (request, item_idx), result in zip(batch, results):
+                    request.results[item_idx] = result
+                    request.remaining -= 1
+                    if request.remaining == 0 and not request.future.done() and request.future.set_running_or_notify_cancel():
+                        request.future.set_result(request.results)
+
+    def stats(self):
+        """
+        :return: Dictionary with the number of batches and items processed, the mean batch size and the number of pending items.
+        """
+        with self.condition:
+            return {
+                "batches": self.batches,
+                "items": self.batched_items,
+                "mean_batch_size": self.batched_items / self.batches if self.batches else 0.0,
+                "pending_items": self.pending_items,
+            }
+
+    def close(self):
+        """
+        Stop the threads after the batch in progress. Queued requests are cancelled.
+        """
+        with self.condition:
+            self.closed = True
+            for _, _, request in self.heap:
+                request.future.cancel()
+            self.heap = []
+            self.pending_items = 0
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
@@ -1,7 +1,10 @@
+import numpy as np
 import torch
 from transformers import AutoModel, AutoTokenizer
 
 from .model_loader import ModelLoader
+from .batch_scheduler import BatchScheduler
+from monitoring import metrics
 
 from env import PRETRAINED_HUGGINGFACE_MODELS_PATH
 
@@ -15,33 +18,82 @@ class EmbeddingModel(ModelLoader):
         model_name="BAAI/bge-m3", 
         local_path=PRETRAINED_HUGGINGFACE_MODELS_PATH,
         device=('cuda' if torch.cuda.is_available() else 'cpu'),
+        model_version="1",
+        backend="torch",
+        scheduler_max_wait=None,
+        scheduler_max_batch_size=64,
     ):
         """
         Initialize the EmbeddingModel with the model name and local path.
 
         :param model_name: The name of the embedding model to load from Hugging Face.
         :param local_path: The local directory path where the model and tokenizer will be saved.
+        :param model_version: Version of the embedding computation (pooling, normalization...), bump it to invalidate stored embeddings.
+        :param backend: Inference backend, see ModelLoader.
+        :param scheduler_max_wait: Micro-batching window (in seconds) merging the texts of concurrent requests
+            (e.g. the themes of simultaneous searches) into shared batches, None to embed each request on its own.
+        :param scheduler_max_batch_size: Maximum number of texts per shared batch.
         """
-        super().__init__(model_name, local_path, AutoModel, AutoTokenizer, device)
+        self.model_version = model_version
+        self.scheduler = None
+        if scheduler_max_wait is not None:
+            self.scheduler = BatchScheduler(self.run_embeddings, scheduler_max_batch_size, scheduler_max_wait)
+        super().__init__(model_name, local_path, AutoModel, AutoTokenizer, device, backend)
 
-    def compute_embeddings(self, texts: list):
+    @property
+    def model_stamp(self):
+        """
+        Identifier of the model and embedding computation, stored next to each indexed embedding.
+        """
+        return f"{self.model_id}:{self.model_version}"
+
+    def compute_embeddings(self, texts: list, priority=0):
         """
         Compute embeddings for a list of input texts.
 
         :param texts: List of strings to compute embeddings for.
+        :param priority: Priority of the request in the micro-batching scheduler.
         :return: NumPy array of embeddings.
         """
+        if self.scheduler is not None:
+            return np.stack(self.submit_embeddings(texts, priority).result())
+        return self.run_embeddings(texts)
+
+    def submit_embeddings(self, texts: list, priority=0):
+        """
+        Queue texts in the micro-batching scheduler (scheduler_max_wait must be set).
+
+        :return: A concurrent.futures.Future resolved with the list of embeddings aligned with texts.
+        """
+        return self.scheduler.submit(list(texts), priority)
+
+    def run_embeddings(self, texts: list):
+        """
+        Same as compute_embeddings, computed right away in the calling thread.
+        """
         # Tokenize the input texts
-        inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors="pt").to(self.device)
+        with metrics.timer("embedding_tokenize"):
+            inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors="pt").to(self.device)
+
+        tokens = int(inputs["attention_mask"].sum())
+        metrics.increment("embedding_texts", len(texts))
+        metrics.increment("embedding_tokens", tokens)
+        metrics.increment("embedding_padding_tokens", inputs["attention_mask"].numel() - tokens)
 
-        # Compute embeddings
-        with torch.no_grad():
+        # Compute embeddings (the copy to the CPU waits for the GPU)
+        with metrics.timer("embedding_forward"), torch.no_grad():
             outputs = self.model(**inputs)
 
-        # Perform pooling. In this case, cls pooling.
-        sentence_embeddings = outputs[0][:, 0]
+            # Perform pooling. In this case, cls pooling.
+            sentence_embeddings = outputs[0][:, 0]
 
-        # normalize embeddings
-        sentence_embeddings = torch.nn.functional.normalize(sentence_embeddings, p=2, dim=1)
+            # normalize embeddings
+            sentence_embeddings = torch.nn.functional.normalize(sentence_embeddings, p=2, dim=1).cpu().numpy()
 
-        return sentence_embeddings.cpu().numpy() # return embeddings as numpy arrays
\ No newline at end of file
+        return sentence_embeddings # return embeddings as numpy arrays
+
+    def warmup(self):
+        """
+        Embed a typical theme, outside the micro-batching scheduler.
+        """
+        self.run_embeddings(["Harry Potter"])
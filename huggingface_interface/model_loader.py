@@ -1,13 +1,19 @@
 from abc import ABC
+import importlib.util
 import os
-from time import time
+from time import time, perf_counter
+
+from .backends import BACKENDS, quantize_torch_int8, save_torch_model, load_torch_model, export_onnx_int8, OnnxRuntimeModel
 
 class ModelLoader(ABC):
     """
     Abstract base class for loading a model and its tokenizer from Hugging Face.
     """
 
-    def __init__(self, model_name: str, local_path: str, model_class, tokenizer_class, device):
+    # Name of the first model output, used by the ONNX export
+    output_name = "last_hidden_state"
+
+    def __init__(self, model_name: str, local_path: str, model_class, tokenizer_class, device, backend="torch", safetensors=True):
         """
         Initialize the ModelLoader with the model name, local path, model class, and tokenizer class.
 
@@ -15,24 +21,88 @@ class ModelLoader(ABC):
         :param local_path: The local directory path where the model and tokenizer will be saved.
         :param model_class: The class of the model to load (e.g., BertModel, RobertaModel).
         :param tokenizer_class: The class of the tokenizer to load (e.g., BertTokenizer, RobertaTokenizer).
+        :param backend: "torch" (float weights), "torch-int8" (PyTorch dynamic quantization) or "onnx-int8"
+            (ONNX Runtime dynamic quantization). The quantized backends run on CPU (whatever the device) and are
+            converted once, then cached in a sub-directory of the saved Hugging Face weights.
+        :param safetensors: Save the weights as safetensors (a legacy .bin checkpoint is converted once), which are
+            memory-mapped at load time instead of unpickled.
         """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+        if backend != "torch":
+            device = "cpu"
+
         self.model_name = model_name
         self.local_path = local_path
         self.model_class = model_class
         self.tokenizer_class = tokenizer_class
         self.device = device
+        self.backend = backend
+        self.safetensors = safetensors
         self.model = None
         self.tokenizer = None
+        # Loading state ("not loaded", "loading", "warming up", "ready" or "error") and durations in seconds
+        self.status = "not loaded"
+        self.load_error = None
+        self.timings = {}
+
+    @property
+    def model_id(self):
+        """
+        Identifier of the model weights actually used (quantized backends give slightly different outputs).
+        """
+        return self.model_name if self.backend == "torch" else f"{self.model_name}@{self.backend}"
 
-    def load_model_and_tokenizer(self):
+    def backend_path(self, model_path: str):
+        """
+        :return: Path of the converted model of the backend, next to the saved Hugging Face weights.
+        """
+        if self.backend == "torch-int8":
+            return os.path.join(model_path, "torch-int8", "model.pt")
+        return os.path.join(model_path, "onnx-int8", "model.onnx")
+
+    @property
+    def is_ready(self):
+        return self.status == "ready"
+
+    def load_model_and_tokenizer(self, warmup=False):
         """
         Load the model and tokenizer using the download_if_not_exists method.
 
+        :param warmup: Run a forward pass once loaded, so that the first real request does not pay
+            the one-time costs (kernel selection, memory allocation).
         :return: The loaded model and tokenizer.
         """
-        self.download_if_not_exists()
+        self.status = "loading"
+        try:
+            start_time = perf_counter()
+            self.download_if_not_exists()
+            self.timings["load"] = perf_counter() - start_time
+
+            if warmup:
+                self.status = "warming up"
+                start_time = perf_counter()
+                self.warmup()
+                self.timings["warmup"] = perf_counter() - start_time
+        except Exception as error:
+            self.status = "error"
+            self.load_error = error
+            raise
+
+        self.status = "ready"
         return self.model, self.tokenizer
 
+    def warmup(self):
+        """
+        Forward pass on a dummy input, overridden by the concrete models.
+        """
+
+    def from_pretrained_kwargs(self):
+        # Without accelerate, transformers needs a full initialization of the model before copying the weights
+        if importlib.util.find_spec("accelerate") is not None:
+            return {"low_cpu_mem_usage": True}
+        return {}
+
     def download_if_not_exists(self):
         """
         Download the model and tokenizer if they do not exist locally.
@@ -43,29 +113,70 @@ class ModelLoader(ABC):
 
         model_path = os.path.join(self.local_path, self.model_name)
 
+        # A cached converted model does not need the float weights
+        converted = self.backend != "torch" and os.path.exists(self.backend_path(model_path))
+
         if not os.path.exists(model_path):
             start_time = time()
             print(f"Downloading Model '{self.model_name}'")
 
             # Download the model and tokenizer from Hugging Face
-            self.model = self.model_class.from_pretrained(self.model_name).to(self.device)
+            self.model = self.model_class.from_pretrained(self.model_name, **self.from_pretrained_kwargs()).to(self.device)
             self.tokenizer = self.tokenizer_class.from_pretrained(self.model_name)
 
             # Save the model and tokenizer locally
-            self.model.save_pretrained(model_path)
+            self.model.save_pretrained(model_path, safe_serialization=self.safetensors)
             self.tokenizer.save_pretrained(model_path)
 
             end_time = time()
             loading_time = end_time - start_time
             print(f"Model '{self.model_name}' downloaded in {loading_time:.2f} seconds.")
+        elif converted:
+            self.tokenizer = self.tokenizer_class.from_pretrained(model_path)
         else:
             start_time = time()
             print(f"Loading Model '{self.model_name}'")
 
             # Load the model and tokenizer from the local path
-            self.model = self.model_class.from_pretrained(model_path).to(self.device)
+            self.model = self.model_class.from_pretrained(model_path, **self.from_pretrained_kwargs()).to(self.device)
             self.tokenizer = self.tokenizer_class.from_pretrained(model_path)
 
             end_time = time()
             loading_time = end_time - start_time
-            print(f"Model '{self.model_name}' loaded from local path in {loading_time:.2f} seconds.")
\ No newline at end of file
+            print(f"Model '{self.model_name}' loaded from local path in {loading_time:.2f} seconds.")
+
+            if self.safetensors and not self.has_safetensors(model_path):
+                # Legacy pickled checkpoint: converted once, memory-mapped at the next starts
+                self.model.save_pretrained(model_path, safe_serialization=True)
+                print(f"Model '{self.model_name}' converted to safetensors.")
+
+        if self.backend != "torch":
+            self.load_backend(model_path)
+
+    @staticmethod
+    def has_safetensors(model_path: str):
+        return any(os.path.exists(os.path.join(model_path, name)) for name in ["model.safetensors", "model.safetensors.index.json"])
+
+    def load_backend(self, model_path: str):
+        """
+        Convert the loaded float model to the quantized backend (first run only), then load the converted model.
+        """
+        path = self.backend_path(model_path)
+
+        if not os.path.exists(path):
+            start_time = time()
+            print(f"Converting Model '{self.model_name}' to {self.backend}")
+
+            if self.backend == "torch-int8":
+                save_torch_model(quantize_torch_int8(self.model), path)
+            else:
+                export_onnx_int8(self.model, self.tokenizer, path, self.output_name)
+
+            print(f"Model '{self.model_name}' converted to {self.backend} in {time() - start_time:.2f} seconds.")
+
+        start_time = time()
+        if self.backend == "torch-int8":
+            self.model = load_torch_model(path)
+        else:
+            self.model = OnnxRuntimeModel(path)
+        print(f"Model '{self.model_name}' ({self.backend}) loaded in {time() - start_time:.2f} seconds.")
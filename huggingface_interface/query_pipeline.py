@@ -0,0 +1,421 @@
+import json
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import as_completed
+
+import numpy as np
+import torch
+
+from .score_cache import ScoreCache
+from monitoring import metrics
+
+FUSIONS = ["max", "mean"]
+
+def load_phrasings(path: str):
+    """
+    Load the extra phrasings of themes from a JSON file {theme: [phrasing, ...]},
+    e.g. the English translations of the French themes.
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+class Query:
+    """
+    A normalized theme, its phrasings and their model inputs, computed once and kept in the QueryPipeline cache.
+    """
+
+    def __init__(self, theme: str, phrasings: list):
+        self.theme = theme
+        self.phrasings = phrasings
+        self.embeddings = None
+        self.token_ids = None
+        self.lock = threading.Lock()
+
+class QueryPipeline:
+    """
+    Query side of the semantic search: the theme is normalized, optionally expanded into several
+    phrasings (e.g. a French theme and its English translations, most questions coming from English APIs),
+    and the embeddings and token ids of the phrasings are computed once per theme.
+
+    The reranker scores of the phrasings are fused per question. The questions are tokenized once
+    and each (phrasing, question) pair is assembled from token ids, so that P phrasings cost a single
+    tokenization and retrieval pass. With phrasings_per_question, each question is only reranked against
+    the phrasings closest to it in the embedding space, which bounds the forward passes whatever P.
+    """
+
+    def __init__(
+        self,
+        reranker_model,
+        embedding_index=None,
+        phrasings=None,
+        max_phrasings=4,
+        phrasings_per_question=None,
+        fusion="max",
+        cache_size=1024,
+    ):
+        """
+        Initialize the QueryPipeline.
+
+        :param reranker_model: A RerankerModel.
+        :param embedding_index: Optional EmbeddingIndex of the questions, its model embeds the phrasings.
+        :param phrasings: Optional extra phrasings of the themes: dictionary theme -> list of phrasings
+            (see load_phrasings) or function theme -> list of phrasings (a translation model...).
+        :param max_phrasings: Maximum number of phrasings per theme, the theme itself included.
+        :param phrasings_per_question: Number of phrasings (the most similar by embeddings) each question is reranked
+            against, None for all of them. Requires embedding_index and question ids, all phrasings are used otherwise.
+        :param fusion: How the scores of the phrasings are combined: "max" (a question matches one of the phrasings)
+            or "mean" (a question matches all of them).
+        :param cache_size: Number of themes whose phrasings, embeddings and token ids are kept in memory.
+        """
+        if fusion not in FUSIONS:
+            raise ValueError(f"Unknown fusion '{fusion}', expected one of {FUSIONS}")
+        self.reranker_model = reranker_model
+        self.embedding_index = embedding_index
+        self.max_phrasings = max_phrasings
+        self.phrasings_per_question = phrasings_per_question
+        self.fusion = fusion
+        self.cache_size = cache_size
+        self.queries = OrderedDict()
+        self.lock = threading.Lock()
+        self._pair_template = None
+
+        self.phrasings = phrasings
+        if isinstance(phrasings, dict):
+            self.phrasings = {ScoreCache.normalize_theme(theme): theme_phrasings for theme, theme_phrasings in phrasings.items()}
+
+    @staticmethod
+    def normalize(theme: str):
+        """
+        Clean up a theme typed in the UI: Unicode NFC form, single spaces, no surrounding spaces.
+        The case is kept for the models, the cache key (ScoreCache.normalize_theme) ignores it.
+        """
+        return " ".join(unicodedata.normalize("NFC", theme).split())
+
+    def expand(self, theme: str):
+        """
+        :return: The phrasings of a normalized theme, the theme itself first, without duplicates.
+        """
+        if self.phrasings is None:
+            extra_phrasings = []
+        elif callable(self.phrasings):
+            extra_phrasings = self.phrasings(theme)
+        else:
+            extra_phrasings = self.phrasings.get(ScoreCache.normalize_theme(theme), [])
+
+        phrasings = {ScoreCache.normalize_theme(theme): theme}
+        for phrasing in extra_phrasings:
+            phrasing = self.normalize(phrasing)
+            if phrasing:
+                phrasings.setdefault(ScoreCache.normalize_theme(phrasing), phrasing)
+        return list(phrasings.values())[:self.max_phrasings]
+
+    def query(self, theme: str):
+        """
+        :return: The cached Query of a theme, created on first use.
+        """
+        theme = self.normalize(theme)
+        key = ScoreCache.normalize_theme(theme)
+        with self.lock:
+            query = self.queries.get(key)
+            if query is not None:
+                self.queries.move_to_end(key)
+                metrics.increment("query_cache_hits")
+                return query
+
+        metrics.increment("query_cache_misses")
+        query = Query(theme, self.expand(theme))
+        with self.lock:
+            query = self.queries.setdefault(key, query)
+            while len(self.queries) > self.cache_size:
+                self.queries.popitem(last=False)
+        return query
+
+    def query_embeddings(self, query: Query, priority=0):
+        """
+        :return: NumPy array of the normalized embeddings of the phrasings, one row per phrasing.
+        """
+        with query.lock:
+            if query.embeddings is None:
+                query.embeddings = self.embedding_index.embedding_model.compute_embeddings(query.phrasings, priority)
+            return query.embeddings
+
+    def retrieve(self, theme: str, top_k: int, candidate_ids=None, priority=0):
+        """
+        Retrieve the top_k questions closest to any phrasing of the theme, in a single pass over the embedding index.
+
+        :param candidate_ids: Optional ids restricting the search, see EmbeddingIndex.retrieve.
+        :return: A tuple (ids, scores) of NumPy arrays sorted by decreasing score (best similarity over the phrasings).
+        """
+        query = self.query(theme)
+        results = self.embedding_index.retrieve_many(self.query_embeddings(query, priority), top_k, candidate_ids)
+        if len(results) == 1:
+            return results[0]
+
+        ids = np.concatenate([ids for ids, _ in results])
+        scores = np.concatenate([scores for _, scores in results])
+
+        # Candidates not indexed yet (NaN scores) are kept after the top_k, once each, as in retrieve_many
+        is_missing = np.isnan(scores)
+        _, first_missing = np.unique(ids[is_missing], return_index=True)
+        missing_ids = ids[is_missing][np.sort(first_missing)]
+        ids, scores = ids[~is_missing], scores[~is_missing]
+
+        # A question in the fused top_k is in the top_k of the phrasing giving its best score
+        order = np.lexsort((-scores, ids))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = ids[order[1:]] != ids[order[:-1]]
+        ids, scores = ids[order[first]], scores[order[first]]
+        top_indices = self.reranker_model.top_indices(scores, top_k)
+        return (
+            np.concatenate([ids[top_indices], missing_ids]),
+            np.concatenate([scores[top_indices], np.full(len(missing_ids), np.nan, dtype=np.float32)]),
+        )
+
+    @property
+    def pair_template(self):
+        """
+        Special tokens and token types around the two sequences of a pair, read from the tokenizer
+        (e.g. [CLS] a [SEP] b [SEP] for BERT, <s> a </s></s> b </s> for XLM-RoBERTa).
+
+        :return: Dictionary key -> (prefix, first sequence value, middle, second sequence value, suffix), None for
+            the input_ids sequence values, or None if the tokenizer is not a fast tokenizer.
+        """
+        if self._pair_template is None:
+            tokenizer = self.reranker_model.tokenizer
+            if not tokenizer.is_fast:
+                return None
+            encoding = tokenizer("a", "b")
+            sequence_ids = encoding.sequence_ids()
+            first = [idx for idx, sequence_id in enumerate(sequence_ids) if sequence_id == 0]
+            second = [idx for idx, sequence_id in enumerate(sequence_ids) if sequence_id == 1]
+            self._pair_template = {
+                key: (
+                    values[:first[0]],
+                    None if key == "input_ids" else values[first[0]],
+                    values[first[-1] + 1:second[0]],
+                    None if key == "input_ids" else values[second[0]],
+                    values[second[-1] + 1:],
+                )
+                for key, values in encoding.items()
+                if key in tokenizer.model_input_names
+            }
+        return self._pair_template
+
+    def theme_token_ids(self, query: Query):
+        """
+        :return: Token ids (without special tokens) of each phrasing.
+        """
+        with query.lock:
+            if query.token_ids is None:
+                query.token_ids = self.reranker_model.tokenizer(query.phrasings, add_special_tokens=False)["input_ids"]
+            return query.token_ids
+
+    def select_phrasings(self, query: Query, num_questions: int, question_ids=None, priority=0):
+        """
+        Phrasings each question is reranked against (see phrasings_per_question). The questions missing
+        from the embedding index (ingested since the last reindex) are reranked against all the phrasings.
+
+        :return: Integer array (slots x num_questions) of indices in query.phrasings, -1 for the unused slots
+            of a question. The first slot of every question is used.
+        """
+        num_phrasings = len(query.phrasings)
+        all_phrasings = np.repeat(np.arange(num_phrasings)[:, None], num_questions, axis=1)
+        per_question = self.phrasings_per_question
+        if per_question is None or per_question >= num_phrasings or self.embedding_index is None or question_ids is None:
+            return all_phrasings
+
+        question_embeddings, found = self.embedding_index.get_embeddings(question_ids)
+        if not found.any():
+            return all_phrasings
+
+        similarities = self.query_embeddings(query, priority) @ question_embeddings[found].astype(np.float32).T
+        phrasing_indices = all_phrasings
+        phrasing_indices[:, found] = -1
+        phrasing_indices[:per_question, found] = np.argsort(-similarities, axis=0, kind="stable")[:per_question]
+        if found.all():
+            return phrasing_indices[:per_question]
+        return phrasing_indices
+
+    def encode_pairs(self, query: Query, questions: list, phrasing_indices):
+        """
+        Model inputs of the (phrasing, question) pairs of the used slots of phrasing_indices, slot-major, assembled
+        from the cached token ids of the phrasings and a single tokenization of the questions.
+
+        :return: A tuple (encodings, lengths, pair_indices): dictionary key -> list of lists, the number of tokens
+            of each pair, and the pair of each slot of phrasing_indices (-1 for the unused slots).
+        """
+        reranker_model = self.reranker_model
+        tokenizer = reranker_model.tokenizer
+        template = self.pair_template
+        theme_token_ids = self.theme_token_ids(query)
+        with metrics.timer("reranker_tokenize"):
+            question_token_ids = tokenizer(questions, add_special_tokens=False, truncation=True, max_length=tokenizer.model_max_length)["input_ids"]
+
+        encodings = {key: [] for key in template}
+        pair_indices = np.full(phrasing_indices.shape, -1, dtype=np.int64)
+        too_long = []
+        for slot, slot_phrasings in enumerate(phrasing_indices):
+            for question_idx, (phrasing_idx, question_ids) in enumerate(zip(slot_phrasings, question_token_ids)):
+                if phrasing_idx < 0:
+                    continue
+                pair_indices[slot, question_idx] = len(encodings["input_ids"])
+                theme_ids = theme_token_ids[phrasing_idx]
+                for key, (prefix, first_value, middle, second_value, suffix) in template.items():
+                    if key == "input_ids":
+                        encodings[key].append(prefix + theme_ids + middle + question_ids + suffix)
+                    else:
+                        encodings[key].append(prefix + [first_value] * len(theme_ids) + middle + [second_value] * len(question_ids) + suffix)
+                if len(encodings["input_ids"][-1]) >= tokenizer.model_max_length:
+                    too_long.append((len(encodings["input_ids"]) - 1, phrasing_idx, question_idx))
+
+        # Pairs reaching the model limit go through the tokenizer for the usual truncation
+        if too_long:
+            truncated = tokenizer([query.phrasings[p] for _, p, _ in too_long], [questions[q] for _, _, q in too_long], truncation=True)
+            for row, (pair_idx, _, _) in enumerate(too_long):
+                for key in encodings:
+                    encodings[key][pair_idx] = truncated[key][row]
+
+        lengths = np.array([len(input_ids) for input_ids in encodings["input_ids"]], dtype=np.int64)
+        return encodings, lengths, pair_indices
+
+    @staticmethod
+    def scatter_logits(used, logits):
+        """
+        :return: Array shaped like the boolean mask used (slots x questions), logits in the used slots (row-major), NaN elsewhere.
+        """
+        all_logits = np.full(used.shape, np.nan, dtype=np.float32)
+        all_logits[used] = logits
+        return all_logits
+
+    def iter_logits(self, query: Query, questions: list, phrasing_indices, priority=0):
+        """
+        Compute the logits of the selected phrasings of the questions, batch of questions by batch of questions.
+
+        :param phrasing_indices: Phrasings of each question, see select_phrasings.
+        :return: Generator of (indices, logits) tuples, indices being positions in questions and logits
+            an array (slots x len(indices)), NaN in the unused slots. Closing the generator stops the remaining batches.
+        """
+        if not questions:
+            return
+
+        reranker_model = self.reranker_model
+        num_slots = len(phrasing_indices)
+        if reranker_model.pool is not None or reranker_model.scheduler is not None or self.pair_template is None:
+            # The pool workers and the scheduler take text pairs: the phrasings of a question still share the call
+            yield from self.iter_text_logits(query, questions, phrasing_indices, priority)
+            return
+
+        encodings, lengths, pair_indices = self.encode_pairs(query, questions, phrasing_indices)
+        # Batches of questions with all their phrasings, sized on the longest pair of each question
+        question_lengths = np.where(pair_indices >= 0, lengths[pair_indices], 0).max(axis=0)
+        for batch in reranker_model.length_batches(question_lengths * num_slots):
+            batch_pairs = pair_indices[:, batch]
+            used = batch_pairs >= 0
+            pairs = batch_pairs[used]
+            inputs = reranker_model.pad_batch(encodings, lengths, pairs)
+            reranker_model.record_batch(len(pairs), int(lengths[pairs].sum()), len(pairs) * int(lengths[pairs].max()))
+
+            with metrics.timer("reranker_forward"), torch.no_grad():
+                batch_logits = reranker_model.model(**inputs, return_dict=True).logits.view(-1, ).float().cpu().numpy()
+            yield batch, self.scatter_logits(used, batch_logits)
+
+    def iter_text_logits(self, query: Query, questions: list, phrasing_indices, priority=0):
+        """
+        Same as iter_logits through RerankerModel.compute_logits / submit_logits (pool, micro-batching scheduler).
+        """
+        reranker_model = self.reranker_model
+        num_slots = len(phrasing_indices)
+        if reranker_model.scheduler is not None:
+            chunk_size = reranker_model.scheduler.max_batch_size
+        elif reranker_model.pool is not None:
+            chunk_size = reranker_model.pool.shard_size * reranker_model.pool.num_workers
+        else:
+            chunk_size = reranker_model.batch_size
+        chunk_size = max(1, chunk_size // num_slots)
+
+        chunks = []
+        for start_idx in range(0, len(questions), chunk_size):
+            chunk = np.arange(start_idx, min(start_idx + chunk_size, len(questions)))
+            used = phrasing_indices[:, chunk] >= 0
+            themes = [query.phrasings[phrasing_idx] for phrasing_idx in phrasing_indices[:, chunk][used]]
+            chunk_questions = [questions[chunk[column]] for column in np.nonzero(used)[1]]
+            chunks.append((chunk, used, themes, chunk_questions))
+
+        if reranker_model.scheduler is not None:
+            futures = {reranker_model.submit_logits(themes, chunk_questions, priority): (chunk, used) for chunk, used, themes, chunk_questions in chunks}
+            try:
+                for future in as_completed(futures):
+                    chunk, used = futures[future]
+                    yield chunk, self.scatter_logits(used, np.asarray(future.result(), dtype=np.float32))
+            finally:
+                for future in futures:
+                    future.cancel()
+        else:
+            for chunk, used, themes, chunk_questions in chunks:
+                yield chunk, self.scatter_logits(used, reranker_model.compute_logits(themes, chunk_questions, priority))
+
+    def fuse(self, logits):
+        """
+        Combine the logits of the phrasings (array slots x questions, NaN in the unused slots) into one score per question.
+        """
+        fused = np.nanmax(logits, axis=0) if self.fusion == "max" else np.nanmean(logits, axis=0)
+        if self.reranker_model.do_normalize_score:
+            return self.reranker_model.normalize_score(fused)
+        return fused
+
+    def iter_scores(self, theme: str, questions: list, question_ids=None, priority=0):
+        """
+        Same as RerankerModel.iter_scores, with the fused scores of the phrasings of the theme.
+        The score cache is looked up and filled per phrasing.
+        """
+        reranker_model = self.reranker_model
+        score_cache = reranker_model.score_cache
+        query = self.query(theme)
+        phrasing_indices = self.select_phrasings(query, len(questions), question_ids, priority)
+        missing = np.arange(len(questions))
+        use_cache = score_cache is not None and question_ids is not None
+
+        if use_cache:
+            logits = np.stack([score_cache.get_many(phrasing, question_ids, reranker_model.model_id) for phrasing in query.phrasings])
+            used = phrasing_indices >= 0
+            logits = np.where(used, np.take_along_axis(logits, np.maximum(phrasing_indices, 0), axis=0), np.nan)
+            # A question is computed again for all its phrasings if one of them is missing
+            is_missing = (np.isnan(logits) & used).any(axis=0)
+            cached = np.flatnonzero(~is_missing)
+            missing = np.flatnonzero(is_missing)
+            reranker_model.record_cache_lookup(len(questions), len(missing))
+            if len(cached) > 0:
+                yield cached, self.fuse(logits[:, cached])
+
+        batches = self.iter_logits(query, [questions[i] for i in missing], phrasing_indices[:, missing], priority)
+        try:
+            for batch, batch_logits in batches:
+                indices = missing[batch]
+                if use_cache:
+                    batch_phrasings = phrasing_indices[:, indices]
+                    for phrasing_idx, phrasing in enumerate(query.phrasings):
+                        slots, columns = np.nonzero(batch_phrasings == phrasing_idx)
+                        if len(columns) > 0:
+                            score_cache.set_many(phrasing, [question_ids[i] for i in indices[columns]], batch_logits[slots, columns], reranker_model.model_id)
+                yield indices, self.fuse(batch_logits)
+        finally:
+            batches.close()
+
+    def score_questions(self, theme: str, questions: list, question_ids=None, priority=0):
+        """
+        :return: NumPy float32 array of the fused scores of the questions, see iter_scores.
+        """
+        scores = np.empty(len(questions), dtype=np.float32)
+        for indices, batch_scores in self.iter_scores(theme, questions, question_ids, priority):
+            scores[indices] = batch_scores
+        return scores
+
+    def rerank_questions(self, theme: str, questions: list, question_ids=None, top_k=None, priority=0):
+        """
+        Same as RerankerModel.rerank_questions, with the fused scores of the phrasings of the theme.
+        """
+        with metrics.timer("query_pipeline_rerank_questions"):
+            all_scores = self.score_questions(theme, questions, question_ids, priority)
+            top_indices = self.reranker_model.top_indices(all_scores, top_k)
+        return top_indices, all_scores[top_indices]
@@ -1,8 +1,12 @@
+from concurrent.futures import as_completed
+
 import torch
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
 import numpy as np
 
 from .model_loader import ModelLoader
+from .batch_scheduler import BatchScheduler
+from monitoring import metrics
 
 from env import PRETRAINED_HUGGINGFACE_MODELS_PATH
 
@@ -11,6 +15,8 @@ class RerankerModel(ModelLoader):
     Concrete implementation of the ModelLoader class for loading a reranking model.
     """
 
+    output_name = "logits"
+
     def __init__(
         self, 
         model_name="BAAI/bge-reranker-v2-m3", 
@@ -18,51 +24,372 @@ class RerankerModel(ModelLoader):
         do_normalize_score=True,
         device=('cuda' if torch.cuda.is_available() else 'cpu'),
         batch_size=32,
+        score_cache=None,
+        batching="length",
+        max_tokens_per_batch=8192,
+        backend="torch",
+        pool=None,
+        scheduler_max_wait=None,
+        scheduler_max_batch_size=256,
     ):
         """
         Initialize the RerankerModel with the model name and local path.
 
         :param model_name: The name of the reranking model to load from Hugging Face.
         :param local_path: The local directory path where the model and tokenizer will be saved.
+        :param score_cache: Optional ScoreCache reused across searches for the (theme, question id) pairs already scored.
+        :param batching: "fixed" for batches of batch_size pairs in input order, "length" for batches of pairs
+            sorted by tokenized length and bounded by max_tokens_per_batch (padded tokens).
+        :param max_tokens_per_batch: Maximum number of tokens (padding included) per batch in "length" mode.
+        :param backend: Inference backend, see ModelLoader.
+        :param pool: Optional RerankerPool (started by load_model_and_tokenizer if needed); the logits are then
+            computed by its worker processes and this instance does not need to load the model.
+        :param scheduler_max_wait: Micro-batching window (in seconds) merging the pairs of concurrent requests into
+            shared batches (see BatchScheduler), None to compute each request on its own.
+        :param scheduler_max_batch_size: Maximum number of pairs per shared batch.
         """
         self.do_normalize_score = do_normalize_score
         self.batch_size = batch_size
-        super().__init__(model_name, local_path, AutoModelForSequenceClassification, AutoTokenizer, device)
+        self.score_cache = score_cache
+        self.batching = batching
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.pool = pool
+        self.scheduler = None
+        if scheduler_max_wait is not None:
+            self.scheduler = BatchScheduler(
+                lambda pairs: self.run_logits([pair[0] for pair in pairs], [pair[1] for pair in pairs]),
+                scheduler_max_batch_size,
+                scheduler_max_wait,
+                num_threads=pool.num_workers if pool is not None else 1,
+            )
+        super().__init__(model_name, local_path, AutoModelForSequenceClassification, AutoTokenizer, device, backend)
+
+    def download_if_not_exists(self):
+        if self.pool is not None:
+            # The workers load (and warm up) their own copy of the model
+            if not self.pool.is_running:
+                self.pool.start()
+            return
+        super().download_if_not_exists()
 
-    def rerank_questions(self, theme: str, questions: list):
+    def warmup(self):
         """
-        Rerank a list of questions based on their relevance to a theme.
+        Score a batch of typical pairs, outside the micro-batching scheduler.
+        """
+        if self.pool is None:
+            self.run_logits("Harry Potter", ["Qui a écrit la série de romans Harry Potter ?"] * min(self.batch_size, 8))
 
-        :param theme: The theme to compare the questions against.
-        :param questions: List of questions to rerank.
-        :return: A tuple containing the sorted list of questions and their corresponding scores.
+    def compute_logits(self, theme, questions: list, priority=0):
         """
-        all_scores = []
+        Compute the raw relevance logits of a list of questions for a theme.
+
+        :param theme: The theme to compare the questions against (or a list of themes aligned with questions).
+        :param questions: List of questions to score.
+        :param priority: Priority of the request in the micro-batching scheduler.
+        :return: NumPy float32 array of logits aligned with questions.
+        """
+        if self.scheduler is not None:
+            return np.asarray(self.submit_logits(theme, questions, priority).result(), dtype=np.float32)
+        return self.run_logits(theme, questions)
+
+    def submit_logits(self, theme, questions: list, priority=0):
+        """
+        Queue the pairs of a request in the micro-batching scheduler (scheduler_max_wait must be set).
+        Cancelling the returned future drops the pairs not scored yet.
+
+        :return: A concurrent.futures.Future resolved with the list of logits aligned with questions.
+        """
+        themes = [theme] * len(questions) if isinstance(theme, str) else theme
+        return self.scheduler.submit(list(zip(themes, questions)), priority)
+
+    def run_logits(self, theme, questions: list):
+        """
+        Same as compute_logits, computed right away in the calling thread.
+        """
+        if self.pool is not None:
+            return self.pool.compute_logits(theme, questions)
+
+        if self.batching == "length":
+            return self.compute_logits_by_length(theme, questions)
+
+        all_logits = np.empty(len(questions), dtype=np.float32)
 
         # Process questions in batches
         for start_idx in range(0, len(questions), self.batch_size):
             batch_questions = questions[start_idx:start_idx + self.batch_size]
-            pairs = [[theme, question] for question in batch_questions]
+            batch_themes = [theme] * len(batch_questions) if isinstance(theme, str) else theme[start_idx:start_idx + self.batch_size]
+            pairs = [[batch_theme, question] for batch_theme, question in zip(batch_themes, batch_questions)]
 
             # Tokenize the batch
-            inputs = self.tokenizer(pairs, return_tensors="pt", truncation=True, padding=True).to(self.device)
+            with metrics.timer("reranker_tokenize"):
+                inputs = self.tokenizer(pairs, return_tensors="pt", truncation=True, padding=True).to(self.device)
+            tokens = int(inputs["attention_mask"].sum())
+            self.record_batch(len(pairs), tokens, inputs["attention_mask"].numel())
 
             # Compute scores for the batch
-            with torch.no_grad():
-                batch_scores = self.model(**inputs, return_dict=True).logits.view(-1, ).float().cpu().numpy()
+            with metrics.timer("reranker_forward"), torch.no_grad():
+                all_logits[start_idx:start_idx + len(batch_questions)] = self.model(**inputs, return_dict=True).logits.view(-1, ).float().cpu().numpy()
+
+        return all_logits
+
+    @staticmethod
+    def record_batch(num_pairs, tokens, padded_tokens):
+        """
+        Count the pairs, real tokens and padding tokens of a batch sent to the model.
+        """
+        metrics.increment("reranker_batches")
+        metrics.increment("reranker_pairs", num_pairs)
+        metrics.increment("reranker_tokens", tokens)
+        metrics.increment("reranker_padding_tokens", padded_tokens - tokens)
+
+    def tokenize_pairs(self, theme, questions: list):
+        """
+        Tokenize every (theme, question) pair once, without padding.
+
+        :return: A tuple (encodings, lengths) with the tokenizer output and the number of tokens of each pair.
+        """
+        themes = [theme] * len(questions) if isinstance(theme, str) else theme
+        with metrics.timer("reranker_tokenize"):
+            encodings = self.tokenizer(themes, questions, truncation=True)
+        lengths = np.array([len(input_ids) for input_ids in encodings["input_ids"]], dtype=np.int64)
+        return encodings, lengths
+
+    def length_batches(self, lengths):
+        """
+        Group pairs of similar length: pairs are sorted by length and a batch is closed
+        as soon as its padded size would exceed max_tokens_per_batch.
+
+        :param lengths: NumPy array with the number of tokens of each pair.
+        :return: List of NumPy arrays of pair indices, one per batch.
+        """
+        batches = []
+        batch = []
+        for idx in np.argsort(lengths, kind="stable"):
+            # Sorted lengths: the padded length of the batch is the length of the new pair
+            if batch and (len(batch) + 1) * lengths[idx] > self.max_tokens_per_batch:
+                batches.append(np.array(batch))
+                batch = []
+            batch.append(idx)
+        if batch:
+            batches.append(np.array(batch))
+        return batches
+
+    def pad_batch(self, encodings, lengths, batch):
+        """
+        Build the padded model inputs of a batch of pre-tokenized pairs.
+
+        :param encodings: Tokenizer output of tokenize_pairs.
+        :param lengths: Number of tokens of each pair.
+        :param batch: Indices of the pairs of the batch.
+        :return: Dictionary of tensors on the model device.
+        """
+        max_length = lengths[batch].max()
+        inputs = {}
+        for key in encodings.keys():
+            pad_value = self.tokenizer.pad_token_id if key == "input_ids" else 0
+            padded = np.full((len(batch), max_length), pad_value, dtype=np.int64)
+            for row, idx in enumerate(batch):
+                if self.tokenizer.padding_side == "left":
+                    padded[row, max_length - lengths[idx]:] = encodings[key][idx]
+                else:
+                    padded[row, :lengths[idx]] = encodings[key][idx]
+            inputs[key] = torch.from_numpy(padded).to(self.device)
+        return inputs
+
+    def compute_logits_by_length(self, theme, questions: list):
+        """
+        Same as run_logits, with one tokenization for the whole request and
+        length-bucketed batches bounded by a token budget to minimize padding.
+        """
+        all_logits = np.empty(len(questions), dtype=np.float32)
+        for batch, batch_logits in self.iter_logits_by_length(theme, questions):
+            all_logits[batch] = batch_logits
+        return all_logits
 
-            if self.do_normalize_score:
-                batch_scores = self.normalize_score(batch_scores)
+    def iter_logits_by_length(self, theme, questions: list):
+        """
+        Generator version of compute_logits_by_length, yielding (indices, logits) after each batch.
+        """
+        if not questions:
+            return
+
+        encodings, lengths = self.tokenize_pairs(theme, questions)
+        for batch in self.length_batches(lengths):
+            inputs = self.pad_batch(encodings, lengths, batch)
+            self.record_batch(len(batch), int(lengths[batch].sum()), len(batch) * int(lengths[batch].max()))
+
+            with metrics.timer("reranker_forward"), torch.no_grad():
+                batch_logits = self.model(**inputs, return_dict=True).logits.view(-1, ).float().cpu().numpy()
+            yield batch, batch_logits
+
+    def iter_logits(self, theme: str, questions: list, priority=0):
+        """
+        Compute the logits batch by batch.
+
+        :param theme: The theme to compare the questions against.
+        :param questions: List of questions to score.
+        :param priority: Priority of the request in the micro-batching scheduler.
+        :return: Generator of (indices, logits) tuples, indices being positions in questions, in completion order.
+            Closing the generator cancels the batches not computed yet.
+        """
+        if self.scheduler is not None:
+            chunk_size = self.scheduler.max_batch_size
+            futures = {
+                self.submit_logits(theme, questions[start_idx:start_idx + chunk_size], priority): np.arange(start_idx, min(start_idx + chunk_size, len(questions)))
+                for start_idx in range(0, len(questions), chunk_size)
+            }
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], np.asarray(future.result(), dtype=np.float32)
+            finally:
+                for future in futures:
+                    future.cancel()
+        elif self.pool is not None:
+            # One chunk keeps every worker busy
+            chunk_size = self.pool.shard_size * self.pool.num_workers
+            for start_idx in range(0, len(questions), chunk_size):
+                batch_questions = questions[start_idx:start_idx + chunk_size]
+                yield np.arange(start_idx, start_idx + len(batch_questions)), self.pool.compute_logits(theme, batch_questions)
+        elif self.batching == "length":
+            yield from self.iter_logits_by_length(theme, questions)
+        else:
+            for start_idx in range(0, len(questions), self.batch_size):
+                batch_questions = questions[start_idx:start_idx + self.batch_size]
+                yield np.arange(start_idx, start_idx + len(batch_questions)), self.run_logits(theme, batch_questions)
+
+    def score_questions(self, theme: str, questions: list, question_ids=None, priority=0):
+        """
+        Score a list of questions for a theme, reusing the score cache when question ids are given.
+
+        :param theme: The theme to compare the questions against.
+        :param questions: List of questions to score.
+        :param question_ids: Optional list of question ids aligned with questions, used as cache keys.
+        :param priority: Priority of the request in the micro-batching scheduler.
+        :return: NumPy float32 array of scores aligned with questions.
+        """
+        if self.score_cache is None or question_ids is None:
+            logits = self.compute_logits(theme, questions, priority)
+        else:
+            # Only the pairs missing from the cache go through the model
+            logits = self.score_cache.get_many(theme, question_ids, self.model_id)
+            missing = np.flatnonzero(np.isnan(logits))
+            self.record_cache_lookup(len(logits), len(missing))
+            if len(missing) > 0:
+                logits[missing] = self.compute_logits(theme, [questions[i] for i in missing], priority)
+                self.score_cache.set_many(theme, [question_ids[i] for i in missing], logits[missing], self.model_id)
+
+        if self.do_normalize_score:
+            return self.normalize_score(logits)
+        return logits
+
+    def score_many(self, themes: list, questions: list, question_ids=None, priority=0):
+        """
+        Score the candidate questions of several themes at once: the pairs missing from the score cache
+        are computed together, so that the batches are filled across themes.
+
+        :param themes: List of themes.
+        :param questions: List (one per theme) of lists of questions to score.
+        :param question_ids: Optional list (one per theme) of lists of question ids, used as cache keys.
+        :param priority: Priority of the request in the micro-batching scheduler.
+        :return: List (one per theme) of NumPy float32 arrays of scores aligned with the questions.
+        """
+        use_cache = self.score_cache is not None and question_ids is not None
+        all_logits = []
+        all_missing = []
+        pair_themes = []
+        pair_questions = []
+        for theme_idx, (theme, theme_questions) in enumerate(zip(themes, questions)):
+            if use_cache:
+                logits = self.score_cache.get_many(theme, question_ids[theme_idx], self.model_id)
+            else:
+                logits = np.full(len(theme_questions), np.nan, dtype=np.float32)
+            missing = np.flatnonzero(np.isnan(logits))
+            if use_cache:
+                self.record_cache_lookup(len(logits), len(missing))
 
-            all_scores.extend(batch_scores)
+            all_logits.append(logits)
+            all_missing.append(missing)
+            pair_themes += [theme] * len(missing)
+            pair_questions += [theme_questions[i] for i in missing]
 
-        # Sort questions by score in descending order
-        sorted_questions_with_scores = sorted(zip(questions, all_scores), key=lambda x: x[1], reverse=True)
+        computed_logits = self.compute_logits(pair_themes, pair_questions, priority)
+        start_idx = 0
+        for theme_idx, missing in enumerate(all_missing):
+            theme_logits = computed_logits[start_idx:start_idx + len(missing)]
+            all_logits[theme_idx][missing] = theme_logits
+            if use_cache and len(missing) > 0:
+                self.score_cache.set_many(themes[theme_idx], [question_ids[theme_idx][i] for i in missing], theme_logits, self.model_id)
+            start_idx += len(missing)
 
-        # Unzip the sorted list into questions and scores
-        sorted_questions, sorted_scores = zip(*sorted_questions_with_scores)
+        if self.do_normalize_score:
+            return [self.normalize_score(logits) for logits in all_logits]
+        return all_logits
+
+    def iter_scores(self, theme: str, questions: list, question_ids=None, priority=0):
+        """
+        Score a list of questions for a theme batch by batch, for progressive results.
+        Scores found in the score cache come first, in a single batch.
+
+        :param theme: The theme to compare the questions against.
+        :param questions: List of questions to score.
+        :param question_ids: Optional list of question ids aligned with questions, used as cache keys.
+        :param priority: Priority of the request in the micro-batching scheduler.
+        :return: Generator of (indices, scores) tuples of NumPy arrays, indices being positions in questions.
+            Closing the generator stops the remaining batches.
+        """
+        missing = np.arange(len(questions))
+        use_cache = self.score_cache is not None and question_ids is not None
+
+        if use_cache:
+            logits = self.score_cache.get_many(theme, question_ids, self.model_id)
+            cached = np.flatnonzero(~np.isnan(logits))
+            missing = np.flatnonzero(np.isnan(logits))
+            self.record_cache_lookup(len(logits), len(missing))
+            if len(cached) > 0:
+                yield cached, self.normalize_score(logits[cached]) if self.do_normalize_score else logits[cached]
+
+        batches = self.iter_logits(theme, [questions[i] for i in missing], priority)
+        try:
+            for batch, batch_logits in batches:
+                indices = missing[batch]
+                if use_cache:
+                    self.score_cache.set_many(theme, [question_ids[i] for i in indices], batch_logits, self.model_id)
+                yield indices, self.normalize_score(batch_logits) if self.do_normalize_score else batch_logits
+        finally:
+            batches.close()
+
+    @staticmethod
+    def record_cache_lookup(num_pairs, num_missing):
+        metrics.increment("score_cache_hits", num_pairs - num_missing)
+        metrics.increment("score_cache_misses", num_missing)
+
+    @staticmethod
+    def top_indices(scores, top_k=None):
+        """
+        :return: Positions of the top_k best scores (all of them if None), sorted by decreasing score.
+        """
+        if top_k is None or top_k >= len(scores):
+            top_indices = np.arange(len(scores))
+        else:
+            top_indices = np.argpartition(-scores, top_k)[:top_k]
+        return top_indices[np.argsort(-scores[top_indices], kind="stable")]
+
+    def rerank_questions(self, theme: str, questions: list, question_ids=None, top_k=None, priority=0):
+        """
+        Rerank a list of questions based on their relevance to a theme.
+
+        :param theme: The theme to compare the questions against.
+        :param questions: List of questions to rerank.
+        :param question_ids: Optional list of question ids aligned with questions, used as score cache keys.
+        :param top_k: Number of best questions to return (all of them if None).
+        :param priority: Priority of the request in the micro-batching scheduler.
+        :return: A tuple (indices, scores) of NumPy arrays: positions in questions of the best questions
+            sorted by decreasing score, and their scores.
+        """
+        with metrics.timer("reranker_rerank_questions"):
+            all_scores = self.score_questions(theme, questions, question_ids, priority)
+            top_indices = self.top_indices(all_scores, top_k)
+        return top_indices, all_scores[top_indices]
 
-        return list(sorted_questions), list(sorted_scores)
-    
     def normalize_score(self, score: float):
         return 1 / (1 + np.exp(-score)) # sigmoid
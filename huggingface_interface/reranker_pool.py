@@ -0,0 +1,230 @@
+import multiprocessing
+import os
+import queue
+import threading
+from collections import deque
+from itertools import count
+
+import numpy as np
+import torch
+
+from monitoring import metrics
+
+def _worker_main(model_kwargs, num_threads, task_queue, result_queue):
+    """
+    Worker process: load the reranker once, then score the shards sent by the pool.
+    """
+    torch.set_num_threads(num_threads)
+    # Imported in the worker so that the parent never needs the model weights
+    from .reranker_model import RerankerModel
+
+    try:
+        reranker_model = RerankerModel(**model_kwargs)
+        reranker_model.load_model_and_tokenizer(warmup=True)
+    except Exception as error:
+        result_queue.put(("error", os.getpid(), repr(error)))
+        return
+    result_queue.put(("ready", os.getpid(), None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        request_id, start_idx, theme, questions = task
+        try:
+            result_queue.put((request_id, start_idx, reranker_model.compute_logits(theme, questions)))
+        except Exception as error:
+            result_queue.put((request_id, start_idx, repr(error)))
+
+class _Request:
+    def __init__(self, theme, questions, shard_size):
+        self.theme = theme
+        self.questions = questions
+        self.logits = np.empty(len(questions), dtype=np.float32)
+        self.shards = deque((start_idx, min(start_idx + shard_size, len(questions))) for start_idx in range(0, len(questions), shard_size))
+        self.remaining = len(self.shards)
+        self.error = None
+        self.done = threading.Event()
+
+class RerankerPool:
+    """
+    Pool of worker processes, each holding its own copy of the reranker, used by RerankerModel
+    to spread the scoring of a request over several cores.
+
+    The pairs of a request are cut into shards scored by the workers in parallel and reassembled
+    in order. Shards are dispatched round-robin between the pending requests, with a bounded number
+    of shards in flight, so that a small search does not wait behind the whole of a large one.
+    """
+
+    def __init__(
+        self,
+        num_workers=2,
+        threads_per_worker=None,
+        shard_size=128,
+        max_in_flight=None,
+        **model_kwargs,
+    ):
+        """
+        Initialize the RerankerPool (the workers are started by start).
+
+        :param num_workers: Number of worker processes.
+        :param threads_per_worker: torch.set_num_threads of each worker (cores divided by num_workers if None).
+        :param shard_size: Number of (theme, question) pairs scored by a worker at once.
+        :param max_in_flight: Number of shards queued to the workers at any time (2 per worker if None),
+            bounds the wait of a new request behind the others.
+        :param model_kwargs: Arguments of the RerankerModel built in each worker (model_name, backend, batch_size...).
+        """
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+        self.shard_size = shard_size
+        self.max_in_flight = max_in_flight or 2 * num_workers
+        self.model_kwargs = model_kwargs
+
+        self.workers = []
+        self.requests = {}
+        self.pending = deque()
+        self.in_flight = 0
+        self.request_ids = count()
+        self.lock = threading.Lock()
+        self.collector = None
+        self.closed = False
+
+    @property
+    def is_running(self):
+        return self.collector is not None and not self.closed
+
+    def start(self):
+        """
+        Start the worker processes and wait until each of them has loaded and warmed up the model.
+        """
+        # spawn: forking a process that already initialized PyTorch threads is unsafe
+        context = multiprocessing.get_context("spawn")
+        self.task_queue = context.Queue()
+        self.result_queue = context.Queue()
+
+        for _ in range(self.num_workers):
+            worker = context.Process(
+                target=_worker_main,
+                args=(self.model_kwargs, self.threads_per_worker, self.task_queue, self.result_queue),
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+        ready = set()
+        while len(ready) < self.num_workers:
+            try:
+                status, pid, error = self.result_queue.get(timeout=1)
+            except queue.Empty:
+                # A worker killed while loading (out of memory...) never reports
+                dead = [worker.pid for worker in self.workers if not worker.is_alive() and worker.pid not in ready]
+                if dead:
+                    self.close()
+                    raise RuntimeError(f"Reranker worker {dead[0]} exited while loading the model")
+                continue
+            if status == "error":
+                self.close()
+                raise RuntimeError(f"Reranker worker {pid} failed to load the model: {error}")
+            ready.add(pid)
+
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+        print(f"Reranker pool started: {self.num_workers} workers x {self.threads_per_worker} threads")
+        return self
+
+    def compute_logits(self, theme, questions: list):
+        """
+        Score a list of questions for a theme (or a list of themes aligned with questions) on the workers.
+
+        :return: NumPy float32 array of logits aligned with questions.
+        """
+        if not questions:
+            return np.empty(0, dtype=np.float32)
+        if not self.is_running:
+            raise RuntimeError("The reranker pool is not running")
+
+        request = _Request(theme, questions, self.shard_size)
+        with self.lock:
+            request_id = next(self.request_ids)
+            self.requests[request_id] = request
+            self.pending.append(request_id)
+            self._dispatch()
+
+        with metrics.timer("reranker_pool_request"):
+            request.done.wait()
+        metrics.increment("reranker_pool_pairs", len(questions))
+        if request.error is not None:
+            raise RuntimeError(f"Reranker worker error: {request.error}")
+        return request.logits
+
+    def _dispatch(self):
+        # Called with the lock held: one shard per pending request in turn
+        while self.in_flight < self.max_in_flight and self.pending:
+            request_id = self.pending.popleft()
+            request = self.requests[request_id]
+            start_idx, end_idx = request.shards.popleft()
+            theme = request.theme if isinstance(request.theme, str) else request.theme[start_idx:end_idx]
+            self.task_queue.put((request_id, start_idx, theme, request.questions[start_idx:end_idx]))
+            self.in_flight += 1
+            if request.shards:
+                self.pending.append(request_id)
+
+    def _fail_all(self, error):
+        with self.lock:
+            for request in self.requests.values():
+                request.error = error
+                request.done.set()
+            self.requests.clear()
+            self.pending.clear()
+
+    def _collect(self):
+        while not self.closed:
+            try:
+                request_id, start_idx, logits = self.result_queue.get(timeout=1)
+            except queue.Empty:
+                if any(not worker.is_alive() for worker in self.workers):
+                    self._fail_all("a worker process died")
+                    self.closed = True
+                continue
+            except (EOFError, OSError):
+                break
+
+            with self.lock:
+                self.in_flight -= 1
+                request = self.requests.get(request_id)
+                if request is not None:
+                    if isinstance(logits, str):
+                        # The remaining shards of the request are dropped
+                        request.error = logits
+                        request.shards.clear()
+                    else:
+                        request.logits[start_idx:start_idx + len(logits)] = logits
+                    request.remaining -= 1
+
+                    if request.error is not None or request.remaining == 0:
+                        del self.requests[request_id]
+                        if request_id in self.pending:
+                            self.pending.remove(request_id)
+                        request.done.set()
+                self._dispatch()
+
+    def close(self):
+        """
+        Stop the workers. Requests still running fail.
+        """
+        self.closed = True
+        self._fail_all("the reranker pool was closed")
+        for _ in self.workers:
+            self.task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
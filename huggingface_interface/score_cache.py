@@ -0,0 +1,193 @@
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from time import time
+
+import numpy as np
+
+class ScoreCache:
+    """
+    Cache of reranker scores keyed by (normalized theme, question id, model name).
+    An in-memory LRU tier sits in front of an optional SQLite tier that survives restarts.
+    """
+
+    def __init__(
+        self,
+        max_size=200000,
+        db_path=None,
+        max_db_size=5000000,
+    ):
+        """
+        Initialize the ScoreCache.
+
+        :param max_size: Maximum number of scores kept in memory.
+        :param db_path: Path of the SQLite file used as second tier (None for a memory-only cache).
+        :param max_db_size: Maximum number of scores kept in the SQLite tier, the least recently used are evicted.
+        """
+        self.max_size = max_size
+        self.db_path = db_path
+        self.max_db_size = max_db_size
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.conn = None
+
+        if db_path is not None:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rerank_scores (
+                model_name TEXT,
+                theme TEXT,
+                question_id INTEGER,
+                score REAL,
+                last_used REAL,
+                PRIMARY KEY (model_name, theme, question_id)
+            )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS rerank_scores_last_used ON rerank_scores (last_used)")
+            self.conn.commit()
+            self.db_size = self.conn.execute("SELECT COUNT(*) FROM rerank_scores").fetchone()[0]
+
+    @staticmethod
+    def normalize_theme(theme: str):
+        """
+        Normalize a theme so that trivial variations ("Harry  Potter", "harry potter ") share cache entries.
+        """
+        return " ".join(unicodedata.normalize("NFC", theme).lower().split())
+
+    def get_many(self, theme: str, question_ids, model_name: str):
+        """
+        Look up the scores of several questions for a theme.
+
+        :param theme: The theme (normalized internally).
+        :param question_ids: Sequence of question ids.
+        :param model_name: Name of the model that produced the scores.
+        :return: NumPy float32 array aligned with question_ids, NaN for missing scores.
+        """
+        theme = self.normalize_theme(theme)
+        scores = np.full(len(question_ids), np.nan, dtype=np.float32)
+        missing = []
+
+        with self.lock:
+            for position, question_id in enumerate(question_ids):
+                key = (model_name, theme, int(question_id))
+                score = self.memory.get(key)
+                if score is None:
+                    missing.append(position)
+                else:
+                    self.memory.move_to_end(key)
+                    scores[position] = score
+            self.memory_hits += len(question_ids) - len(missing)
+
+            if missing and self.conn is not None:
+                found = self._db_get(theme, [int(question_ids[position]) for position in missing], model_name)
+                still_missing = []
+                for position in missing:
+                    score = found.get(int(question_ids[position]))
+                    if score is None:
+                        still_missing.append(position)
+                    else:
+                        scores[position] = score
+                        self._memory_set((model_name, theme, int(question_ids[position])), score)
+                self.db_hits += len(missing) - len(still_missing)
+                missing = still_missing
+
+            self.misses += len(missing)
+
+        return scores
+
+    def set_many(self, theme: str, question_ids, scores, model_name: str):
+        """
+        Store the scores of several questions for a theme.
+
+        :param theme: The theme (normalized internally).
+        :param question_ids: Sequence of question ids.
+        :param scores: Sequence of scores aligned with question_ids.
+        :param model_name: Name of the model that produced the scores.
+        """
+        theme = self.normalize_theme(theme)
+        with self.lock:
+            for question_id, score in zip(question_ids, scores):
+                self._memory_set((model_name, theme, int(question_id)), float(score))
+
+            if self.conn is not None:
+                now = time()
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO rerank_scores VALUES (?, ?, ?, ?, ?)",
+                    [(model_name, theme, int(question_id), float(score), now) for question_id, score in zip(question_ids, scores)]
+                )
+                # Upper bound, replaced rows are counted again until the next eviction check
+                self.db_size += len(question_ids)
+                self._db_evict()
+                self.conn.commit()
+
+    def stats(self):
+        """
+        :return: Dictionary with the hit/miss counters and the size of each tier.
+        """
+        with self.lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            stats = {
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+                "memory_size": len(self.memory),
+            }
+            if self.conn is not None:
+                stats["db_size"] = self.db_size
+        return stats
+
+    def clear(self):
+        """
+        Empty both tiers and reset the counters.
+        """
+        with self.lock:
+            self.memory.clear()
+            self.memory_hits = self.db_hits = self.misses = 0
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM rerank_scores")
+                self.conn.commit()
+                self.db_size = 0
+
+    def _memory_set(self, key, score):
+        self.memory[key] = score
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def _db_get(self, theme, question_ids, model_name):
+        found = {}
+        # Bounded number of SQL variables per query
+        for start_idx in range(0, len(question_ids), 500):
+            chunk = question_ids[start_idx:start_idx + 500]
+            rows = self.conn.execute(
+                f"SELECT question_id, score FROM rerank_scores WHERE model_name = ? AND theme = ? AND question_id IN ({','.join('?' * len(chunk))})",
+                (model_name, theme, *chunk)
+            ).fetchall()
+            found.update(rows)
+
+        if found:
+            now = time()
+            self.conn.executemany(
+                "UPDATE rerank_scores SET last_used = ? WHERE model_name = ? AND theme = ? AND question_id = ?",
+                [(now, model_name, theme, question_id) for question_id in found]
+            )
+            self.conn.commit()
+        return found
+
+    def _db_evict(self):
+        if self.db_size <= self.max_db_size:
+            return
+
+        self.db_size = self.conn.execute("SELECT COUNT(*) FROM rerank_scores").fetchone()[0]
+        excess = self.db_size - self.max_db_size
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM rerank_scores WHERE rowid IN (SELECT rowid FROM rerank_scores ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self.db_size -= excess
@@ -1,11 +1,24 @@
-import torch
+import os
+import threading
+import traceback
+from time import perf_counter
 
-from env import SERVER_IP, PORT
+start_time = perf_counter()
+from env import SERVER_IP, PORT, RETRIEVAL_TOP_K, DATABASE_PATH, MODEL_BACKEND, RERANKER_WORKERS, RERANKER_THREADS_PER_WORKER, MICRO_BATCHING_MAX_WAIT, SEMANTIC_SEARCH_CONCURRENCY, BACKGROUND_MODEL_LOADING, PROFILE_DIR, PROFILE_TORCH, THEME_PHRASINGS_PATH, PHRASINGS_PER_QUESTION
 from api import GradioUI
-from huggingface_interface import EmbeddingModel, RerankerModel
 from external_database import TriviaSQLiteManager
+ui_import_time = perf_counter() - start_time
+
+def load_models(ui):
+    """
+    Import torch / transformers, load and warm up the models, then plug them into the UI.
+    """
+    start_time = perf_counter()
+    import torch
+    from huggingface_interface import EmbeddingModel, RerankerModel, RerankerPool, ScoreCache, QueryPipeline, load_phrasings
+    from search_index import EmbeddingIndex
+    import_time = perf_counter() - start_time
 
-if __name__ == "__main__":
     device = ('cuda' if torch.cuda.is_available() else 'cpu')
     print(f"Device available: {device}")
 
@@ -16,16 +29,90 @@ if __name__ == "__main__":
     # embedding_test = embedding_model.compute_embeddings(["hello world"])
     # print(embedding_test)
 
-    # Load the reranker model and tokenizer
-    reranker_model = RerankerModel()
-    reranker_model.load_model_and_tokenizer()
+    # Load the reranker model and tokenizer, with a score cache stored next to the database
+    ui.models_status = "⏳ Chargement du reranker..."
+    score_cache = ScoreCache(db_path=os.path.join(os.path.dirname(DATABASE_PATH), "rerank_cache.db"))
+    reranker_pool = None
+    if RERANKER_WORKERS > 0:
+        # Each worker process loads its own copy of the model, concurrent searches are scored in parallel
+        reranker_pool = RerankerPool(RERANKER_WORKERS, RERANKER_THREADS_PER_WORKER, device=device, backend=MODEL_BACKEND)
+    reranker_model = RerankerModel(score_cache=score_cache, device=device, backend=MODEL_BACKEND, pool=reranker_pool, scheduler_max_wait=MICRO_BATCHING_MAX_WAIT)
+    reranker_model.load_model_and_tokenizer(warmup=True)
+
+    # questions = ["Qui a écrit la série de romans Harry Potter ?", "De quelles couleurs est le drapeau du Canada ?"]
+    # top_indices, scores = reranker_model.rerank_questions("Harry Potter", questions)
+    # for idx, score in zip(top_indices, scores):
+    #     print(f"Question: {questions[idx]}, Score: {score}")
+
+    # Load the embedding index used to pre-select questions before reranking (built with reindex.py)
+    ui.models_status = "⏳ Chargement de l'index d'embeddings..."
+    embedding_model = EmbeddingModel(device=device, backend=MODEL_BACKEND, scheduler_max_wait=MICRO_BATCHING_MAX_WAIT)
+    embedding_index = EmbeddingIndex(embedding_model)
+    if embedding_index.load():
+        embedding_model.load_model_and_tokenizer(warmup=True)
+        print(f"Embedding index loaded: {len(embedding_index)} questions")
+    else:
+        embedding_index = None
+        print("No embedding index found, every question will go through the reranker")
+
+    # Theme normalization, optional extra phrasings (e.g. English translations) and per-theme caches
+    query_pipeline = QueryPipeline(
+        reranker_model,
+        embedding_index,
+        phrasings=load_phrasings(THEME_PHRASINGS_PATH) if THEME_PHRASINGS_PATH else None,
+        phrasings_per_question=PHRASINGS_PER_QUESTION,
+    )
 
-    # reranked_questions, scores = reranker_model.rerank_questions("Harry Potter", ["Qui a écrit la série de romans Harry Potter ?", "De quelles couleurs est le drapeau du Canada ?"])
-    # for question, score in zip(reranked_questions, scores):
-    #     print(f"Question: {question}, Score: {score}")
+    # Load the question catalog now rather than on the first search
+    ui.models_status = "⏳ Chargement des questions..."
+    ui.catalog.refresh()
+    print(f"Question catalog loaded: {len(ui.catalog)} questions, {ui.catalog.memory_usage()['total'] / 2**20:.1f} MiB")
 
+    timings = {
+        "import": import_time,
+        "load": reranker_model.timings["load"] + embedding_model.timings.get("load", 0),
+        "warmup": reranker_model.timings.get("warmup", 0) + embedding_model.timings.get("warmup", 0),
+    }
+    print(
+        f"Startup: UI import {ui_import_time:.2f}s, model import {timings['import']:.2f}s, "
+        f"load {timings['load']:.2f}s, warmup {timings['warmup']:.2f}s"
+    )
+    ui.set_models(
+        reranker_model,
+        embedding_index,
+        f"✅ Modèles prêts (import {timings['import']:.1f} s, chargement {timings['load']:.1f} s, préchauffage {timings['warmup']:.1f} s)",
+        query_pipeline,
+    )
+
+def load_models_in_background(ui):
+    def load():
+        try:
+            load_models(ui)
+        except Exception as error:
+            traceback.print_exc()
+            ui.models_status = f"❌ Échec du chargement des modèles : {error}"
+
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == "__main__":
     # Database Manager
-    db_manager = TriviaSQLiteManager()
+    db_manager = TriviaSQLiteManager(read_only=True)
+
+    # Concurrent searches only share batches if Gradio runs them at the same time
+    semantic_search_concurrency = max(1, RERANKER_WORKERS) if MICRO_BATCHING_MAX_WAIT is None else SEMANTIC_SEARCH_CONCURRENCY
+    ui = GradioUI(
+        SERVER_IP, PORT, db_manager, None,
+        retrieval_top_k=RETRIEVAL_TOP_K,
+        semantic_search_concurrency=semantic_search_concurrency,
+        profile_dir=PROFILE_DIR,
+        torch_profiler=PROFILE_TORCH,
+    )
 
-    ui = GradioUI(SERVER_IP, PORT, db_manager, reranker_model)
-    ui.launch_ui()
\ No newline at end of file
+    if BACKGROUND_MODEL_LOADING:
+        # The UI binds its port right away, the semantic search is enabled once the models are ready
+        load_models_in_background(ui)
+    else:
+        load_models(ui)
+    ui.launch_ui()
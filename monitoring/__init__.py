@@ -0,0 +1,2 @@
+from .metrics import Metrics, metrics
+from .profiler import RequestProfiler, profile_generator
@@ -0,0 +1,110 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+# Derived rates: name -> (numerator counter, denominator timer or counters)
+THROUGHPUTS = {
+    "reranker_pairs_per_second": ("reranker_pairs", "reranker_forward"),
+    "reranker_tokens_per_second": ("reranker_tokens", "reranker_forward"),
+    "embedding_texts_per_second": ("embedding_texts", "embedding_forward"),
+    "embedding_tokens_per_second": ("embedding_tokens", "embedding_forward"),
+}
+RATIOS = {
+    # Share of the computed tokens that are padding
+    "reranker_padding_ratio": ("reranker_padding_tokens", ["reranker_tokens", "reranker_padding_tokens"]),
+    "embedding_padding_ratio": ("embedding_padding_tokens", ["embedding_tokens", "embedding_padding_tokens"]),
+    "score_cache_hit_rate": ("score_cache_hits", ["score_cache_hits", "score_cache_misses"]),
+    "db_cache_hit_rate": ("db_cache_hits", ["db_cache_hits", "db_cache_misses"]),
+}
+
+class Metrics:
+    """
+    Thread-safe registry of counters and stage timers of the search pipeline.
+
+    Timers record the number of calls, the total and the maximum duration of a stage (SQLite query,
+    tokenization, forward pass...). Snapshots add the derived throughputs, padding ratios and cache hit rates,
+    and can be rendered in the Prometheus text format.
+    """
+
+    def __init__(self, prefix="triv_ia"):
+        """
+        :param prefix: Prefix of the metric names in the Prometheus output.
+        """
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = defaultdict(float)
+            # name -> [count, total seconds, max seconds]
+            self.timers = defaultdict(lambda: [0, 0.0, 0.0])
+
+    def increment(self, name: str, value=1):
+        """
+        Add value to a counter.
+        """
+        with self.lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        """
+        Record one duration of a stage.
+        """
+        with self.lock:
+            timer = self.timers[name]
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Context manager recording the duration of its block in the timer name.
+        """
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start_time)
+
+    def snapshot(self):
+        """
+        :return: Dictionary with the counters, the timers (count, total, mean and max in seconds) and the derived rates.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            timers = {
+                name: {"count": count, "total": total, "mean": total / count if count else 0.0, "max": maximum}
+                for name, (count, total, maximum) in self.timers.items()
+            }
+
+        rates = {}
+        for name, (counter, timer) in THROUGHPUTS.items():
+            if counter in counters and timers.get(timer, {}).get("total"):
+                rates[name] = counters[counter] / timers[timer]["total"]
+        for name, (counter, total_counters) in RATIOS.items():
+            total = sum(counters.get(total_counter, 0) for total_counter in total_counters)
+            if total:
+                rates[name] = counters.get(counter, 0) / total
+
+        return {"counters": counters, "timers": timers, "rates": rates}
+
+    def to_prometheus(self):
+        """
+        :return: The snapshot in the Prometheus text exposition format (timers as summaries in seconds).
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines += [f"# TYPE {self.prefix}_{name}_total counter", f"{self.prefix}_{name}_total {value:g}"]
+        for name, timer in sorted(snapshot["timers"].items()):
+            metric = f"{self.prefix}_{name}_seconds"
+            lines += [f"# TYPE {metric} summary", f"{metric}_count {timer['count']}", f"{metric}_sum {timer['total']:.6f}"]
+        for name, value in sorted(snapshot["rates"].items()):
+            lines += [f"# TYPE {self.prefix}_{name} gauge", f"{self.prefix}_{name} {value:.6g}"]
+        return "\n".join(lines) + "\n"
+
+# Registry shared by the whole process
+metrics = Metrics()
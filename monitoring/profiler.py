@@ -0,0 +1,84 @@
+import cProfile
+import os
+import threading
+from itertools import count
+from time import strftime
+
+# Distinguishes the profiles written in the same second
+profile_ids = count()
+# The torch profiler is global to the process: concurrent requests are traced one at a time
+torch_profiler_lock = threading.Lock()
+
+class RequestProfiler:
+    """
+    Opt-in profile of a single request: cProfile statistics (.prof, readable with pstats or snakeviz)
+    and optionally a torch profiler trace (.json, readable in chrome://tracing or Perfetto).
+
+    The profile can be paused and resumed, e.g. around the yields of a streaming request so that
+    the time spent waiting for the client is not recorded.
+    """
+
+    def __init__(self, output_dir: str, name: str, torch_profiler=False):
+        """
+        :param output_dir: Directory of the profile files (created if needed).
+        :param name: Name of the request, used in the file names.
+        :param torch_profiler: Also record the PyTorch operators (CPU and CUDA when available),
+            unless another request is already traced.
+        """
+        self.output_dir = output_dir
+        self.name = name
+        self.profile = cProfile.Profile()
+        self.torch_profile = None
+        if torch_profiler and torch_profiler_lock.acquire(blocking=False):
+            import torch
+
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.torch_profile = torch.profiler.profile(activities=activities, record_shapes=True)
+            self.torch_profile.start()
+
+    def resume(self):
+        # cProfile only records the calling thread
+        self.profile.enable()
+
+    def pause(self):
+        self.profile.disable()
+
+    def dump(self):
+        """
+        Stop the profilers and write the profile files.
+
+        :return: Path of the files without extension.
+        """
+        self.pause()
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(profile_ids)}-{self.name}")
+        self.profile.dump_stats(path + ".prof")
+        if self.torch_profile is not None:
+            self.torch_profile.stop()
+            self.torch_profile.export_chrome_trace(path + ".json")
+            self.torch_profile = None
+            torch_profiler_lock.release()
+        return path
+
+def profile_generator(generator, output_dir: str, name: str, torch_profiler=False):
+    """
+    Profile the steps of a generator (e.g. a streaming Gradio handler), not the time between them.
+    The profile files are written when the generator ends or is closed.
+    """
+    profiler = RequestProfiler(output_dir, name, torch_profiler)
+    try:
+        while True:
+            # Gradio may run each step in a different thread
+            profiler.resume()
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                profiler.pause()
+            yield item
+    finally:
+        generator.close()
+        print(f"Profile written to {profiler.dump()}.*")
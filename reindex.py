@@ -0,0 +1,48 @@
+import argparse
+
+from env import MODEL_BACKEND
+
+from huggingface_interface import EmbeddingModel
+from external_database import TriviaSQLiteManager
+from search_index import EmbeddingIndex, NearDuplicateDetector
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the question embedding index")
+    parser.add_argument("--incremental", action="store_true", help="Only embed the questions waiting in the embedding queue")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--backend", default=MODEL_BACKEND, help="Inference backend of the embedding model (torch, torch-int8, onnx-int8)")
+    parser.add_argument("--duplicates", action="store_true", help="Recompute every near-duplicate cluster after indexing")
+    args = parser.parse_args()
+
+    embedding_model = EmbeddingModel(backend=args.backend)
+    embedding_model.load_model_and_tokenizer()
+
+    db_manager = TriviaSQLiteManager()
+    embedding_index = EmbeddingIndex(embedding_model, batch_size=args.batch_size)
+
+    if args.incremental and embedding_index.load():
+        db_manager.connect()
+        db_manager.create_embedding_queue_table()
+        embedded = embedding_index.update(db_manager)
+        print(f"Embedding index updated: {embedded} questions embedded, {len(embedding_index)} questions indexed")
+    else:
+        db_manager.connect()
+        db_manager.create_embedding_queue_table()
+        db_manager.commit()
+        # Questions inserted or edited while the table is embedded stay queued for the next --incremental run
+        up_to_seq = db_manager.last_dirty_seq()
+        embedding_index.build(db_manager)
+        db_manager.clear_dirty_questions(up_to_seq=up_to_seq)
+        db_manager.commit()
+        print(f"Embedding index built: {len(embedding_index)} questions")
+
+    duplicate_detector = NearDuplicateDetector(db_manager)
+    if args.duplicates:
+        stats = duplicate_detector.run_batch(embedding_index.get_embeddings)
+        print(f"Near duplicates: {stats['duplicates']} duplicate questions ({stats['candidate_pairs']} candidate pairs, {stats['confirmed_pairs']} confirmed)")
+    else:
+        # Candidates recorded at insert time, now that their embeddings are available
+        duplicate_detector.create_tables()
+        confirmed = duplicate_detector.confirm_candidates(embedding_index.get_embeddings)
+        print(f"Near duplicates: {confirmed} new duplicate pairs")
+    db_manager.close()
@@ -0,0 +1,2 @@
+from .embedding_index import EmbeddingIndex
+from .near_duplicates import NearDuplicateDetector
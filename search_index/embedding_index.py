@@ -0,0 +1,306 @@
+import os
+import json
+import numpy as np
+import torch
+
+from .npy_file import AppendableNpyFile
+
+from env import EMBEDDING_INDEX_PATH
+
+class EmbeddingIndex:
+    """
+    Persistent matrix of normalized question embeddings, keyed by question id.
+    Used as a cheap first retrieval stage in front of the reranker.
+
+    The index is stored as fixed-header .npy files, one row per question:
+    embeddings.npy (float16 or float32 x dim), ids.npy (int64 sidecar) and stamps.npy
+    (int16 code of the model stamp that produced the row, see meta.json).
+    The files are opened with np.memmap, so loading is immediate and every process
+    serving the UI shares the same page-cache copy.
+    """
+
+    def __init__(
+        self,
+        embedding_model,
+        index_path=EMBEDDING_INDEX_PATH,
+        batch_size=64,
+        dtype="float16",
+        chunk_size=65536,
+    ):
+        """
+        Initialize the EmbeddingIndex.
+
+        :param embedding_model: A loaded EmbeddingModel used to embed questions and themes.
+        :param index_path: The local directory where the index files are stored.
+        :param batch_size: Number of questions embedded per forward pass when building the index.
+        :param dtype: Storage dtype of the embeddings for a new index ("float16" or "float32").
+        :param chunk_size: Number of rows scored at once, bounds the working memory of a filtered search.
+        """
+        self.embedding_model = embedding_model
+        self.index_path = index_path
+        self.batch_size = batch_size
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.model_stamps = []
+        self.ids = np.empty(0, dtype=np.int64)
+        self.stamps = np.empty(0, dtype=np.int16)
+        self.embeddings = None
+        self._positions = None
+
+        self.ids_file = AppendableNpyFile(os.path.join(index_path, "ids.npy"))
+        self.embeddings_file = AppendableNpyFile(os.path.join(index_path, "embeddings.npy"))
+        self.stamps_file = AppendableNpyFile(os.path.join(index_path, "stamps.npy"))
+
+    @property
+    def meta_file(self):
+        return os.path.join(self.index_path, "meta.json")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load(self):
+        """
+        Map the index from disk.
+
+        :return: True if an index was found and loaded, False otherwise.
+        """
+        if not (os.path.exists(self.meta_file) and self.ids_file.exists()):
+            return False
+
+        with open(self.meta_file) as f:
+            self.model_stamps = json.load(f)["model_stamps"]
+        self._map()
+        self._positions = None
+        return True
+
+    def _map(self):
+        # ids.npy is written last: rows beyond its length come from an interrupted append
+        self.ids = np.array(self.ids_file.memmap())
+        self.stamps = np.array(self.stamps_file.memmap(len(self.ids)))
+        self.embeddings = self.embeddings_file.memmap(len(self.ids))
+
+    def _save_meta(self):
+        with open(self.meta_file, "w") as f:
+            json.dump({"model_stamps": self.model_stamps}, f)
+
+    def _stamp_code(self, model_stamp):
+        if model_stamp not in self.model_stamps:
+            self.model_stamps.append(model_stamp)
+            self._save_meta()
+        return self.model_stamps.index(model_stamp)
+
+    def build(self, db_manager):
+        """
+        Embed every question of the database and replace the current index.
+
+        :param db_manager: DatabaseManager giving access to the questions table.
+        """
+        question_ids, question_texts = db_manager.load_question_texts()
+
+        if not os.path.exists(self.index_path):
+            os.makedirs(self.index_path)
+        for npy_file in [self.ids_file, self.embeddings_file, self.stamps_file]:
+            if npy_file.exists():
+                os.remove(npy_file.path)
+
+        self.model_stamps = []
+        self._save_meta()
+        self.ids = np.empty(0, dtype=np.int64)
+        self.stamps = np.empty(0, dtype=np.int16)
+        self.embeddings = None
+        self._positions = None
+
+        for start_idx in range(0, len(question_ids), self.batch_size):
+            batch_texts = question_texts[start_idx:start_idx + self.batch_size]
+            self.upsert(question_ids[start_idx:start_idx + self.batch_size], self.embedding_model.compute_embeddings(batch_texts), remap=False)
+        if question_ids:
+            self._map()
+
+    def stale_ids(self):
+        """
+        :return: Ids of the rows embedded with another model stamp than the current embedding model.
+        """
+        if not self.model_stamps:
+            return np.empty(0, dtype=np.int64)
+        current_code = self.model_stamps.index(self.embedding_model.model_stamp) if self.embedding_model.model_stamp in self.model_stamps else -1
+        return self.ids[self.stamps != current_code]
+
+    def update(self, db_manager):
+        """
+        Embed only the questions waiting in the database embedding queue and append them to the index.
+        Rows produced by another model stamp are queued first so that they get re-embedded.
+        The database connection must be open; the queue is committed after each batch.
+
+        :param db_manager: Connected DatabaseManager giving access to the questions table and embedding queue.
+        :return: Number of embedded questions.
+        """
+        db_manager.mark_questions_dirty(self.stale_ids())
+        db_manager.commit()
+
+        total = 0
+        while True:
+            # Questions edited after loading are requeued with a higher seq and kept for the next batch
+            up_to_seq = db_manager.last_dirty_seq()
+            question_ids, question_texts = db_manager.load_dirty_questions(self.batch_size)
+            if not question_ids:
+                break
+
+            self.upsert(question_ids, self.embedding_model.compute_embeddings(question_texts), remap=False)
+            db_manager.clear_dirty_questions(question_ids, up_to_seq)
+            db_manager.commit()
+            total += len(question_ids)
+
+        if total:
+            self._map()
+        return total
+
+    def upsert(self, question_ids, embeddings, remap=True):
+        """
+        Write embeddings to disk: existing rows are overwritten in place, new rows are appended.
+
+        :param question_ids: List of question ids.
+        :param embeddings: NumPy array of shape (len(question_ids), dim).
+        :param remap: Map the updated files once written. When False, only the id -> row mapping is
+            kept up to date and the caller must call _map() after its last batch (see build and update).
+        """
+        embeddings = np.asarray(embeddings)
+        if not self.embeddings_file.exists():
+            if not os.path.exists(self.index_path):
+                os.makedirs(self.index_path)
+            self.embeddings_file.create(self.dtype, (embeddings.shape[1],))
+            self.stamps_file.create(np.int16)
+            self.ids_file.create(np.int64)
+            self._map()
+        elif embeddings.shape[1] != self.embeddings.shape[1]:
+            raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match the index dimension {self.embeddings.shape[1]}, a full reindex is required")
+        stamp_code = self._stamp_code(self.embedding_model.model_stamp)
+
+        if self._positions is None:
+            self._positions = {int(question_id): position for position, question_id in enumerate(self.ids)}
+
+        num_rows = len(self._positions)
+        new_rows = []
+        for row, question_id in enumerate(question_ids):
+            position = self._positions.get(int(question_id))
+            if position is None:
+                new_rows.append(row)
+                continue
+
+            self.embeddings_file.write_row(position, embeddings[row])
+            self.stamps_file.write_row(position, np.int16(stamp_code))
+
+        if new_rows:
+            new_ids = np.asarray(question_ids, dtype=np.int64)[new_rows]
+
+            # ids.npy last so that an interrupted append is ignored by load()
+            self.embeddings_file.append(embeddings[new_rows], num_rows)
+            self.stamps_file.append(np.full(len(new_rows), stamp_code, dtype=np.int16), num_rows)
+            self.ids_file.append(new_ids, num_rows)
+            self._positions.update(zip(new_ids.tolist(), range(num_rows, num_rows + len(new_ids))))
+
+        if remap:
+            self._map()
+
+    def get_embeddings(self, question_ids):
+        """
+        Look up the stored embeddings of several questions.
+
+        :param question_ids: Sequence of question ids.
+        :return: A tuple (embeddings, found) where found is a boolean mask of the ids present in the index.
+            Rows of missing ids are zeros.
+        """
+        question_ids = np.asarray(question_ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.zeros((len(question_ids), 0), dtype=self.dtype), np.zeros(len(question_ids), dtype=bool)
+
+        sorter = np.argsort(self.ids)
+        sorted_positions = np.minimum(np.searchsorted(self.ids, question_ids, sorter=sorter), len(self.ids) - 1)
+        positions = sorter[sorted_positions]
+        found = self.ids[positions] == question_ids
+
+        embeddings = np.zeros((len(question_ids), self.embeddings.shape[1]), dtype=self.embeddings.dtype)
+        embeddings[found] = self.embeddings[positions[found]]
+        return embeddings, found
+
+    def _scores(self, query_embeddings, positions=None):
+        """
+        Dot products between the queries (one per row) and the stored embeddings, computed by chunks
+        in the storage dtype so that the mapped matrix is never copied as a whole.
+
+        :return: NumPy float32 array of shape (number of rows, number of queries).
+        """
+        num_rows = len(self.ids) if positions is None else len(positions)
+        embeddings = torch.from_numpy(self.embeddings)
+        query_embeddings = torch.from_numpy(np.ascontiguousarray(query_embeddings.T)).to(embeddings.dtype)
+
+        scores = np.empty((num_rows, query_embeddings.shape[1]), dtype=np.float32)
+        for start_idx in range(0, num_rows, self.chunk_size):
+            end_idx = min(start_idx + self.chunk_size, num_rows)
+            if positions is None:
+                chunk = embeddings[start_idx:end_idx]
+            else:
+                chunk = embeddings[torch.from_numpy(positions[start_idx:end_idx])]
+            scores[start_idx:end_idx] = (chunk @ query_embeddings).float().numpy()
+        return scores
+
+    def retrieve(self, theme: str, top_k: int, candidate_ids=None):
+        """
+        Retrieve the questions closest to a theme by dot product.
+
+        :param theme: The theme to compare the questions against.
+        :param top_k: Number of question ids to return.
+        :param candidate_ids: Optional array of question ids to restrict the search to (e.g. a category filter).
+            Candidates missing from the index are always returned so that they still reach the reranker.
+        :return: A tuple (ids, scores) sorted by decreasing similarity. Missing candidates get a score of NaN.
+        """
+        query_embedding = self.embedding_model.compute_embeddings([theme])[0]
+        return self.retrieve_by_embedding(query_embedding, top_k, candidate_ids)
+
+    def retrieve_by_embedding(self, query_embedding, top_k: int, candidate_ids=None):
+        """
+        Same as retrieve, from an already computed and normalized query embedding.
+        """
+        return self.retrieve_many(np.asarray(query_embedding)[None], top_k, candidate_ids)[0]
+
+    def retrieve_many(self, query_embeddings, top_k: int, candidate_ids=None):
+        """
+        Same as retrieve_by_embedding for several queries sharing the same candidates,
+        scored in a single pass over the stored embeddings.
+
+        :param query_embeddings: Normalized query embeddings, one per row.
+        :return: List of (ids, scores) tuples, one per query.
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+
+        if candidate_ids is None:
+            positions = None
+            num_candidates = len(self.ids)
+            missing_ids = np.empty(0, dtype=np.int64)
+        else:
+            candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+            positions = np.flatnonzero(np.isin(self.ids, candidate_ids))
+            num_candidates = len(positions)
+            missing_ids = candidate_ids[~np.isin(candidate_ids, self.ids)]
+
+        all_scores = self._scores(query_embeddings, positions) if num_candidates > 0 else None
+        results = []
+        for query_idx in range(len(query_embeddings)):
+            if num_candidates > 0:
+                scores = all_scores[:, query_idx]
+
+                if top_k < num_candidates:
+                    top = np.argpartition(-scores, top_k)[:top_k]
+                else:
+                    top = np.arange(num_candidates)
+                top = top[np.argsort(-scores[top])]
+
+                ids = self.ids[top] if positions is None else self.ids[positions[top]]
+                scores = scores[top]
+            else:
+                ids, scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            results.append((
+                np.concatenate([ids, missing_ids]),
+                np.concatenate([scores, np.full(len(missing_ids), np.nan, dtype=np.float32)]),
+            ))
+        return results
@@ -0,0 +1,304 @@
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+# Words too frequent to tell two questions apart (English and French)
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from", "has", "have", "how", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "what", "when", "where", "which", "who", "whom", "whose", "why", "with",
+    "au", "aux", "ce", "ces", "dans", "de", "des", "du", "en", "est", "et", "il", "la", "le", "les", "qu", "quel", "quelle", "quelles", "quels",
+    "qui", "que", "quoi", "sur", "un", "une",
+}
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+class NearDuplicateDetector:
+    """
+    Near-duplicate question detection across sources.
+
+    Candidates are found with MinHash signatures over normalized word shingles and
+    locality-sensitive hashing (bands of the signature used as bucket keys), so the
+    cost grows with the number of questions and not with the number of pairs.
+    Candidates are then confirmed by the cosine similarity of their embeddings.
+    Each cluster of duplicates keeps its oldest question as canonical row in the
+    question_duplicates table, which searches use to skip the other members.
+    """
+
+    def __init__(
+        self,
+        db_manager,
+        num_perm=64,
+        bands=32,
+        similarity_threshold=0.92,
+        max_bucket_size=50,
+        chunk_size=5000,
+        seed=0,
+    ):
+        """
+        Initialize the NearDuplicateDetector.
+
+        :param db_manager: Connected DatabaseManager used to store LSH buckets, candidates and clusters.
+        :param num_perm: Number of MinHash permutations.
+        :param bands: Number of LSH bands (num_perm must be a multiple), more bands find less similar candidates.
+        :param similarity_threshold: Minimum cosine similarity of the embeddings to confirm a duplicate.
+        :param max_bucket_size: Buckets with more questions are ignored (degenerate shingles), bounds the number of pairs.
+        :param chunk_size: Number of questions hashed at once.
+        :param seed: Seed of the MinHash permutations (must stay the same for an existing minhash_bands table).
+        """
+        self.db_manager = db_manager
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.similarity_threshold = similarity_threshold
+        self.max_bucket_size = max_bucket_size
+        self.chunk_size = chunk_size
+
+        rng = np.random.default_rng(seed)
+        self.perm_a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.perm_b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.band_multipliers = rng.integers(1, 2**63, self.rows_per_band, dtype=np.uint64) | np.uint64(1)
+
+    def create_tables(self):
+        """
+        Create the tables of the LSH buckets (minhash_bands), of the pending candidate pairs
+        (duplicate_candidates) and of the duplicate clusters (question_duplicates) if they do not exist.
+        """
+        self.db_manager.execute("""
+        CREATE TABLE IF NOT EXISTS minhash_bands (
+            band INTEGER,
+            bucket INTEGER,
+            question_id INTEGER
+        )
+        """)
+        self.db_manager.execute("CREATE INDEX IF NOT EXISTS minhash_bands_bucket ON minhash_bands (band, bucket)")
+        self.db_manager.execute("""
+        CREATE TABLE IF NOT EXISTS duplicate_candidates (
+            question_id INTEGER,
+            candidate_id INTEGER,
+            PRIMARY KEY (question_id, candidate_id)
+        )
+        """)
+        self.db_manager.execute("""
+        CREATE TABLE IF NOT EXISTS question_duplicates (
+            question_id INTEGER PRIMARY KEY,
+            canonical_id INTEGER
+        )
+        """)
+        self.db_manager.commit()
+
+    @staticmethod
+    def normalize(text: str):
+        """
+        :return: List of lowercased words without accents or punctuation.
+        """
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in text if not unicodedata.combining(char))
+        return re.findall(r"\w+", text.lower())
+
+    def shingles(self, text: str):
+        """
+        :return: NumPy array of the hashed shingles of a question (words without stopwords and word bigrams).
+        """
+        words = self.normalize(text)
+        words = [word for word in words if word not in STOPWORDS] or words
+        tokens = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+        return np.unique(np.array([zlib.crc32(token.encode()) % MERSENNE_PRIME for token in tokens] or [0], dtype=np.uint64))
+
+    def signatures(self, texts: list):
+        """
+        Compute the MinHash signatures of several questions.
+
+        :return: NumPy uint64 array of shape (len(texts), num_perm).
+        """
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint64)
+        for start_idx in range(0, len(texts), self.chunk_size):
+            shingles = [self.shingles(text) for text in texts[start_idx:start_idx + self.chunk_size]]
+            starts = np.cumsum([0] + [len(doc_shingles) for doc_shingles in shingles[:-1]])
+            values = np.concatenate(shingles)
+
+            # (num_perm, total shingles) universal hashes, reduced to their minimum per question
+            hashes = (self.perm_a[:, None] * values[None, :] + self.perm_b[:, None]) % np.uint64(MERSENNE_PRIME)
+            signatures[start_idx:start_idx + len(shingles)] = np.minimum.reduceat(hashes, starts, axis=1).T
+        return signatures
+
+    def band_keys(self, signatures):
+        """
+        Hash each band of the signatures into a bucket key.
+
+        :return: NumPy int64 array of shape (len(signatures), bands).
+        """
+        banded = signatures.reshape(len(signatures), self.bands, self.rows_per_band)
+        # Arithmetic modulo 2**64, wrap-around is intended
+        keys = (banded * self.band_multipliers).sum(axis=2, dtype=np.uint64)
+        return keys.view(np.int64)
+
+    def candidate_pairs(self, question_ids, keys):
+        """
+        Pairs of questions sharing at least one LSH bucket.
+
+        :param question_ids: NumPy int64 array of question ids.
+        :param keys: Band keys of these questions (see band_keys).
+        :return: NumPy int64 array of shape (n_pairs, 2), each pair sorted (smaller id first).
+        """
+        pairs = []
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind="stable")
+            sorted_keys = keys[order, band]
+            boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+            starts = np.concatenate([[0], boundaries])
+            ends = np.concatenate([boundaries, [len(sorted_keys)]])
+            sizes = ends - starts
+            kept = (sizes > 1) & (sizes <= self.max_bucket_size)
+
+            for start, end in zip(starts[kept], ends[kept]):
+                members = question_ids[order[start:end]]
+                first, second = np.triu_indices(len(members), k=1)
+                pairs.append(np.stack([members[first], members[second]], axis=1))
+
+        if not pairs:
+            return np.empty((0, 2), dtype=np.int64)
+        pairs = np.sort(np.concatenate(pairs), axis=1)
+        return np.unique(pairs, axis=0)
+
+    def confirm(self, pairs, get_embeddings):
+        """
+        Keep the candidate pairs whose embeddings are similar enough.
+
+        :param pairs: NumPy int64 array of shape (n_pairs, 2).
+        :param get_embeddings: Function question ids -> (normalized embeddings, found mask), e.g. EmbeddingIndex.get_embeddings.
+        :return: A tuple (confirmed pairs, pairs that could not be checked because an embedding is missing).
+        """
+        if len(pairs) == 0:
+            return pairs, pairs
+
+        unique_ids, inverse = np.unique(pairs, return_inverse=True)
+        inverse = inverse.reshape(pairs.shape)
+        embeddings, found = get_embeddings(unique_ids)
+
+        checkable = found[inverse[:, 0]] & found[inverse[:, 1]]
+        confirmed = np.zeros(len(pairs), dtype=bool)
+        for start_idx in range(0, len(pairs), self.chunk_size):
+            end_idx = min(start_idx + self.chunk_size, len(pairs))
+            chunk = inverse[start_idx:end_idx]
+            similarities = np.einsum(
+                "ij,ij->i",
+                embeddings[chunk[:, 0]].astype(np.float32),
+                embeddings[chunk[:, 1]].astype(np.float32),
+            )
+            confirmed[start_idx:end_idx] = similarities >= self.similarity_threshold
+
+        return pairs[checkable & confirmed], pairs[~checkable]
+
+    @staticmethod
+    def clusters(pairs):
+        """
+        Union-find over duplicate pairs.
+
+        :return: Dictionary question id -> canonical id (smallest id of its cluster), for non-canonical questions only.
+        """
+        parent = {}
+
+        def find(question_id):
+            root = question_id
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while parent.get(question_id, question_id) != root:
+                parent[question_id], question_id = root, parent[question_id]
+            return root
+
+        for first, second in pairs.tolist():
+            first_root, second_root = find(first), find(second)
+            if first_root != second_root:
+                parent[max(first_root, second_root)] = min(first_root, second_root)
+
+        return {question_id: find(question_id) for question_id in parent if find(question_id) != question_id}
+
+    def run_batch(self, get_embeddings):
+        """
+        Recompute every cluster from scratch over the whole questions table, and reset the LSH buckets
+        used by the incremental detection.
+
+        :param get_embeddings: Function question ids -> (normalized embeddings, found mask).
+        :return: Dictionary with the number of questions, candidate pairs, confirmed pairs and duplicate questions.
+        """
+        self.create_tables()
+        self.db_manager.execute("SELECT id, question FROM questions ORDER BY id")
+        rows = self.db_manager.cursor.fetchall()
+        question_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        keys = self.band_keys(self.signatures([row[1] for row in rows]))
+
+        pairs = self.candidate_pairs(question_ids, keys)
+        confirmed, unchecked = self.confirm(pairs, get_embeddings)
+        duplicates = self.clusters(confirmed)
+
+        self.db_manager.execute("DELETE FROM minhash_bands")
+        self.db_manager.execute("DELETE FROM duplicate_candidates")
+        self.db_manager.execute("DELETE FROM question_duplicates")
+        self.db_manager.cursor.executemany(
+            "INSERT INTO minhash_bands (band, bucket, question_id) VALUES (?, ?, ?)",
+            ((band, int(keys[row, band]), int(question_ids[row])) for row in range(len(question_ids)) for band in range(self.bands))
+        )
+        self.db_manager.cursor.executemany("INSERT INTO duplicate_candidates VALUES (?, ?)", unchecked.tolist())
+        self.db_manager.cursor.executemany("INSERT INTO question_duplicates VALUES (?, ?)", duplicates.items())
+        self.db_manager.commit()
+
+        return {
+            "questions": len(question_ids),
+            "candidate_pairs": len(pairs),
+            "confirmed_pairs": len(confirmed),
+            "duplicates": len(duplicates),
+        }
+
+    def add(self, question_ids, texts):
+        """
+        Incremental detection at insert time: register new questions in the LSH buckets and record
+        their candidate pairs, to be confirmed later with confirm_candidates (once embedded).
+        Runs inside the caller's transaction.
+
+        :param question_ids: Ids of the new questions.
+        :param texts: Texts of the new questions.
+        """
+        keys = self.band_keys(self.signatures(texts))
+        bucket_query = " UNION ".join(["SELECT question_id FROM minhash_bands WHERE band = ? AND bucket = ?"] * self.bands)
+
+        for row, question_id in enumerate(question_ids):
+            params = [value for band in range(self.bands) for value in (band, int(keys[row, band]))]
+            self.db_manager.execute(f"SELECT question_id FROM ({bucket_query}) LIMIT ?", (*params, self.max_bucket_size * self.bands))
+            candidates = [candidate_id for (candidate_id,) in self.db_manager.cursor.fetchall() if candidate_id != question_id]
+
+            self.db_manager.cursor.executemany(
+                "INSERT OR IGNORE INTO duplicate_candidates VALUES (?, ?)",
+                [(min(question_id, candidate_id), max(question_id, candidate_id)) for candidate_id in candidates]
+            )
+            self.db_manager.cursor.executemany(
+                "INSERT INTO minhash_bands (band, bucket, question_id) VALUES (?, ?, ?)",
+                [(band, int(keys[row, band]), int(question_id)) for band in range(self.bands)]
+            )
+
+    def confirm_candidates(self, get_embeddings):
+        """
+        Confirm the pending candidate pairs recorded by add and merge them into the existing clusters.
+        Pairs whose embeddings are not computed yet stay pending.
+
+        :param get_embeddings: Function question ids -> (normalized embeddings, found mask).
+        :return: Number of newly confirmed duplicate pairs.
+        """
+        self.db_manager.execute("SELECT question_id, candidate_id FROM duplicate_candidates")
+        pairs = np.array(self.db_manager.cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+        confirmed, unchecked = self.confirm(pairs, get_embeddings)
+
+        if len(confirmed) > 0:
+            # Existing clusters are merged through their canonical rows
+            self.db_manager.execute("SELECT question_id, canonical_id FROM question_duplicates")
+            existing = np.array(self.db_manager.cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+            duplicates = self.clusters(np.concatenate([existing, confirmed]))
+
+            self.db_manager.execute("DELETE FROM question_duplicates")
+            self.db_manager.cursor.executemany("INSERT INTO question_duplicates VALUES (?, ?)", duplicates.items())
+
+        self.db_manager.execute("DELETE FROM duplicate_candidates")
+        self.db_manager.cursor.executemany("INSERT INTO duplicate_candidates VALUES (?, ?)", unchecked.tolist())
+        self.db_manager.commit()
+        return len(confirmed)
@@ -0,0 +1,104 @@
+import os
+import struct
+import numpy as np
+
+# Fixed header size so that the shape can be rewritten in place when rows are appended
+HEADER_SIZE = 128
+
+class AppendableNpyFile:
+    """
+    2D (or 1D) array stored in a standard .npy file with a fixed-size header.
+    Rows are appended at the end of the file and the header is rewritten in place,
+    and the data is read through np.memmap so that several processes share the same page cache.
+    The file stays readable with np.load.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the .npy file.
+        """
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def read_header(self):
+        """
+        :return: A tuple (dtype, shape) read from the file header.
+        """
+        with open(self.path, "rb") as f:
+            np.lib.format.read_magic(f)
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        return dtype, shape
+
+    def _write_header(self, f, dtype, shape):
+        header = repr({
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": tuple(shape),
+        }).encode("latin1")
+        preamble = np.lib.format.magic(1, 0) + struct.pack("<H", HEADER_SIZE - 10)
+        f.seek(0)
+        f.write(preamble + header.ljust(HEADER_SIZE - 11) + b"\n")
+
+    def _check_row_shape(self, row_shape, shape):
+        if tuple(row_shape) != tuple(shape[1:]):
+            raise ValueError(f"Row shape {tuple(row_shape)} does not match the row shape {tuple(shape[1:])} of {self.path}")
+
+    def create(self, dtype, row_shape=()):
+        """
+        Create an empty file, replacing any existing one.
+
+        :param dtype: NumPy dtype of the stored values.
+        :param row_shape: Shape of a single row (empty tuple for a 1D array).
+        """
+        with open(self.path, "wb") as f:
+            self._write_header(f, dtype, (0, *row_shape))
+
+    def append(self, rows, num_rows: int):
+        """
+        Append rows after the first num_rows rows of the file, then update the header.
+        Anything beyond num_rows (tail of an interrupted append) is overwritten.
+
+        :param rows: NumPy array of rows to append.
+        :param num_rows: Number of valid rows currently in the file.
+        """
+        dtype, shape = self.read_header()
+        rows = np.ascontiguousarray(rows, dtype=dtype)
+        self._check_row_shape(rows.shape[1:], shape)
+        row_size = dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + num_rows * row_size)
+            f.seek(HEADER_SIZE + num_rows * row_size)
+            f.write(rows.tobytes())
+            f.flush()
+            self._write_header(f, dtype, (num_rows + len(rows), *shape[1:]))
+
+    def write_row(self, position: int, row):
+        """
+        Overwrite a single row in place.
+
+        :param position: Index of the row to overwrite.
+        :param row: NumPy array holding the new row.
+        """
+        dtype, shape = self.read_header()
+        row = np.asarray(row, dtype=dtype)
+        self._check_row_shape(row.shape, shape)
+        with open(self.path, "r+b") as f:
+            f.seek(HEADER_SIZE + position * row.nbytes)
+            f.write(row.tobytes())
+
+    def memmap(self, num_rows=None):
+        """
+        Map the file without copying it. The mapping is copy-on-write: pages are shared
+        with the page cache (and the other processes) as long as they are not written to.
+
+        :param num_rows: Number of rows to map (defaults to the shape stored in the header).
+        :return: A np.memmap (or an empty array when the file has no rows).
+        """
+        dtype, shape = self.read_header()
+        shape = (shape[0] if num_rows is None else num_rows, *shape[1:])
+        if shape[0] == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="c", offset=HEADER_SIZE, shape=shape)
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_corpus import generate_questions
+from benchmarks.tiny_models import create_tiny_models
+from huggingface_interface import QueryPipeline, RerankerModel
+
+THEME = "Géographie de la France"
+PHRASINGS = {THEME: ["Geography of France", "capital country"]}
+
+@pytest.fixture(scope="module")
+def reranker_model(tmp_path_factory):
+    models_path = str(tmp_path_factory.mktemp("models"))
+    reranker_name, _ = create_tiny_models(models_path)
+    reranker_model = RerankerModel(reranker_name, local_path=models_path, device="cpu")
+    reranker_model.load_model_and_tokenizer()
+    return reranker_model
+
+@pytest.fixture(scope="module")
+def questions():
+    return [question["question"] for question in generate_questions(60)]
+
+def phrasing_scores(reranker_model, questions, phrasings):
+    """Scores of each phrasing (rows) with RerankerModel.rerank_questions, in question order"""
+    scores = np.empty((len(phrasings), len(questions)), dtype=np.float32)
+    for phrasing_idx, phrasing in enumerate(phrasings):
+        indices, phrasing_scores = reranker_model.rerank_questions(phrasing, questions)
+        scores[phrasing_idx, indices] = phrasing_scores
+    return scores
+
+class StubEmbeddingModel:
+    def compute_embeddings(self, texts, priority=0):
+        return np.eye(len(texts), 4, dtype=np.float32)
+
+class StubEmbeddingIndex:
+    """
+    Questions with an id below num_indexed are indexed, with the embedding of the phrasing id % 3.
+    Candidate ids absent from the index come last with NaN scores, as in EmbeddingIndex.retrieve_many.
+    """
+
+    embedding_model = StubEmbeddingModel()
+
+    def __init__(self, num_indexed=0):
+        self.num_indexed = num_indexed
+
+    def get_embeddings(self, question_ids):
+        question_ids = np.asarray(question_ids)
+        found = question_ids < self.num_indexed
+        if self.num_indexed == 0:
+            return np.zeros((len(question_ids), 0), dtype=np.float16), found
+        embeddings = np.eye(4, dtype=np.float16)[question_ids % 3]
+        embeddings[~found] = 0
+        return embeddings, found
+
+    def retrieve_many(self, query_embeddings, top_k, candidate_ids=None):
+        missing_ids = np.array([99], dtype=np.int64)
+        results = []
+        for query_idx in range(len(query_embeddings)):
+            ids = np.arange(query_idx * 5, query_idx * 5 + top_k, dtype=np.int64)
+            scores = np.linspace(1.0, 0.5, top_k, dtype=np.float32) - 0.01 * query_idx
+            results.append((np.concatenate([ids, missing_ids]), np.concatenate([scores, np.full(1, np.nan, dtype=np.float32)])))
+        return results
+
+@pytest.mark.parametrize("fusion", ["max", "mean"])
+def test_fused_scores_match_rerank_per_phrasing(reranker_model, questions, fusion):
+    query_pipeline = QueryPipeline(reranker_model, phrasings=PHRASINGS, fusion=fusion)
+    phrasings = query_pipeline.query(f"  {THEME.replace(' ', '  ')} ").phrasings
+    assert phrasings == [THEME, *PHRASINGS[THEME]]
+
+    scores = phrasing_scores(reranker_model, questions, phrasings)
+    # Fusion of the logits, then sigmoid: the max commutes with it, the mean does not
+    logits = np.log(scores / (1 - scores))
+    expected = scores.max(axis=0) if fusion == "max" else reranker_model.normalize_score(logits.mean(axis=0))
+
+    np.testing.assert_allclose(query_pipeline.score_questions(THEME, questions), expected, atol=1e-5)
+    _, top_scores = query_pipeline.rerank_questions(THEME, questions, top_k=10)
+    np.testing.assert_allclose(top_scores, np.sort(expected)[::-1][:10], atol=1e-5)
+
+def test_phrasings_per_question(reranker_model, questions):
+    scores = phrasing_scores(reranker_model, questions, [THEME, *PHRASINGS[THEME]])
+    question_ids = np.arange(len(questions))
+
+    # Empty index: every question is reranked against all the phrasings
+    query_pipeline = QueryPipeline(reranker_model, StubEmbeddingIndex(), PHRASINGS, phrasings_per_question=1)
+    np.testing.assert_allclose(query_pipeline.score_questions(THEME, questions, question_ids), scores.max(axis=0), atol=1e-5)
+
+    # Indexed questions against their closest phrasing, the others against all of them
+    num_indexed = len(questions) // 2
+    query_pipeline = QueryPipeline(reranker_model, StubEmbeddingIndex(num_indexed), PHRASINGS, phrasings_per_question=1)
+    expected = np.where(question_ids < num_indexed, scores[question_ids % 3, question_ids], scores.max(axis=0))
+    np.testing.assert_allclose(query_pipeline.score_questions(THEME, questions, question_ids), expected, atol=1e-5)
+
+def test_retrieve_keeps_unindexed_candidates(reranker_model):
+    single = QueryPipeline(reranker_model, StubEmbeddingIndex())
+    ids, _ = single.retrieve("theme", 5)
+    assert ids.tolist() == [0, 1, 2, 3, 4, 99]
+
+    fused = QueryPipeline(reranker_model, StubEmbeddingIndex(), phrasings={"theme": ["other phrasing"]})
+    ids, scores = fused.retrieve("theme", 5)
+    assert ids.tolist() == [0, 5, 1, 6, 2, 99]
+    assert np.all(np.isfinite(scores[:-1])) and np.isnan(scores[-1])